@@ -1,6 +1,4 @@
 import asyncio
-import base64
-import io
 import json
 import os
 import sys
@@ -8,13 +6,11 @@ import traceback
 from dotenv import load_dotenv
 import cv2
 import pyaudio
-import PIL.Image
-import mss
 import argparse
-import math
-import struct
 import time
 import random
+import contextlib
+import concurrent.futures
 import httpx
 from giphy_client.apis.default_api import DefaultApi
 from giphy_client.api_client import ApiClient
@@ -29,19 +25,54 @@ if sys.version_info < (3, 11, 0):
     asyncio.ExceptionGroup = exceptiongroup.ExceptionGroup
 
 from tools import tools_list
+from audio_devices import AudioDeviceManager
 
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
 SEND_SAMPLE_RATE = 16000
 RECEIVE_SAMPLE_RATE = 24000
 CHUNK_SIZE = 1024
+# Model audio buffered before playback starts; adapts upward on underruns
+PLAYBACK_TARGET_LATENCY_MS = 150
+VAD_THRESHOLD = 800 # Starting speech threshold; adapts to the measured noise floor
+# Playback gain while a possible barge-in is being confirmed
+BARGE_IN_DUCK_GAIN = 0.3
+# Upstream mic audio: "pcm" (16 kHz) or "pcm_low" (8 kHz, half the bandwidth for constrained links)
+AUDIO_UPSTREAM_ENCODER = os.getenv("AUDIO_UPSTREAM_ENCODER", "pcm")
+AUDIO_SEND_BATCH_MS = 128 # Mic audio collected per send
 
 MODEL = "models/gemini-2.5-flash-native-audio-preview-12-2025"
+# Backoff between failed connection attempts
+RECONNECT_BASE_DELAY = 0.25
+RECONNECT_MAX_DELAY = 5
 DEFAULT_MODE = "camera"
+# Screen mode region: "monitor" or "active_window"
+SCREEN_CAPTURE_REGION = os.getenv("SCREEN_CAPTURE_REGION", "monitor")
 load_dotenv()
 INCLUDE_RAW_LOGS = os.getenv("INCLUDE_RAW_LOGS", "True").lower() == "true"
 os.environ["INCLUDE_RAW_LOGS"] = str(INCLUDE_RAW_LOGS)
 client = genai.Client(http_options={"api_version": "v1beta"}, api_key=os.getenv("GEMINI_API_KEY"))
+EMBEDDING_MODEL = "text-embedding-004"
+MEMORY_SYNC_INTERVAL = 15 # Seconds between checks for chat or file changes to embed
+
+async def embed_texts(texts):
+    """Embeds a batch of texts in a single request."""
+    response = await client.aio.models.embed_content(model=EMBEDDING_MODEL, contents=texts)
+    return [e.values for e in response.embeddings]
+
+SUMMARY_MODEL = "gemini-2.5-flash"
+
+async def summarize_turns(summary, turns):
+    """Folds older conversation turns into the rolling summary used to rehydrate new sessions."""
+    transcript = "\n".join(f"{sender}: {text}" for sender, text in turns)
+    prompt = (
+        "Update this running summary of a voice assistant conversation with the new turns. "
+        "Keep facts, decisions, names, numbers and open tasks; drop pleasantries. "
+        "Reply with the summary only, at most 15 short lines.\n\n"
+        f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    response = await client.aio.models.generate_content(model=SUMMARY_MODEL, contents=prompt)
+    return response.text or summary
 
 # Function definitions
 generate_cad = {
@@ -153,6 +184,77 @@ control_light_tool = {
     }
 }
 
+control_light_group_tool = {
+    "name": "control_light_group",
+    "description": "Controls many smart lights at once (e.g. 'turn off all the lights'). Use a saved group name, 'all' for every known device, or an explicit list of targets. Prefer this over multiple control_light calls.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "group": {
+                "type": "STRING",
+                "description": "Optional saved group/scene name, or 'all' for every known device."
+            },
+            "targets": {
+                "type": "ARRAY",
+                "items": {"type": "STRING"},
+                "description": "Optional list of device IP addresses or aliases."
+            },
+            "action": {
+                "type": "STRING",
+                "description": "The action to perform: 'turn_on', 'turn_off', or 'set'."
+            },
+            "brightness": {
+                "type": "INTEGER",
+                "description": "Optional brightness level (0-100)."
+            },
+            "color": {
+                "type": "STRING",
+                "description": "Optional color name (e.g., 'red', 'cool white') or 'warm'."
+            }
+        },
+        "required": ["action"]
+    }
+}
+
+save_light_group_tool = {
+    "name": "save_light_group",
+    "description": "Saves a named group (scene) of smart home devices so it can be controlled with control_light_group.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "name": {"type": "STRING", "description": "The name of the group, e.g. 'living room'."},
+            "targets": {
+                "type": "ARRAY",
+                "items": {"type": "STRING"},
+                "description": "Device IP addresses (preferred) or aliases in the group."
+            }
+        },
+        "required": ["name", "targets"]
+    }
+}
+
+list_light_groups_tool = {
+    "name": "list_light_groups",
+    "description": "Lists the saved smart home device groups and their members.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {},
+    }
+}
+
+recall_tool = {
+    "name": "recall",
+    "description": "Searches long-term memory (past conversations, uploaded memories and project files) and returns the most relevant snippets. Use this instead of asking the user to repeat something they told you before.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "query": {"type": "STRING", "description": "What to remember, e.g. 'the dimensions we chose for the bracket'."},
+            "k": {"type": "INTEGER", "description": "Number of snippets to return. Defaults to 5."}
+        },
+        "required": ["query"]
+    }
+}
+
 discover_printers_tool = {
     "name": "discover_printers",
     "description": "Discovers 3D printers available on the local network.",
@@ -269,13 +371,17 @@ apply_update_tool = {
 tools = [{'google_search': {}}, {"function_declarations": [
     generate_cad, run_web_agent, create_project_tool, switch_project_tool,
     list_projects_tool, list_smart_devices_tool, control_light_tool,
+    control_light_group_tool, save_light_group_tool, list_light_groups_tool,
     discover_printers_tool, print_stl_tool, get_print_status_tool,
     iterate_cad_tool, set_timer_tool, set_reminder_tool, list_timers_tool,
     delete_entry_tool, modify_timer_tool, check_for_updates_tool, apply_update_tool,
-    set_time_format_tool, get_datetime_tool,
+    set_time_format_tool, get_datetime_tool, recall_tool,
 ] + tools_list[0]['function_declarations'][1:]}]
 
 pya = pyaudio.PyAudio()
+# Shared by every AudioLoop so audio devices stay open for the life of the process
+# The output ring is kept short; smoothing happens in each AudioLoop's JitterBuffer
+audio_device_manager = AudioDeviceManager(pya, FORMAT, SEND_SAMPLE_RATE, RECEIVE_SAMPLE_RATE, CHUNK_SIZE, channels=CHANNELS, output_buffer_seconds=0.1, include_raw_logs=INCLUDE_RAW_LOGS)
 
 from cad_agent import CadAgent
 from web_agent import WebAgent
@@ -288,9 +394,18 @@ from update_agent import UpdateAgent
 from search_agent import SearchAgent
 from scraper_agent import ScraperAgent
 from proactive_agent import ProactiveAgent
+from memory_index import MemoryIndex
+from session_context import SessionContext
+from jitter_buffer import JitterBuffer
+from barge_in import BargeInDetector, pcm_rms
+from audio_processing import EchoCanceller, NoiseFloorVAD
+from audio_encoding import create_encoder
+from send_pipeline import SendPipeline
+from frame_pipeline import FramePipeline, LatestFrame
+from screen_capture import ScreenCapture
 
 class AudioLoop:
-    def __init__(self, sio=None, video_mode=DEFAULT_MODE, on_audio_data=None, on_video_frame=None, on_cad_data=None, on_web_data=None, on_transcription=None, on_tool_confirmation=None, on_cad_status=None, on_cad_thought=None, on_project_update=None, on_device_update=None, on_error=None, input_device_index=None, input_device_name=None, output_device_index=None, kasa_agent=None, project_manager=None, on_display_content=None, slack_agent=None, scraper_agent=None):
+    def __init__(self, sio=None, video_mode=DEFAULT_MODE, on_audio_data=None, on_video_frame=None, on_cad_data=None, on_web_data=None, on_transcription=None, on_tool_confirmation=None, on_cad_status=None, on_cad_thought=None, on_project_update=None, on_device_update=None, on_error=None, input_device_index=None, input_device_name=None, output_device_index=None, kasa_agent=None, project_manager=None, on_display_content=None, slack_agent=None, scraper_agent=None, on_reconnect_metrics=None, audio_devices=None):
         self.sio = sio
         self.slack_agent = slack_agent
         self.video_mode = video_mode
@@ -306,13 +421,15 @@ class AudioLoop:
         self.on_project_update = on_project_update
         self.on_device_update = on_device_update
         self.on_error = on_error
+        self.on_reconnect_metrics = on_reconnect_metrics
         self.input_device_index = input_device_index
         self.input_device_name = input_device_name
         self.output_device_index = output_device_index
+        self.audio_devices = audio_devices if audio_devices else audio_device_manager
         self.last_input_source = 'ui'  # Default to 'ui'
 
-        self.audio_in_queue = None
-        self.out_queue = None
+        self.playback_buffer = None
+        self.send_pipeline = None
         self.paused = False
 
         self.message_source = None
@@ -322,10 +439,6 @@ class AudioLoop:
         self._last_input_transcription = ""
         self._last_output_transcription = ""
 
-        self.audio_in_queue = None
-        self.out_queue = None
-        self.paused = False
-
         self.session = None
         
         # Create CadAgent with thought callback
@@ -361,14 +474,24 @@ class AudioLoop:
         self.send_text_task = None
         self.stop_event = asyncio.Event()
         self._reconnect_needed = asyncio.Event()
+        # Live API session resumption: only valid while the connect config is unchanged
+        self._resumption_handle = None
+        self._resumption_config_key = None
+        self.reconnect_metrics = {"count": 0, "last_reason": None, "last_gap_ms": None, "last_connect_ms": None, "last_resumed": False}
         
         self.permissions = {} # Default Empty (Will treat unset as True)
         self._pending_confirmations = {}
 
-        # Video buffering state
-        self._latest_image_payload = None
+        # Video buffering state: newest UI frame, sent at most once per session
+        self.latest_frame = LatestFrame()
+        self.frame_pipeline = FramePipeline(max_size=1024)
+        self.screen_capture = None
         # VAD State
         self._is_speaking = False
+        self.barge_in = BargeInDetector(vad_threshold=VAD_THRESHOLD)
+        self.vad = NoiseFloorVAD(initial_threshold=VAD_THRESHOLD)
+        self.echo_canceller = EchoCanceller(sample_rate=SEND_SAMPLE_RATE, reference_rate=RECEIVE_SAMPLE_RATE)
+        self.audio_encoder = create_encoder(AUDIO_UPSTREAM_ENCODER, sample_rate=SEND_SAMPLE_RATE, batch_ms=AUDIO_SEND_BATCH_MS)
         self._silence_start_time = None
         
         # Initialize ProjectManager
@@ -384,6 +507,8 @@ class AudioLoop:
             self.project_manager = ProjectManager(project_root)
         
         self.search_agent = SearchAgent(self.trello_agent, self.project_manager, self.scraper_agent)
+        self._memory_indexes = {} # project path -> MemoryIndex
+        self._session_contexts = {} # project path -> SessionContext
         self.proactive_agent = ProactiveAgent(session=None, project_manager=self.project_manager)
 
         # Sync Initial Project State
@@ -393,15 +518,83 @@ class AudioLoop:
             # We will handle this by calling it in run() or just print for now.
             pass
 
+    def log_chat(self, sender, text):
+        """Logs a chat message to the project history and the session context used for reconnects."""
+        self.project_manager.log_chat(sender, text)
+        self.get_session_context().add_turn(sender, text)
+
     def flush_chat(self):
         """Forces the current chat buffer to be written to log."""
         if self.chat_buffer["sender"] and self.chat_buffer["text"].strip():
-            self.project_manager.log_chat(self.chat_buffer["sender"], self.chat_buffer["text"])
+            self.log_chat(self.chat_buffer["sender"], self.chat_buffer["text"])
             self.chat_buffer = {"sender": None, "text": ""}
+        # Hand the turn to the background writer without waiting on disk
+        self.project_manager.flush_chat_log()
         # Reset transcription tracking for new turn
         self._last_input_transcription = ""
         self._last_output_transcription = ""
 
+    def get_session_context(self):
+        """Returns the conversation context carried across sessions for the current project."""
+        project_path = str(self.project_manager.get_current_project_path())
+        context = self._session_contexts.get(project_path)
+        if context is None:
+            context = SessionContext(summarize_fn=summarize_turns)
+            self._session_contexts[project_path] = context
+        return context
+
+    def get_memory_index(self):
+        """Returns the semantic memory index for the current project."""
+        project_path = str(self.project_manager.get_current_project_path())
+        index = self._memory_indexes.get(project_path)
+        if index is None:
+            index = MemoryIndex(self.project_manager, project_path, embed_texts)
+            self._memory_indexes[project_path] = index
+        return index
+
+    async def sync_memory_index(self):
+        """Keeps the current project's memory index up to date in the background, so recall never embeds inline."""
+        while True:
+            try:
+                added = await self.get_memory_index().sync_if_changed()
+                if added and INCLUDE_RAW_LOGS:
+                    print(f"[ADA DEBUG] [MEMORY] Indexed {added} new chunks")
+            except Exception as e:
+                print(f"[ADA DEBUG] [ERR] Memory index sync failed: {e}")
+            await asyncio.sleep(MEMORY_SYNC_INTERVAL)
+
+    async def _rehydrate_session(self, is_reconnect):
+        """Restores conversation continuity in a new session with one bounded message."""
+        try:
+            # Keyed by project, so a session opened by a project switch gets that project's conversation
+            session_context = self.get_session_context()
+            if session_context.is_empty():
+                recent = await asyncio.to_thread(self.project_manager.get_recent_chat_history, session_context.max_recent_turns)
+                session_context.seed(recent)
+            message = session_context.build_rehydration(reconnect=is_reconnect)
+            if message and self.session:
+                if INCLUDE_RAW_LOGS:
+                    print(f"[ADA DEBUG] [CONTEXT] Rehydrating session ({len(message)} chars)")
+                await self.session.send(input=message, end_of_turn=False)
+        except Exception as e:
+            if INCLUDE_RAW_LOGS:
+                print(f"[ADA DEBUG] [ERR] Failed to rehydrate session: {e}")
+
+    async def _send_project_context(self, full=True):
+        """Sends the budgeted project context, or only what changed since the last send, into the session."""
+        try:
+            if full:
+                context = await asyncio.to_thread(self.project_manager.get_project_context)
+            else:
+                context = await asyncio.to_thread(self.project_manager.get_project_context_delta)
+            if context and self.session:
+                if INCLUDE_RAW_LOGS:
+                    print(f"[ADA DEBUG] [CONTEXT] Sending {'full' if full else 'delta'} project context ({len(context)} chars)")
+                await self.session.send(input=f"System Notification: {context}", end_of_turn=False)
+        except Exception as e:
+            if INCLUDE_RAW_LOGS:
+                print(f"[ADA DEBUG] [ERR] Failed to send project context: {e}")
+
     def update_permissions(self, new_perms):
         if INCLUDE_RAW_LOGS:
             print(f"[ADA DEBUG] [CONFIG] Updating tool permissions: {new_perms}")
@@ -410,6 +603,31 @@ class AudioLoop:
     def set_paused(self, paused):
         self.paused = paused
 
+    async def set_input_device(self, device_name=None, device_index=None):
+        """Hot-swaps the microphone without restarting the session."""
+        self.input_device_name = device_name
+        self.input_device_index = device_index
+        return await asyncio.to_thread(self.audio_devices.set_input_device, device_name, device_index)
+
+    def get_audio_metrics(self):
+        """Playback buffer and device counters, for tuning latency against smoothness."""
+        metrics = {
+            "devices": dict(self.audio_devices.metrics),
+            "barge_in": dict(self.barge_in.metrics),
+            "echo": dict(self.echo_canceller.metrics),
+            "vad": {"noise_floor": round(self.vad.noise_floor, 1), "threshold": round(self.vad.threshold, 1)},
+            "upstream": self.audio_encoder.metrics(),
+            "frames": self.frame_pipeline.metrics(),
+            "latest_frame": self.latest_frame.metrics(),
+        }
+        if self.send_pipeline:
+            metrics["send_pipeline"] = self.send_pipeline.metrics()
+        if self.screen_capture:
+            metrics["screen"] = self.screen_capture.metrics()
+        if self.playback_buffer:
+            metrics["playback"] = self.playback_buffer.metrics()
+        return metrics
+
     def set_last_input_source(self, source):
         self.last_input_source = source
 
@@ -421,6 +639,7 @@ class AudioLoop:
             if INCLUDE_RAW_LOGS:
                 print(f"[ADA DEBUG] [SHUTDOWN] Signaling stop for session: {session_id}")
             task_info["stop_event"].set()
+        self.flush_chat()
 
     def reconnect(self):
         """Signals the main loop to reconnect."""
@@ -489,180 +708,115 @@ class AudioLoop:
                 print(f"[ADA DEBUG] [WARN] Confirmation Request {request_id} not found in pending dict. Keys: {list(self._pending_confirmations.keys())}")
 
     def clear_audio_queue(self):
-        """Clears the queue of pending audio chunks to stop playback immediately."""
+        """Drops pending model audio to stop playback immediately."""
         try:
-            count = 0
-            while not self.audio_in_queue.empty():
-                self.audio_in_queue.get_nowait()
-                count += 1
-            if count > 0:
+            depth_ms = self.playback_buffer.depth_ms()
+            self.playback_buffer.flush()
+            # Also drop what has already been handed to the output device
+            self.audio_devices.flush_output()
+            if depth_ms > 0:
                 if INCLUDE_RAW_LOGS:
-                    print(f"[ADA DEBUG] [AUDIO] Cleared {count} chunks from playback queue due to interruption.")
+                    print(f"[ADA DEBUG] [AUDIO] Cleared {depth_ms:.0f}ms of buffered playback due to interruption.")
         except Exception as e:
             if INCLUDE_RAW_LOGS:
                 print(f"[ADA DEBUG] [ERR] Failed to clear audio queue: {e}")
 
     async def send_frame(self, frame_data):
-        # Update the latest frame payload
-        if isinstance(frame_data, bytes):
-            b64_data = base64.b64encode(frame_data).decode('utf-8')
-        else:
-            b64_data = frame_data 
+        # Replaces the latest frame slot. Raw bytes are kept as-is; the SDK base64-encodes them once at send time
+        self.latest_frame.put(frame_data)
 
-        # Store as the designated "next frame to send"
-        self._latest_image_payload = {"mime_type": "image/jpeg", "data": b64_data}
-        # No event signal needed - listen_audio pulls it
+    async def send_latest_frame(self):
+        """Sends the latest UI frame now if the session hasn't seen it. Returns True if one was sent."""
+        payload = self.latest_frame.take_unsent()
+        if payload is None:
+            return False
+        await self._send_payload(payload)
+        return True
 
     async def send_realtime(self):
-        while True:
-            msg = await self.out_queue.get()
-            await self.session.send(input=msg, end_of_turn=False)
-
-    async def listen_audio(self):
-        mic_info = pya.get_default_input_device_info()
-
-        # Resolve Input Device by Name if provided
-        resolved_input_device_index = None
-        
-        if self.input_device_name:
-            if INCLUDE_RAW_LOGS:
-                print(f"[ADA] Attempting to find input device matching: '{self.input_device_name}'")
-            count = pya.get_device_count()
-            best_match = None
-            
-            for i in range(count):
-                try:
-                    info = pya.get_device_info_by_index(i)
-                    if info['maxInputChannels'] > 0:
-                        name = info.get('name', '')
-                        # Simple case-insensitive check
-                        if self.input_device_name.lower() in name.lower() or name.lower() in self.input_device_name.lower():
-                             if INCLUDE_RAW_LOGS:
-                                 print(f"   Candidate {i}: {name}")
-                             # Prioritize exact match or very close match if possible, but first match is okay for now
-                             resolved_input_device_index = i
-                             best_match = name
-                             break
-                except Exception:
-                    continue
-            
-            if resolved_input_device_index is not None:
-                if INCLUDE_RAW_LOGS:
-                    print(f"[ADA] Resolved input device '{self.input_device_name}' to index {resolved_input_device_index} ({best_match})")
-            else:
-                if INCLUDE_RAW_LOGS:
-                    print(f"[ADA] Could not find device matching '{self.input_device_name}'. Checking index...")
-
-        # Fallback to index if Name lookup failed or wasn't provided
-        if resolved_input_device_index is None and self.input_device_index is not None:
-             try:
-                 resolved_input_device_index = int(self.input_device_index)
-                 if INCLUDE_RAW_LOGS:
-                     print(f"[ADA] Requesting Input Device Index: {resolved_input_device_index}")
-             except ValueError:
-                 if INCLUDE_RAW_LOGS:
-                     print(f"[ADA] Invalid device index '{self.input_device_index}', reverting to default.")
-                 resolved_input_device_index = None
+        await self.send_pipeline.run()
+
+    async def _send_payload(self, msg):
+        """Sends one realtime-input payload on the current session."""
+        captured_at = msg.get("_captured_at")
+        frame_seq = msg.get("_frame_seq")
+        msg = {k: v for k, v in msg.items() if not k.startswith("_")}
+        await self.session.send(input=msg, end_of_turn=False)
+        if frame_seq is not None:
+            self.latest_frame.mark_sent(frame_seq)
+        else:
+            self.audio_encoder.record_sent(captured_at)
 
-        if resolved_input_device_index is None:
-             if INCLUDE_RAW_LOGS:
-                 print("[ADA] Using Default Input Device")
+    def _queue_audio(self, pcm, captured_at=None):
+        """Runs captured audio through the upstream encoder and queues full batches for sending."""
+        payload = self.audio_encoder.encode(pcm, captured_at)
+        if payload and self.send_pipeline:
+            self.send_pipeline.put_audio(payload)
 
-        # Determine actual channels to use
-        actual_input_device_index = resolved_input_device_index if resolved_input_device_index is not None else mic_info["index"]
-        
-        # Try to open with requested CHANNELS, fallback if needed
-        self.audio_stream = None
-        stream_channels = CHANNELS
-        
-        try:
-            self.audio_stream = await asyncio.to_thread(
-                pya.open,
-                format=FORMAT,
-                channels=CHANNELS,
-                rate=SEND_SAMPLE_RATE,
-                input=True,
-                input_device_index=actual_input_device_index,
-                frames_per_buffer=CHUNK_SIZE,
-            )
-        except OSError:
-            if INCLUDE_RAW_LOGS:
-                print(f"[ADA] Failed to open stream with {CHANNELS} channels. Trying to detect supported channels...")
-            try:
-                device_info = pya.get_device_info_by_index(actual_input_device_index)
-                max_channels = int(device_info.get('maxInputChannels', 0))
-                
-                # Try common counts up to max_channels
-                for c in [1, 2, 4, 8]:
-                    if c == CHANNELS: continue
-                    if c > max_channels and max_channels > 0: continue
-                    try:
-                        self.audio_stream = await asyncio.to_thread(
-                            pya.open,
-                            format=FORMAT,
-                            channels=c,
-                            rate=SEND_SAMPLE_RATE,
-                            input=True,
-                            input_device_index=actual_input_device_index,
-                            frames_per_buffer=CHUNK_SIZE,
-                        )
-                        stream_channels = c
-                        if INCLUDE_RAW_LOGS:
-                            print(f"[ADA] Successfully opened audio stream with {c} channels.")
-                        break
-                    except OSError:
-                        continue
-            except Exception as e:
-                if INCLUDE_RAW_LOGS:
-                    print(f"[ADA] [ERR] Device info lookup failed: {e}")
+    def _flush_audio(self):
+        """Queues any partially filled batch, e.g. at the end of an utterance."""
+        payload = self.audio_encoder.flush()
+        if payload and self.send_pipeline:
+            self.send_pipeline.put_audio(payload)
 
-        if not self.audio_stream:
+    async def listen_audio(self):
+        # The device manager keeps the stream open across sessions; this only opens it if the selection changed
+        opened = await asyncio.to_thread(self.audio_devices.set_input_device, self.input_device_name, self.input_device_index)
+        if not opened:
             if INCLUDE_RAW_LOGS:
                 print(f"[ADA] [ERR] Failed to open audio input stream: Invalid number of channels or device unavailable.")
-                print("[ADA] [WARN] Audio features will be disabled. Please check microphone permissions.")
-            return
+                print("[ADA] [WARN] Audio features will be disabled until a working input device is selected.")
 
-        if __debug__:
-            kwargs = {"exception_on_overflow": False}
-        else:
-            kwargs = {}
-        
         # VAD Constants
-        VAD_THRESHOLD = 800 # Adj based on mic sensitivity (800 is conservative for 16-bit)
         SILENCE_DURATION = 0.5 # Seconds of silence to consider "done speaking"
         PRE_ROLL_CHUNKS = int(SEND_SAMPLE_RATE / CHUNK_SIZE * 0.5) # 0.5 seconds of pre-roll
 
         from collections import deque
         audio_buffer = deque(maxlen=PRE_ROLL_CHUNKS)
+        was_paused = False
         
         while True:
             if self.paused:
+                was_paused = True
                 await asyncio.sleep(0.1)
                 continue
+            if was_paused:
+                # Capture and playback drifted apart while paused; realign the echo canceller
+                self.echo_canceller.reset()
+                was_paused = False
 
             try:
-                data = await asyncio.to_thread(self.audio_stream.read, CHUNK_SIZE, **kwargs)
-                
-                # Downmix if needed (Gemini expects Mono)
-                if stream_channels > 1:
-                    count = len(data) // (2 * stream_channels)
-                    if count > 0:
-                        shorts = struct.unpack(f"<{count * stream_channels}h", data)
-                        # Take the first channel (left)
-                        mono_shorts = shorts[::stream_channels]
-                        data = struct.pack(f"<{count}h", *mono_shorts)
+                # Filled by the capture callback, already downmixed to mono
+                data = await self.audio_devices.read_chunk(CHUNK_SIZE)
+                captured_at = time.monotonic()
+                if data is None:
+                    # No input device open (yet); wait for a hot swap
+                    await asyncio.sleep(0.5)
+                    continue
+
+                # Remove ADA's own playback before VAD, so it neither opens the stream nor barges in
+                self.echo_canceller.add_reference(self.audio_devices.read_reference())
+                data = self.echo_canceller.process(data)
 
                 # VAD Logic
-                count = len(data) // 2
-                if count > 0:
-                    shorts = struct.unpack(f"<{count}h", data)
-                    sum_squares = sum(s**2 for s in shorts)
-                    rms = int(math.sqrt(sum_squares / count))
-                else:
-                    rms = 0
+                rms = pcm_rms(data)
+                is_speech = self.vad.update(rms, self._is_speaking)
+                self.barge_in.vad_threshold = self.vad.threshold
+
+                # Local barge-in: react to the user talking over playback without waiting for the server
+                action = self.barge_in.process(rms)
+                if action == "duck":
+                    self.audio_devices.output_gain = BARGE_IN_DUCK_GAIN
+                elif action == "release":
+                    self.audio_devices.output_gain = 1.0
+                elif action == "barge_in":
+                    self.clear_audio_queue()
+                    self.audio_devices.output_gain = 1.0
+                    if INCLUDE_RAW_LOGS:
+                        print(f"[ADA DEBUG] [VAD] Barge-in (RMS: {rms}). Playback flushed {self.barge_in.metrics['last_local_ms']}ms after speech onset.")
                 
                 # State Machine
-                if rms > VAD_THRESHOLD:
+                if is_speech:
                     # Speech Detected
                     self._silence_start_time = None
                     
@@ -675,26 +829,25 @@ class AudioLoop:
                         # 1. Send Buffered Pre-roll (catch the start of the word)
                         while audio_buffer:
                              buffered_data = audio_buffer.popleft()
-                             if self.out_queue:
-                                 await self.out_queue.put({"data": buffered_data, "mime_type": "audio/pcm"})
+                             self._queue_audio(buffered_data)
+                        self._flush_audio()
 
-                        # 2. Send Video Frame (Once per utterance)
-                        if self._latest_image_payload and self.out_queue:
-                            await self.out_queue.put(self._latest_image_payload)
+                        # 2. Send Video Frame (Once per utterance, only if the model hasn't seen it)
+                        frame_payload = self.latest_frame.take_unsent()
+                        if frame_payload and self.send_pipeline:
+                            self.send_pipeline.put_image(frame_payload)
                         else:
                             if INCLUDE_RAW_LOGS:
-                                print(f"[ADA DEBUG] [VAD] No video frame available to send.")
+                                print(f"[ADA DEBUG] [VAD] No new video frame to send.")
 
                     # Send Current Chunk
-                    if self.out_queue:
-                        await self.out_queue.put({"data": data, "mime_type": "audio/pcm"})
+                    self._queue_audio(data, captured_at)
                             
                 else:
                     # Silence Detected
                     if self._is_speaking:
                         # Hangover Period - continue sending until silence duration met
-                        if self.out_queue:
-                            await self.out_queue.put({"data": data, "mime_type": "audio/pcm"})
+                        self._queue_audio(data, captured_at)
 
                         if self._silence_start_time is None:
                             self._silence_start_time = time.time()
@@ -705,6 +858,7 @@ class AudioLoop:
                                 print(f"[ADA DEBUG] [VAD] Silence timeout. Stopping Stream.")
                             self._is_speaking = False
                             self._silence_start_time = None
+                            self._flush_audio()
                     else:
                         # Not speaking, buffer audio for pre-roll
                         audio_buffer.append(data)
@@ -835,6 +989,7 @@ class AudioLoop:
             os.makedirs(os.path.dirname(final_path), exist_ok=True)
             with open(final_path, 'w', encoding='utf-8') as f:
                 f.write(content)
+            self.project_manager.notify_file_changed(final_path)
             result = f"File '{final_path}' written successfully to project '{self.project_manager.current_project}'."
         except Exception as e:
             result = f"Failed to write file '{path}': {str(e)}"
@@ -1231,7 +1386,12 @@ class AudioLoop:
         else:
             return "Failed to list Jules activities."
 
-    def _get_live_connect_config(self):
+    def _live_config_key(self):
+        """Identifies the parts of the connect config a resumed session can't change."""
+        project_config = self.project_manager.get_project_config()
+        return (self.project_manager.current_project, project_config.get("system_prompt"), project_config.get("voice_name"))
+
+    def _get_live_connect_config(self, resumption_handle=None):
         project_config = self.project_manager.get_project_config()
 
         # Hardcoded mandatory instructions for tool usage
@@ -1280,6 +1440,7 @@ User: "What's the weather in London?"
             input_audio_transcription={},
             system_instruction=system_prompt,
             tools=tools,
+            session_resumption=types.SessionResumptionConfig(handle=resumption_handle),
             speech_config=types.SpeechConfig(
                 voice_config=types.VoiceConfig(
                     prebuilt_voice_config=types.PrebuiltVoiceConfig(
@@ -1289,7 +1450,7 @@ User: "What's the weather in London?"
             )
         )
 
-    async def receive_audio(self):
+    async def receive_audio(self, session):
         "Background task to reads from the websocket and write pcm chunks to the output queue"
         service_info = f"Service: Gemini Multimodal Live API, Endpoint: {MODEL}"
         try:
@@ -1298,7 +1459,7 @@ User: "What's the weather in London?"
             while True:
                 spoken_response_for_slack = ""
                 try:
-                    turn = self.session.receive()
+                    turn = session.receive()
                 except Exception as e:
                     if INCLUDE_RAW_LOGS:
                         print(f"[ADA DEBUG] [ERR] Session receive error ({service_info}): {e}")
@@ -1306,6 +1467,16 @@ User: "What's the weather in London?"
 
                 full_turn_text_response = ""
                 async for response in turn:
+                    if response.session_resumption_update:
+                        update = response.session_resumption_update
+                        if update.resumable and update.new_handle:
+                            self._resumption_handle = update.new_handle
+                    if response.go_away:
+                        # The server is about to close this connection; move to a new one while it still works
+                        if INCLUDE_RAW_LOGS:
+                            print(f"[ADA DEBUG] [RECONNECT] Server go_away received (time left: {response.go_away.time_left}).")
+                        self.reconnect()
+
                     # Access parts directly to avoid 'non-data parts' / 'non-text parts' warnings 
                     # from the SDK's lazy properties (.text, .data, .thought)
                     if response.server_content and response.server_content.model_turn:
@@ -1333,13 +1504,15 @@ User: "What's the weather in London?"
                                     # Update chat buffer for logging
                                     if self.chat_buffer["sender"] != "ADA":
                                         if self.chat_buffer["sender"] and self.chat_buffer["text"].strip():
-                                            self.project_manager.log_chat(self.chat_buffer["sender"], self.chat_buffer["text"])
+                                            self.log_chat(self.chat_buffer["sender"], self.chat_buffer["text"])
                                         self.chat_buffer = {"sender": "ADA", "text": text_content}
                                     else:
                                         self.chat_buffer["text"] += text_content
 
                                 if hasattr(part, 'inline_data') and part.inline_data:
-                                    self.audio_in_queue.put_nowait(part.inline_data.data)
+                                    # Audio still in flight for a turn the user barged in on is dropped
+                                    if not self.barge_in.gate_active():
+                                        self.playback_buffer.put(part.inline_data.data)
 
                                 if hasattr(part, 'call') and part.call:
                                     if INCLUDE_RAW_LOGS:
@@ -1350,6 +1523,12 @@ User: "What's the weather in London?"
                     # But actually, response.data is just a shortcut. 
                     # To avoid the warning completely, we should NOT access response.data if we already processed parts.
                     
+                    if response.server_content and response.server_content.interrupted:
+                        self.barge_in.note_server_interrupt()
+                        self.clear_audio_queue()
+                        if INCLUDE_RAW_LOGS:
+                            print(f"[ADA DEBUG] [AUDIO] Server reported interruption (local barge-in led by {self.barge_in.metrics['last_server_ms']}ms).")
+
                     # 2. Handle Transcription (User & Model)
                     if response.server_content:
                         if response.server_content.input_transcription:
@@ -1377,7 +1556,7 @@ User: "What's the weather in London?"
                                         if self.chat_buffer["sender"] != "User":
                                             # Flush previous if exists
                                             if self.chat_buffer["sender"] and self.chat_buffer["text"].strip():
-                                                self.project_manager.log_chat(self.chat_buffer["sender"], self.chat_buffer["text"])
+                                                self.log_chat(self.chat_buffer["sender"], self.chat_buffer["text"])
                                             # Start new
                                             self.chat_buffer = {"sender": "User", "text": delta}
                                         else:
@@ -1406,7 +1585,7 @@ User: "What's the weather in London?"
                                         if self.chat_buffer["sender"] != "ADA":
                                             # Flush previous
                                             if self.chat_buffer["sender"] and self.chat_buffer["text"].strip():
-                                                self.project_manager.log_chat(self.chat_buffer["sender"], self.chat_buffer["text"])
+                                                self.log_chat(self.chat_buffer["sender"], self.chat_buffer["text"])
                                             # Start new
                                             self.chat_buffer = {"sender": "ADA", "text": delta}
                                         else:
@@ -1485,7 +1664,7 @@ User: "What's the weather in London?"
                                     response={"result": result}
                                 )
                                 function_responses.append(function_response)
-                            elif fc.name in ["generate_cad", "generate_cad_prototype", "run_web_agent", "run_jules_agent", "send_jules_feedback", "list_jules_sources", "list_jules_activities", "write_file", "read_directory", "read_file", "create_project", "switch_project", "list_projects", "list_smart_devices", "control_light", "discover_printers", "print_stl", "get_print_status", "iterate_cad", "set_timer", "set_reminder", "list_timers", "delete_entry", "modify_timer", "check_for_updates", "apply_update", "search_gifs", "display_content", "get_weather", "set_time_format", "get_datetime", "restart_application", "search", "proactive_suggestion", "send_slack_message", "append_system_prompt", "delete_custom_system_prompt", "get_system_prompt"]:
+                            elif fc.name in ["generate_cad", "generate_cad_prototype", "run_web_agent", "run_jules_agent", "send_jules_feedback", "list_jules_sources", "list_jules_activities", "write_file", "read_directory", "read_file", "create_project", "switch_project", "list_projects", "list_smart_devices", "control_light", "control_light_group", "save_light_group", "list_light_groups", "discover_printers", "print_stl", "get_print_status", "iterate_cad", "set_timer", "set_reminder", "list_timers", "delete_entry", "modify_timer", "check_for_updates", "apply_update", "search_gifs", "display_content", "get_weather", "set_time_format", "get_datetime", "restart_application", "search", "proactive_suggestion", "send_slack_message", "append_system_prompt", "delete_custom_system_prompt", "get_system_prompt", "recall"]:
                                 prompt = fc.args.get("prompt", "") # Prompt is not present for all tools
 
                                 if fc.name == "append_system_prompt":
@@ -1552,6 +1731,22 @@ User: "What's the weather in London?"
                                         response={"result": result},
                                     )
                                     function_responses.append(function_response)
+                                elif fc.name == "recall":
+                                    query = fc.args["query"]
+                                    k = int(fc.args.get("k", 5))
+                                    if INCLUDE_RAW_LOGS:
+                                        print(f"[ADA DEBUG] [TOOL] Tool Call: 'recall' query='{query}' k={k}", flush=True)
+                                    try:
+                                        memories = await self.get_memory_index().recall(query, k=k)
+                                        result = [{"source": m["source"], "text": m["text"], "score": m["score"]} for m in memories]
+                                    except Exception as e:
+                                        result = f"Failed to search memory: {e}"
+                                    function_response = types.FunctionResponse(
+                                        id=fc.id,
+                                        name=fc.name,
+                                        response={"result": result},
+                                    )
+                                    function_responses.append(function_response)
                                 elif fc.name == "restart_application":
                                     result = await self.handle_restart_application()
                                     function_response = types.FunctionResponse(
@@ -1773,42 +1968,18 @@ User: "What's the weather in London?"
                                 elif fc.name == "list_smart_devices":
                                     if INCLUDE_RAW_LOGS:
                                         print(f"[ADA DEBUG] [TOOL] Tool Call: 'list_smart_devices'", flush=True)
-                                    # Use cached devices directly for speed
-                                    # devices_dict is {ip: SmartDevice}
-                                    # Use cached devices directly for speed
-                                    # devices_dict is {ip: SmartDevice}
-
+                                    # Served from the KasaAgent state cache - no device round trips
+                                    frontend_list = self.kasa_agent.get_device_list()
                                     dev_summaries = []
-                                    frontend_list = []
-
-                                    for ip, d in self.kasa_agent.devices.items():
-                                        dev_type = "unknown"
-                                        if d.is_bulb: dev_type = "bulb"
-                                        elif d.is_plug: dev_type = "plug"
-                                        elif d.is_strip: dev_type = "strip"
-                                        elif d.is_dimmer: dev_type = "dimmer"
-
+                                    for d in frontend_list:
                                         # Format for Model
-                                        info = f"{d.alias} (IP: {ip}, Type: {dev_type})"
-                                        if d.is_on:
+                                        info = f"{d['alias']} (IP: {d['ip']}, Type: {d['type']})"
+                                        if d['is_on']:
                                             info += " [ON]"
                                         else:
                                             info += " [OFF]"
                                         dev_summaries.append(info)
 
-                                        # Format for Frontend
-                                        frontend_list.append({
-                                            "ip": ip,
-                                                "alias": d.alias,
-                                                "model": d.model,
-                                            "type": dev_type,
-                                                "is_on": d.is_on,
-                                                "brightness": d.brightness if d.is_bulb or d.is_dimmer else None,
-                                                "hsv": d.hsv if d.is_bulb and d.is_color else None,
-                                                "has_color": d.is_color if d.is_bulb else False,
-                                                "has_brightness": d.is_dimmable if d.is_bulb or d.is_dimmer else False
-                                        })
-
                                     result_str = "No devices found in cache."
                                     if dev_summaries:
                                         result_str = "Found Devices (Cached):\n" + "\n".join(dev_summaries)
@@ -1831,64 +2002,15 @@ User: "What's the weather in London?"
                                     if INCLUDE_RAW_LOGS:
                                         print(f"[ADA DEBUG] [TOOL] Tool Call: 'control_light' Target='{target}' Action='{action}'")
 
-                                    result_msg = f"Action '{action}' on '{target}' failed."
-                                    success = False
-
-                                    if action == "turn_on":
-                                        success = await self.kasa_agent.turn_on(target)
-                                        if success:
-                                            result_msg = f"Turned ON '{target}'."
-                                    elif action == "turn_off":
-                                        success = await self.kasa_agent.turn_off(target)
-                                        if success:
-                                            result_msg = f"Turned OFF '{target}'."
-                                    elif action == "set":
-                                        success = True
-                                        result_msg = f"Updated '{target}':"
-
-                                    # Apply extra attributes if 'set' or if we just turned it on and want to set them too
-                                    if success or action == "set":
-                                        if brightness is not None:
-                                            sb = await self.kasa_agent.set_brightness(target, brightness)
-                                            if sb:
-                                                result_msg += f" Set brightness to {brightness}."
-                                        if color is not None:
-                                            sc = await self.kasa_agent.set_color(target, color)
-                                            if sc:
-                                                result_msg += f" Set color to {color}."
+                                    result = await self.kasa_agent.control(target, action, brightness, color)
+                                    success = result["success"]
+                                    result_msg = result["message"]
 
                                     # Notify Frontend of State Change
                                     if success:
-                                        # We don't need full discovery, just refresh known state or push update
-                                        # But for simplicity, let's get the standard list representation
-                                        # KasaAgent updates its internal state on control, so we can rebuild the list
-
-                                        # Quick rebuild of list from internal dict
-                                        updated_list = []
-                                        for ip, dev in self.kasa_agent.devices.items():
-                                            # We need to ensure we have the correct dict structure expected by frontend
-                                            # We duplicate logic from KasaAgent.discover_devices a bit, but that's okay for now or we can add a helper
-                                            # Ideally KasaAgent has a 'get_devices_list()' method.
-                                            # Use the cached objects in self.kasa_agent.devices
-
-                                            dev_type = "unknown"
-                                            if dev.is_bulb: dev_type = "bulb"
-                                            elif dev.is_plug: dev_type = "plug"
-                                            elif dev.is_strip: dev_type = "strip"
-                                            elif dev.is_dimmer: dev_type = "dimmer"
-
-                                            d_info = {
-                                                "ip": ip,
-                                                "alias": dev.alias,
-                                                "model": dev.model,
-                                                "type": dev_type,
-                                                "is_on": dev.is_on,
-                                                "brightness": dev.brightness if dev.is_bulb or dev.is_dimmer else None,
-                                                "hsv": dev.hsv if dev.is_bulb and dev.is_color else None,
-                                                "has_color": dev.is_color if dev.is_bulb else False,
-                                                "has_brightness": dev.is_dimmable if dev.is_bulb or dev.is_dimmer else False
-                                            }
-                                            updated_list.append(d_info)
+                                        # KasaAgent applies successful commands to its state cache,
+                                        # so the list can be pushed without querying the devices again
+                                        updated_list = self.kasa_agent.get_device_list()
 
                                         if self.on_device_update:
                                             self.on_device_update(updated_list)
@@ -1902,6 +2024,45 @@ User: "What's the weather in London?"
                                     )
                                     function_responses.append(function_response)
 
+                                elif fc.name == "control_light_group":
+                                    action = fc.args["action"]
+                                    group = fc.args.get("group")
+                                    targets = fc.args.get("targets")
+                                    brightness = fc.args.get("brightness")
+                                    color = fc.args.get("color")
+
+                                    if INCLUDE_RAW_LOGS:
+                                        print(f"[ADA DEBUG] [TOOL] Tool Call: 'control_light_group' Group='{group}' Targets={targets} Action='{action}'")
+
+                                    # One round of parallel requests for the whole group
+                                    result = await self.kasa_agent.control_group(action, group=group, targets=targets, brightness=brightness, color=color)
+
+                                    if result["succeeded"] and self.on_device_update:
+                                        self.on_device_update(self.kasa_agent.get_device_list())
+                                    if result["failed"] and self.on_error:
+                                        self.on_error(result["message"])
+
+                                    function_response = types.FunctionResponse(
+                                        id=fc.id, name=fc.name, response={"result": result}
+                                    )
+                                    function_responses.append(function_response)
+
+                                elif fc.name == "save_light_group":
+                                    name = fc.args["name"]
+                                    targets = fc.args.get("targets", [])
+                                    success, msg = self.kasa_agent.save_group(name, targets)
+                                    function_response = types.FunctionResponse(
+                                        id=fc.id, name=fc.name, response={"result": msg}
+                                    )
+                                    function_responses.append(function_response)
+
+                                elif fc.name == "list_light_groups":
+                                    groups = self.kasa_agent.list_groups()
+                                    function_response = types.FunctionResponse(
+                                        id=fc.id, name=fc.name, response={"result": groups if groups else "No device groups saved. 'all' controls every known device."}
+                                    )
+                                    function_responses.append(function_response)
+
                                 elif fc.name == "discover_printers":
                                     if INCLUDE_RAW_LOGS:
                                         print(f"[ADA DEBUG] [TOOL] Tool Call: 'discover_printers'")
@@ -2092,7 +2253,7 @@ User: "What's the weather in London?"
                         if function_responses:
                             if INCLUDE_RAW_LOGS:
                                 print(f"[ADA DEBUG] [TOOL] Sending tool responses back to model: {function_responses}", flush=True)
-                            await self.session.send_tool_response(function_responses=function_responses)
+                            await session.send_tool_response(function_responses=function_responses)
                 
                 # Turn/Response Loop Finished
                 # Check if we have a Slack message to send
@@ -2110,8 +2271,9 @@ User: "What's the weather in London?"
                         asyncio.create_task(self.slack_agent.send_message(spoken_response_for_slack))
                 self.set_last_input_source('ui')
 
-                while not self.audio_in_queue.empty():
-                    self.audio_in_queue.get_nowait()
+                # Let the rest of this turn's audio play out
+                self.playback_buffer.mark_end_of_turn()
+                self.barge_in.release_gate()
         except Exception as e:
             if "1011" in str(e) or "CANCELLED" in str(e).upper():
                 if INCLUDE_RAW_LOGS:
@@ -2124,248 +2286,342 @@ User: "What's the weather in London?"
             raise e
 
     async def play_audio(self):
-        stream = await asyncio.to_thread(
-            pya.open,
-            format=FORMAT,
-            channels=CHANNELS,
-            rate=RECEIVE_SAMPLE_RATE,
-            output=True,
-            output_device_index=self.output_device_index,
-        )
+        await asyncio.to_thread(self.audio_devices.set_output_device, self.output_device_index)
         while True:
-            bytestream = await self.audio_in_queue.get()
+            bytestream = await self.playback_buffer.get()
+            # Playback level feeds the barge-in echo gate
+            self.barge_in.note_playback(pcm_rms(bytestream))
             if self.on_audio_data:
                 self.on_audio_data(bytestream)
-            await asyncio.to_thread(stream.write, bytestream)
+            # Waits only while the playback ring is full; the device pulls from it in its own callback
+            await self.audio_devices.write_chunk(bytestream)
 
     async def get_frames(self):
         cap = await asyncio.to_thread(cv2.VideoCapture, 0, cv2.CAP_AVFOUNDATION)
-        while True:
-            if self.paused:
-                await asyncio.sleep(0.1)
-                continue
-            frame = await asyncio.to_thread(self._get_frame, cap)
-            if frame is None:
-                break
-            await asyncio.sleep(1.0)
-            if self.out_queue:
-                await self.out_queue.put(frame)
-        cap.release()
+        try:
+            while True:
+                if self.paused:
+                    await asyncio.sleep(0.1)
+                    continue
+                ret, frame = await asyncio.to_thread(self._get_frame, cap)
+                if not ret:
+                    break
+                await asyncio.sleep(1.0)
+                # None means the scene hasn't changed since the last frame sent
+                if frame is not None and self.send_pipeline:
+                    # Replaces any frame still waiting to be sent
+                    self.send_pipeline.put_image(frame)
+        finally:
+            # Released on errors too, so a restarted worker can reopen the camera
+            cap.release()
 
     def _get_frame(self, cap):
+        """Reads one camera frame. Returns (ok, payload), with payload None for an unchanged scene."""
         ret, frame = cap.read()
         if not ret:
+            return False, None
+        image_bytes = self.frame_pipeline.process(frame)
+        if image_bytes is None:
+            return True, None
+        return True, {"mime_type": "image/jpeg", "data": image_bytes}
+
+    def _get_screen(self):
+        """Grabs the screen. Returns a payload, or None if nothing changed."""
+        image_bytes = self.screen_capture.capture()
+        if image_bytes is None:
             return None
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = PIL.Image.fromarray(frame_rgb)
-        img.thumbnail([1024, 1024])
-        image_io = io.BytesIO()
-        img.save(image_io, format="jpeg")
-        image_io.seek(0)
-        image_bytes = image_io.read()
-        return {"mime_type": "image/jpeg", "data": base64.b64encode(image_bytes).decode()}
-
-    async def _get_screen(self):
-        pass 
-    async def get_screen(self):
-         pass
-
-    async def _session_runner(self, start_message=None, is_reconnect=False):
-        """Handles a single connection and run-loop of the voice agent."""
-        # Force reset message_source to ensure clean state on new session/reconnect
-        self.message_source = None
+        return {"mime_type": "image/jpeg", "data": image_bytes}
 
-        service_info = f"Service: Gemini Multimodal Live API, Endpoint: {MODEL}"
-        if INCLUDE_RAW_LOGS:
-            print(f"[ADA DEBUG] [SESSION] Starting session runner. Reconnect: {is_reconnect}")
+    async def get_screen(self):
+        self.screen_capture = ScreenCapture(region=SCREEN_CAPTURE_REGION)
+        # mss handles belong to the thread that opened them, so every grab runs on the same thread
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="screen")
+        loop = asyncio.get_running_loop()
         try:
-            if INCLUDE_RAW_LOGS:
-                print(f"[ADA DEBUG] [CONNECT] Connecting to {service_info}...")
-
-            config = self._get_live_connect_config()
-
-            tasks = []
-            async with client.aio.live.connect(model=MODEL, config=config) as session:
+            while True:
+                if self.paused:
+                    await asyncio.sleep(0.1)
+                    continue
                 try:
-                    self.session = session
-                    self.timer_agent.session = session
-                    self.proactive_agent.session = session
-
-                    self.audio_in_queue = asyncio.Queue()
-                    self.out_queue = asyncio.Queue(maxsize=10)
-
-                    tasks.append(asyncio.create_task(self.send_realtime()))
-                    # Run listen_audio as a separate, non-critical background task
-                    # This prevents the main session from crashing if audio input fails (e.g., in a headless environment)
-                    audio_input_task = asyncio.create_task(self.listen_audio())
-                    tasks.append(audio_input_task) # Still track it for cleanup
+                    frame = await loop.run_in_executor(executor, self._get_screen)
+                except Exception as e:
+                    print(f"[ADA DEBUG] [ERR] Screen capture failed: {e}")
+                    break
+                if frame is not None and self.send_pipeline:
+                    self.send_pipeline.put_image(frame)
+                # Shortens while the screen is changing and backs off while it's idle
+                await asyncio.sleep(self.screen_capture.interval)
+        finally:
+            await loop.run_in_executor(executor, self.screen_capture.close)
+            executor.shutdown(wait=False)
 
-                    if self.video_mode == "camera":
-                        tasks.append(asyncio.create_task(self.get_frames()))
-                    elif self.video_mode == "screen":
-                        tasks.append(asyncio.create_task(self.get_screen()))
+    async def _connect(self):
+        """Opens a Live session. Resumes the previous one if the connect config hasn't changed."""
+        config_key = self._live_config_key()
+        handle = self._resumption_handle if config_key == self._resumption_config_key else None
+        config = self._get_live_connect_config(resumption_handle=handle)
 
-                    tasks.append(asyncio.create_task(self.receive_audio()))
-                    tasks.append(asyncio.create_task(self.play_audio()))
-                    tasks.append(asyncio.create_task(self.proactive_agent.run()))
+        stack = contextlib.AsyncExitStack()
+        started = time.monotonic()
+        try:
+            session = await stack.enter_async_context(client.aio.live.connect(model=MODEL, config=config))
+        except BaseException:
+            await stack.aclose()
+            raise
+        if config_key != self._resumption_config_key:
+            # A handle from a different prompt/voice can't be resumed
+            self._resumption_handle = None
+            self._resumption_config_key = config_key
+        return {
+            "session": session,
+            "stack": stack,
+            "resumed": handle is not None,
+            "connect_ms": (time.monotonic() - started) * 1000,
+        }
+
+    async def _close_connection(self, connection):
+        if connection is None:
+            return
+        task = connection.get("receive_task")
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        try:
+            await connection["stack"].aclose()
+        except Exception as e:
+            if INCLUDE_RAW_LOGS:
+                print(f"[ADA DEBUG] [SESSION] Error closing old session: {e}")
+
+    def _start_workers(self):
+        """Starts the tasks that outlive individual sessions, so audio devices stay open across reconnects."""
+        workers = {
+            "send_realtime": self.send_realtime,
+            # listen_audio keeps polling without an input device (e.g. headless) until one is selected
+            "listen_audio": self.listen_audio,
+            "play_audio": self.play_audio,
+            "proactive_agent": self.proactive_agent.run,
+            "jules_monitoring": lambda: self.jules_agent.start_monitoring(self._handle_jules_status_change),
+            # The first pass indexes the project as soon as it loads; later passes follow project switches
+            "memory_sync": self.sync_memory_index,
+        }
+        if self.video_mode == "camera":
+            workers["get_frames"] = self.get_frames
+        elif self.video_mode == "screen":
+            workers["get_screen"] = self.get_screen
+        return {name: asyncio.create_task(self._supervise(name, factory)) for name, factory in workers.items()}
+
+    async def _supervise(self, name, factory):
+        """
+        Runs a session-independent worker for the whole run. A worker that
+        raises is logged and restarted with backoff, so one bad chunk doesn't
+        leave audio or video dead until the process restarts. A worker that
+        returns normally is not restarted; the audio workers never return on
+        their own (listen_audio keeps polling until an input device opens),
+        while get_frames returns once the camera stops delivering frames.
+        """
+        delay = RECONNECT_BASE_DELAY
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                await factory()
+                return
+            except Exception as e:
+                print(f"[ADA DEBUG] [ERR] Worker '{name}' crashed: {e}")
+                traceback.print_exc()
+            if time.monotonic() - started > RECONNECT_MAX_DELAY * 2:
+                # It ran for a while before failing, so start the backoff over
+                delay = RECONNECT_BASE_DELAY
+            if INCLUDE_RAW_LOGS:
+                print(f"[ADA DEBUG] [RETRY] Restarting worker '{name}' in {delay} seconds...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
 
-                    # Start the Jules session monitoring task
-                    tasks.append(asyncio.create_task(self.jules_agent.start_monitoring(self._handle_jules_status_change)))
+    async def _show_reconnect_gif(self):
+        """Displays a 'back online' GIF after a reconnect."""
+        try:
+            api_key = os.getenv("GIPHY_API_KEY")
+            if api_key:
+                # Run search in thread to avoid blocking loop
+                response = await asyncio.to_thread(
+                    self.giphy_client.gifs_search_get,
+                    api_key,
+                    "I'm back",
+                    limit=25
+                )
+                if response.data:
+                    # Pick a random GIF
+                    selected_gif = random.choice(response.data)
+                    gif_url = selected_gif.images.original.url
 
-                    if not is_reconnect:
-                        if start_message:
-                            if INCLUDE_RAW_LOGS:
-                                print(f"[ADA DEBUG] [INFO] Sending start message: {start_message}")
-                            await self.session.send(input=start_message, end_of_turn=True)
+                    if INCLUDE_RAW_LOGS:
+                        print(f"[ADA DEBUG] [RECONNECT] Selected GIF: {gif_url}")
+
+                    # Display GIF for 10 seconds
+                    if self.on_display_content:
+                        self.on_display_content({
+                            "content_type": "image",
+                            "url": gif_url,
+                            "duration": 10000
+                        })
+                else:
+                    if INCLUDE_RAW_LOGS:
+                        print(f"[ADA DEBUG] [RECONNECT] No GIFs found.")
+            else:
+                if INCLUDE_RAW_LOGS:
+                    print(f"[ADA DEBUG] [RECONNECT] Missing Giphy API Key.")
 
-                        if self.on_project_update and self.project_manager:
-                            self.on_project_update(self.project_manager.current_project)
-                    else:
-                        # Display Reconnect GIF and Stay Silent
-                        if INCLUDE_RAW_LOGS:
-                            print(f"[ADA DEBUG] [RECONNECT] Connection restored. Fetching reconnect GIF...")
-
-                        try:
-                            api_key = os.getenv("GIPHY_API_KEY")
-                            if api_key:
-                                # Run search in thread to avoid blocking loop
-                                response = await asyncio.to_thread(
-                                    self.giphy_client.gifs_search_get,
-                                    api_key,
-                                    "I'm back",
-                                    limit=25
-                                )
-                                if response.data:
-                                    # Pick a random GIF
-                                    selected_gif = random.choice(response.data)
-                                    gif_url = selected_gif.images.original.url
+        except Exception as e:
+            if INCLUDE_RAW_LOGS:
+                print(f"[ADA DEBUG] [ERR] Failed to display reconnect GIF: {e}")
+
+    def _report_reconnect(self, reason, gap_ms, connection):
+        self.reconnect_metrics["count"] += 1
+        self.reconnect_metrics.update({
+            "last_reason": reason,
+            "last_gap_ms": round(gap_ms, 1),
+            "last_connect_ms": round(connection["connect_ms"], 1),
+            "last_resumed": connection["resumed"],
+        })
+        if INCLUDE_RAW_LOGS:
+            print(f"[ADA DEBUG] [RECONNECT] reason={reason} gap={gap_ms:.0f}ms connect={connection['connect_ms']:.0f}ms resumed={connection['resumed']}")
+        if self.on_reconnect_metrics:
+            self.on_reconnect_metrics(dict(self.reconnect_metrics))
 
-                                    if INCLUDE_RAW_LOGS:
-                                        print(f"[ADA DEBUG] [RECONNECT] Selected GIF: {gif_url}")
+    async def _session_started(self, connection, start_message, is_reconnect):
+        """Seeds a newly active session. Resumed sessions keep their server-side context."""
+        # Force reset message_source to ensure clean state on new session/reconnect
+        self.message_source = None
+        if connection["resumed"]:
+            await self._send_project_context(full=False)
+        else:
+            # A new session starts without any project context or frames
+            self.latest_frame.mark_unseen()
+            await self._send_project_context(full=True)
+            await self._rehydrate_session(is_reconnect)
 
-                                    # Display GIF for 10 seconds
-                                    if self.on_display_content:
-                                        self.on_display_content({
-                                            "content_type": "image",
-                                            "url": gif_url,
-                                            "duration": 10000
-                                        })
-                                else:
-                                    if INCLUDE_RAW_LOGS:
-                                        print(f"[ADA DEBUG] [RECONNECT] No GIFs found.")
-                            else:
-                                if INCLUDE_RAW_LOGS:
-                                    print(f"[ADA DEBUG] [RECONNECT] Missing Giphy API Key.")
+        if not is_reconnect:
+            if start_message:
+                if INCLUDE_RAW_LOGS:
+                    print(f"[ADA DEBUG] [INFO] Sending start message: {start_message}")
+                await self.session.send(input=start_message, end_of_turn=True)
 
-                        except Exception as e:
-                            if INCLUDE_RAW_LOGS:
-                                print(f"[ADA DEBUG] [ERR] Failed to display reconnect GIF: {e}")
+            if self.on_project_update and self.project_manager:
+                self.on_project_update(self.project_manager.current_project)
+        elif not connection["resumed"]:
+            # Display Reconnect GIF and Stay Silent
+            asyncio.create_task(self._show_reconnect_gif())
 
-                    self._last_input_transcription = ""
-                    self._last_output_transcription = ""
-                    self.chat_buffer = {"sender": None, "text": ""}
+        self._last_input_transcription = ""
+        self._last_output_transcription = ""
 
-                    stop_task = asyncio.create_task(self.stop_event.wait())
-                    reconnect_task = asyncio.create_task(self._reconnect_needed.wait())
+    async def run(self, start_message=None):
+        """
+        Keeps a Live session running until stop().
+
+        Reconnects are make-before-break: when a reconnect is requested, the
+        new session is opened while the old one keeps serving, then swapped
+        in and the old one closed. Audio/video workers and their queues live
+        for the whole run, so devices aren't reopened per session.
+        """
+        service_info = f"Service: Gemini Multimodal Live API, Endpoint: {MODEL}"
+        retry_delay = RECONNECT_BASE_DELAY
+        is_reconnect = False
+        reason = None
+        lost_at = None # When the previous session stopped serving, for the gap metric
 
-                    wait_tasks = tasks + [stop_task, reconnect_task]
-                    done, pending = await asyncio.wait(
-                        wait_tasks,
-                        return_when=asyncio.FIRST_COMPLETED
-                    )
+        self.playback_buffer = JitterBuffer(sample_rate=RECEIVE_SAMPLE_RATE, channels=CHANNELS, target_latency_ms=PLAYBACK_TARGET_LATENCY_MS)
+        self.send_pipeline = SendPipeline(self._send_payload)
+        workers = self._start_workers()
+        connection = None
 
-                    # If a signal task is done, cancel the other signal task.
-                    if stop_task in done:
-                        reconnect_task.cancel()
-                    elif reconnect_task in done:
-                        stop_task.cancel()
+        try:
+            while not self.stop_event.is_set():
+                if INCLUDE_RAW_LOGS:
+                    print(f"[ADA DEBUG] [CONNECT] Connecting to {service_info}... Reconnect: {is_reconnect}")
+                try:
+                    new_connection = await self._connect()
+                except Exception as e:
+                    if self.stop_event.is_set():
+                        break
+                    if "429" in str(e):
+                        print(f"Rate limited (429) for {service_info}.")
+                    elif INCLUDE_RAW_LOGS:
+                        print(f"[ADA DEBUG] [ERR] Connection Error ({service_info}): {e}")
+                    if connection is not None:
+                        # Keep serving on the old session and retry the planned reconnect later
+                        asyncio.get_running_loop().call_later(retry_delay, self._reconnect_needed.set)
+                        retry_delay = min(retry_delay * 2, RECONNECT_MAX_DELAY)
                     else:
-                        # A worker task finished (likely crashed). Log and trigger reconnect.
                         if INCLUDE_RAW_LOGS:
-                            print("[ADA DEBUG] [ERR] A worker task exited unexpectedly. Triggering reconnect.")
-                        # Attempt to find the crashed task and log its exception
-                        for done_task in done:
-                            try:
-                                if done_task.exception():
-                                    print(f"[ADA DEBUG] [ERR] Task exception: {done_task.exception()}")
-                            except asyncio.InvalidStateError:
-                                pass # No exception
-                        reconnect_task.cancel()
-                        stop_task.cancel()
-                        self._reconnect_needed.clear()
-                        return True
-
-                    if reconnect_task in done:
-                        if INCLUDE_RAW_LOGS:
-                            print("[ADA DEBUG] [RECONNECT] Reconnect event received. Ending session...")
-                        self._reconnect_needed.clear()
-                        return True # Signal for reconnect
-
-                finally:
-                    # Flush chat buffer to save any pending conversation before teardown
+                            print(f"[ADA DEBUG] [RETRY] Reconnecting in {retry_delay} seconds...")
+                        await asyncio.sleep(retry_delay)
+                        retry_delay = min(retry_delay * 2, RECONNECT_MAX_DELAY)
+                        continue
+                else:
+                    retry_delay = RECONNECT_BASE_DELAY
+                    # Make-before-break: switch over only once the new session is up
                     self.flush_chat()
+                    old_connection = connection
+                    connection = new_connection
+                    if lost_at is None:
+                        lost_at = time.monotonic()
+                    self.session = connection["session"]
+                    self.timer_agent.session = self.session
+                    self.proactive_agent.session = self.session
+                    if old_connection is not None and old_connection.get("receive_task") is not None:
+                        # Stop the old session's receiver now, before it can store a stale
+                        # resumption handle or route another turn; the close below only tidies up
+                        old_connection["receive_task"].cancel()
+                    connection["receive_task"] = asyncio.create_task(self.receive_audio(self.session))
+                    if is_reconnect:
+                        self._report_reconnect(reason, (time.monotonic() - lost_at) * 1000, connection)
+                    asyncio.create_task(self._close_connection(old_connection))
+                    self.chat_buffer = {"sender": None, "text": ""}
+                    await self._session_started(connection, start_message, is_reconnect)
+                    start_message = None
+
+                # Wait for the session to end, a reconnect request, or stop
+                stop_task = asyncio.create_task(self.stop_event.wait())
+                reconnect_task = asyncio.create_task(self._reconnect_needed.wait())
+                receive_task = connection["receive_task"]
+                done, _ = await asyncio.wait(
+                    [stop_task, reconnect_task, receive_task],
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                stop_task.cancel()
+                reconnect_task.cancel()
+
+                if self.stop_event.is_set():
+                    break
+                is_reconnect = True
+                if receive_task in done:
+                    # The session dropped; nothing is serving until the next connect
+                    reason = "connection_lost"
+                    lost_at = time.monotonic()
+                    try:
+                        if receive_task.exception():
+                            print(f"[ADA DEBUG] [ERR] Session ended: {receive_task.exception()}")
+                    except asyncio.CancelledError:
+                        pass
+                    await self._close_connection(connection)
+                    connection = None
+                else:
+                    # Planned reconnect (project switch, prompt or voice change, server go_away)
+                    reason = "requested"
+                    lost_at = None
+                    self._reconnect_needed.clear()
                     if INCLUDE_RAW_LOGS:
-                        print(f"[ADA DEBUG] [SESSION] Tearing down {len(tasks)} session tasks...")
-                    for task in tasks:
-                        task.cancel()
-                    await asyncio.gather(*tasks, return_exceptions=True)
-                    if INCLUDE_RAW_LOGS:
-                        print("[ADA DEBUG] [SESSION] All session tasks cancelled.")
-                    # Add small delay as requested
-                    await asyncio.sleep(0.1)
-
-        except (Exception, asyncio.CancelledError) as e:
-            if self.stop_event.is_set():
-                if INCLUDE_RAW_LOGS:
-                    print(f"[ADA DEBUG] [INFO] Session runner stopping.")
-                return False
-
-            error_msg = str(e)
-            if "429" in error_msg:
-                 print(f"Rate limited (429) for {service_info}.")
-            else:
-                if INCLUDE_RAW_LOGS:
-                    print(f"[ADA DEBUG] [ERR] Connection Error in session runner ({service_info}): {e}")
-
-            if hasattr(e, 'exceptions'):
-                for idx, se in enumerate(e.exceptions):
-                    if INCLUDE_RAW_LOGS:
-                        print(f"  Sub-exception {idx}: {se}")
-
-            return True
+                        print("[ADA DEBUG] [RECONNECT] Reconnect event received. Opening new session...")
         finally:
             if INCLUDE_RAW_LOGS:
-                print("[ADA DEBUG] [SESSION] Session runner cleanup.")
-            if hasattr(self, 'audio_stream') and self.audio_stream:
-                try:
-                    self.audio_stream.close()
-                except:
-                    pass
-
-        return False
-
-    async def run(self, start_message=None):
-        retry_delay = 1
-        is_reconnect = False
-
-        while not self.stop_event.is_set():
-            if INCLUDE_RAW_LOGS:
-                print("[ADA DEBUG] [RUN] Main loop is running. Starting session runner.")
-            should_reconnect = await self._session_runner(start_message, is_reconnect)
-
-            if not should_reconnect:
-                if INCLUDE_RAW_LOGS:
-                    print("[ADA DEBUG] [RUN] Session runner requested no reconnect. Exiting main loop.")
-                break
-
-            is_reconnect = True
-            start_message = None
-
-            if not self.stop_event.is_set():
-                if INCLUDE_RAW_LOGS:
-                    print(f"[ADA DEBUG] [RETRY] Reconnecting in {retry_delay} seconds...")
-                await asyncio.sleep(retry_delay)
-                retry_delay = min(retry_delay * 2, 10)
+                print("[ADA DEBUG] [SESSION] Session cleanup.")
+            # Flush chat buffer to save any pending conversation before teardown
+            self.flush_chat()
+            await self._close_connection(connection)
+            for task in workers.values():
+                task.cancel()
+            await asyncio.gather(*workers.values(), return_exceptions=True)
+            # Audio streams stay open in the device manager for the next run
 
         if INCLUDE_RAW_LOGS:
             print("[ADA DEBUG] [INFO] Main run loop has exited.")
@@ -0,0 +1,414 @@
+import struct
+import asyncio
+
+import numpy as np
+
+# Channel counts to probe when a device rejects mono
+PROBE_CHANNELS = [1, 2, 4, 8]
+# pyaudio.paContinue, kept here so this module doesn't need PyAudio installed
+PA_CONTINUE = 0
+
+
+def downmix(data: bytes, channels: int):
+    """Keeps the first channel of interleaved 16-bit PCM (Gemini expects mono)."""
+    if channels <= 1:
+        return data
+    count = len(data) // (2 * channels)
+    if count <= 0:
+        return b""
+    shorts = struct.unpack(f"<{count * channels}h", data[:count * channels * 2])
+    return struct.pack(f"<{count}h", *shorts[::channels])
+
+
+class RingBuffer:
+    """
+    Preallocated single-producer/single-consumer byte ring.
+
+    The producer only advances `_write` and the consumer only advances
+    `_read` (both are running totals, so full and empty can't be confused).
+    Each is a single int store, which the GIL makes atomic, so the audio
+    callback thread and the event loop can share the ring without a lock.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._read = 0
+        self._write = 0
+
+    def available(self):
+        return self._write - self._read
+
+    def free(self):
+        return self.capacity - self.available()
+
+    def write(self, data):
+        """Producer side. Writes as much of `data` as fits and returns the byte count written."""
+        n = min(len(data), self.free())
+        if n <= 0:
+            return 0
+        data = memoryview(data)
+        start = self._write % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = data[:first]
+        if n > first:
+            self._buf[:n - first] = data[first:n]
+        self._write += n
+        return n
+
+    def read(self, n: int):
+        """Consumer side. Returns up to n bytes."""
+        n = min(n, self.available())
+        if n <= 0:
+            return b""
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out = bytes(self._buf[start:start + first])
+        if n > first:
+            out += bytes(self._buf[:n - first])
+        self._read += n
+        return out
+
+    def discard(self):
+        """Consumer side. Drops everything buffered."""
+        self._read = self._write
+
+
+class AudioDeviceManager:
+    """
+    Owns the PyAudio input and output streams for the lifetime of the process,
+    so Live session reconnects reuse open devices instead of reopening them.
+
+    Device lookups are cached: the device list is enumerated once, name/index
+    selections are resolved once, and the channel count that worked for each
+    input device is remembered so it isn't probed again. Devices can be swapped
+    at runtime with `set_input_device` / `set_output_device`; the new stream
+    is opened before the old one is closed, so a failed swap keeps the old
+    device.
+
+    Streams run in PyAudio callback mode: the capture callback writes mono
+    PCM into an input ring and the playback callback pulls from an output
+    ring (padding with silence on underrun). The event loop side only waits
+    on `read_chunk` / `write_chunk`, woken by `call_soon_threadsafe`, so no
+    executor thread is tied up per chunk.
+
+    Opening and swapping devices blocks, so call those from a worker thread.
+    """
+
+    def __init__(self, pya, format, input_rate: int, output_rate: int, frames_per_buffer: int,
+                 channels: int = 1, input_buffer_seconds: float = 2.0, output_buffer_seconds: float = 0.5,
+                 include_raw_logs: bool = False):
+        self.pya = pya
+        self.format = format
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.frames_per_buffer = frames_per_buffer
+        self.channels = channels
+        self.include_raw_logs = include_raw_logs
+
+        self._devices = None
+        self._resolved = {} # (name, index) -> device index
+        self._input_channels = {} # device index -> channel count that opened
+        self._failed_inputs = set() # device indices that couldn't be opened
+
+        self._input = None # (device index, stream, channels, generation)
+        self._output = None # (device index, stream, generation)
+        self._input_selection = (None, None)
+        self._output_index = None
+        # Callbacks from a stream that has been swapped out are ignored by generation
+        self._generation = 0
+
+        # 16-bit samples
+        self._input_ring = RingBuffer(int(input_rate * input_buffer_seconds) * 2)
+        self._output_ring = RingBuffer(int(output_rate * output_buffer_seconds) * 2 * channels)
+        # What the speaker actually played, as the echo canceller's reference
+        self._reference_ring = RingBuffer(int(output_rate * input_buffer_seconds) * 2 * channels)
+        self._flush_output = False
+        self.output_gain = 1.0 # Applied in the playback callback, e.g. to duck during barge-in
+        self._loop = None
+        self._input_ready = None
+        self._output_space = None
+        self._want_input = 0 # Bytes the reader is waiting for, 0 if not waiting
+        self._want_space = 0
+        self.metrics = {"input_overruns": 0, "output_underruns": 0, "reference_overruns": 0}
+
+    def _log(self, message):
+        if self.include_raw_logs:
+            print(f"[AudioDeviceManager] {message}")
+
+    # --- Device lookup ---
+
+    def list_devices(self, refresh: bool = False):
+        """Returns the PyAudio device infos, enumerating them only once unless refreshed."""
+        if self._devices is None or refresh:
+            devices = []
+            for i in range(self.pya.get_device_count()):
+                try:
+                    devices.append(self.pya.get_device_info_by_index(i))
+                except Exception:
+                    continue
+            self._devices = devices
+            self._resolved = {}
+        return self._devices
+
+    def resolve_input(self, name=None, index=None):
+        """Resolves a device name (preferred) or index to an input device index, using the default input as fallback."""
+        key = (name, index)
+        if key in self._resolved:
+            return self._resolved[key]
+
+        resolved = None
+        if name:
+            lowered = name.lower()
+            for info in self.list_devices():
+                device_name = info.get('name', '').lower()
+                if info.get('maxInputChannels', 0) > 0 and (lowered in device_name or device_name in lowered):
+                    resolved = info['index']
+                    self._log(f"Resolved input device '{name}' to index {resolved} ({info.get('name')})")
+                    break
+            else:
+                self._log(f"Could not find device matching '{name}'. Checking index...")
+
+        if resolved is None and index is not None:
+            try:
+                resolved = int(index)
+            except (TypeError, ValueError):
+                self._log(f"Invalid device index '{index}', reverting to default.")
+
+        if resolved is None:
+            try:
+                resolved = self.pya.get_default_input_device_info()["index"]
+            except Exception as e:
+                self._log(f"[ERR] No default input device: {e}")
+                return None
+
+        self._resolved[key] = resolved
+        return resolved
+
+    # --- Opening streams ---
+
+    def _open_input(self, device_index, generation):
+        """Opens an input stream, trying the cached or requested channel count before probing others."""
+        candidates = []
+        if device_index in self._input_channels:
+            candidates.append(self._input_channels[device_index])
+        candidates.append(self.channels)
+        try:
+            max_channels = int(self.pya.get_device_info_by_index(device_index).get('maxInputChannels', 0))
+        except Exception:
+            max_channels = 0
+        candidates += [c for c in PROBE_CHANNELS if max_channels <= 0 or c <= max_channels]
+
+        tried = set()
+        for channels in candidates:
+            if channels in tried:
+                continue
+            tried.add(channels)
+            callback = lambda in_data, frame_count, time_info, status, c=channels: self._on_input(generation, c, in_data)
+            try:
+                stream = self.pya.open(
+                    format=self.format,
+                    channels=channels,
+                    rate=self.input_rate,
+                    input=True,
+                    input_device_index=device_index,
+                    frames_per_buffer=self.frames_per_buffer,
+                    stream_callback=callback,
+                )
+            except OSError:
+                continue
+            self._input_channels[device_index] = channels
+            self._log(f"Opened input device {device_index} with {channels} channel(s).")
+            return stream, channels
+        return None, 0
+
+    def _open_output(self, device_index, generation):
+        return self.pya.open(
+            format=self.format,
+            channels=self.channels,
+            rate=self.output_rate,
+            output=True,
+            output_device_index=device_index,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=lambda in_data, frame_count, time_info, status: self._on_output(generation, frame_count),
+        )
+
+    @staticmethod
+    def _close(stream):
+        try:
+            stream.stop_stream()
+        except Exception:
+            pass
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    # --- Selection / hot swap ---
+
+    def set_input_device(self, name=None, index=None):
+        """
+        Selects the input device, opening it if it isn't the one already open.
+        Returns True if the device is open after the call.
+        """
+        self._input_selection = (name, index)
+        device_index = self.resolve_input(name, index)
+        if device_index is None:
+            return False
+        current = self._input
+        if current is not None and current[0] == device_index:
+            return True
+        if device_index in self._failed_inputs:
+            return current is not None
+
+        self._generation += 1
+        generation = self._generation
+        stream, channels = self._open_input(device_index, generation)
+        if stream is None:
+            self._failed_inputs.add(device_index)
+            self._log(f"[ERR] Failed to open input device {device_index}; keeping the previous device.")
+            return current is not None
+
+        old, self._input = self._input, (device_index, stream, channels, generation)
+        if old is not None:
+            self._close(old[1])
+        return True
+
+    def set_output_device(self, index=None):
+        """Selects the output device (None = default), opening it if it isn't the one already open."""
+        self._output_index = index
+        current = self._output
+        if current is not None and current[0] == index:
+            return True
+        self._generation += 1
+        generation = self._generation
+        try:
+            stream = self._open_output(index, generation)
+        except OSError as e:
+            self._log(f"[ERR] Failed to open output device {index}: {e}")
+            return current is not None
+        old, self._output = self._output, (index, stream, generation)
+        if old is not None:
+            self._close(old[1])
+        return True
+
+    def refresh(self):
+        """Re-enumerates devices (e.g. after one was plugged in) and forgets failed opens."""
+        self.list_devices(refresh=True)
+        self._failed_inputs.clear()
+
+    # --- Callbacks (PortAudio thread) ---
+
+    def _wake(self, event):
+        loop = self._loop
+        if loop is not None and event is not None:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass # Loop closed
+
+    def _on_input(self, generation, channels, in_data):
+        current = self._input
+        if current is None or current[3] != generation:
+            return (None, PA_CONTINUE)
+        data = downmix(in_data, channels)
+        if self._input_ring.write(data) < len(data):
+            self.metrics["input_overruns"] += 1
+        if self._want_input and self._input_ring.available() >= self._want_input:
+            self._want_input = 0
+            self._wake(self._input_ready)
+        return (None, PA_CONTINUE)
+
+    def _on_output(self, generation, frame_count):
+        nbytes = frame_count * 2 * self.channels
+        current = self._output
+        if current is None or current[2] != generation:
+            return (b"\x00" * nbytes, PA_CONTINUE)
+        if self._flush_output:
+            self._flush_output = False
+            self._output_ring.discard()
+        data = self._output_ring.read(nbytes)
+        if len(data) < nbytes:
+            if data:
+                self.metrics["output_underruns"] += 1
+            data += b"\x00" * (nbytes - len(data))
+        gain = self.output_gain
+        if gain != 1.0:
+            # Vectorised so the callback stays well inside its deadline
+            data = (np.frombuffer(data, np.int16) * gain).clip(-32768, 32767).astype(np.int16).tobytes()
+        if self._reference_ring.write(data) < len(data):
+            self.metrics["reference_overruns"] += 1
+        if self._want_space and self._output_ring.free() >= self._want_space:
+            self._want_space = 0
+            self._wake(self._output_space)
+        return (data, PA_CONTINUE)
+
+    # --- Event loop side ---
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._input_ready = asyncio.Event()
+            self._output_space = asyncio.Event()
+
+    async def read_chunk(self, frames: int):
+        """Waits for one chunk of mono PCM from the input ring. Returns None if no input device is open."""
+        self._bind_loop()
+        nbytes = frames * 2
+        while True:
+            if self._input is None:
+                return None
+            if self._input_ring.available() >= nbytes:
+                return self._input_ring.read(nbytes)
+            self._input_ready.clear()
+            self._want_input = nbytes
+            # Re-check after registering, in case the callback filled the ring in between
+            if self._input_ring.available() >= nbytes:
+                self._want_input = 0
+                continue
+            try:
+                await asyncio.wait_for(self._input_ready.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass # Stream stalled or was swapped; loop around and check again
+
+    async def write_chunk(self, data: bytes):
+        """Queues PCM for playback, waiting while the output ring is full."""
+        self._bind_loop()
+        data = memoryview(data)
+        while data:
+            if self._output is None:
+                return
+            written = self._output_ring.write(data)
+            data = data[written:]
+            if not data:
+                return
+            self._output_space.clear()
+            self._want_space = min(len(data), self._output_ring.capacity)
+            if self._output_ring.free() >= self._want_space:
+                self._want_space = 0
+                continue
+            try:
+                await asyncio.wait_for(self._output_space.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    def read_reference(self):
+        """Returns everything played since the last call (16-bit PCM at the output rate)."""
+        return self._reference_ring.read(self._reference_ring.available())
+
+    def flush_output(self):
+        """Drops buffered playback; applied by the playback callback on its next block."""
+        self._flush_output = True
+
+    @property
+    def input_open(self):
+        return self._input is not None
+
+    def close(self):
+        old_input, self._input = self._input, None
+        old_output, self._output = self._output, None
+        if old_input is not None:
+            self._close(old_input[1])
+        if old_output is not None:
+            self._close(old_output[1])
@@ -0,0 +1,136 @@
+import time
+from collections import deque
+
+import numpy as np
+
+
+class PCMEncoder:
+    """
+    Batches mono 16-bit PCM chunks into larger realtime-input payloads.
+
+    Chunks are collected until `batch_ms` of audio is pending, then emitted as
+    one `{"data", "mime_type"}` payload; `flush()` emits whatever is left at
+    the end of an utterance. Payloads carry the capture time of their first
+    chunk under "_captured_at" so the sender can measure latency; strip it
+    before sending.
+
+    Subclasses override `_encode()` to transform each batch.
+    """
+
+    name = "pcm"
+
+    def __init__(self, sample_rate: int = 16000, batch_ms: float = 128, window_seconds: float = 10.0):
+        self.sample_rate = sample_rate
+        self.batch_bytes = int(sample_rate * batch_ms / 1000) * 2
+        self.window_seconds = window_seconds
+        self._pending = []
+        self._pending_bytes = 0
+        self._captured_at = None
+
+        self._window = deque() # (time, raw bytes, sent bytes)
+        self._latencies = deque(maxlen=50)
+        self.totals = {"raw_bytes": 0, "sent_bytes": 0, "payloads": 0}
+
+    @property
+    def mime_type(self):
+        return f"audio/pcm;rate={self.sample_rate}"
+
+    def _encode(self, pcm: bytes):
+        return pcm
+
+    def encode(self, pcm: bytes, captured_at: float = None):
+        """Adds one captured chunk. Returns a payload once a batch is full, otherwise None."""
+        if not pcm:
+            return None
+        if self._captured_at is None:
+            self._captured_at = time.monotonic() if captured_at is None else captured_at
+        self._pending.append(pcm)
+        self._pending_bytes += len(pcm)
+        if self._pending_bytes >= self.batch_bytes:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Emits any pending audio as a payload, or returns None."""
+        if not self._pending:
+            return None
+        raw = b"".join(self._pending)
+        data = self._encode(raw)
+        payload = {"data": data, "mime_type": self.mime_type, "_captured_at": self._captured_at}
+        self._pending = []
+        self._pending_bytes = 0
+        self._captured_at = None
+
+        self.totals["raw_bytes"] += len(raw)
+        self.totals["sent_bytes"] += len(data)
+        self.totals["payloads"] += 1
+        self._window.append((time.monotonic(), len(raw), len(data)))
+        return payload
+
+    def record_sent(self, captured_at: float, sent_at: float = None):
+        """Records capture-to-sent latency for one payload."""
+        if captured_at is None:
+            return
+        sent_at = time.monotonic() if sent_at is None else sent_at
+        self._latencies.append((sent_at - captured_at) * 1000)
+
+    def metrics(self):
+        now = time.monotonic()
+        while self._window and now - self._window[0][0] > self.window_seconds:
+            self._window.popleft()
+        raw = sum(entry[1] for entry in self._window)
+        sent = sum(entry[2] for entry in self._window)
+        latencies = list(self._latencies)
+        return {
+            "encoder": self.name,
+            "mime_type": self.mime_type,
+            "raw_bytes_per_second": round(raw / self.window_seconds, 1),
+            "sent_bytes_per_second": round(sent / self.window_seconds, 1),
+            "ratio": round(sent / raw, 3) if raw else None,
+            "payloads": self.totals["payloads"],
+            "send_latency_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "last_send_latency_ms": round(latencies[-1], 1) if latencies else None,
+        }
+
+
+class DownsamplingPCMEncoder(PCMEncoder):
+    """
+    Halves (or more) the upstream sample rate for constrained links. The Live
+    API only takes raw PCM for realtime input but resamples whatever rate the
+    mime type declares, so a lower rate is the compression it accepts.
+    Decimation averages each group of samples as a simple anti-alias filter.
+    """
+
+    name = "pcm_low"
+
+    def __init__(self, sample_rate: int = 16000, target_rate: int = 8000, **kwargs):
+        super().__init__(sample_rate=sample_rate, **kwargs)
+        if sample_rate % target_rate:
+            raise ValueError("target_rate must divide sample_rate")
+        self.factor = sample_rate // target_rate
+        self.target_rate = target_rate
+
+    @property
+    def mime_type(self):
+        return f"audio/pcm;rate={self.target_rate}"
+
+    def _encode(self, pcm: bytes):
+        samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype="<i2")
+        usable = len(samples) - len(samples) % self.factor
+        decimated = samples[:usable].reshape(-1, self.factor).mean(axis=1)
+        return np.round(decimated).astype("<i2").tobytes()
+
+
+ENCODERS = {
+    PCMEncoder.name: PCMEncoder,
+    DownsamplingPCMEncoder.name: DownsamplingPCMEncoder,
+}
+
+
+def create_encoder(name: str = "pcm", **kwargs):
+    """Returns the named encoder, falling back to plain PCM for unknown names."""
+    encoder_class = ENCODERS.get(name)
+    if encoder_class is None:
+        print(f"[AudioEncoding] [WARN] Unknown upstream encoder '{name}', using pcm.")
+        encoder_class = PCMEncoder
+    return encoder_class(**kwargs)
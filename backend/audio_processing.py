@@ -0,0 +1,184 @@
+import numpy as np
+
+
+def resample(samples, from_rate: int, to_rate: int):
+    """Linear-interpolation resample of a 1-D float array."""
+    if from_rate == to_rate or not len(samples):
+        return samples
+    count = int(round(len(samples) * to_rate / from_rate))
+    positions = np.arange(count) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(len(samples)), samples)
+
+
+class EchoCanceller:
+    """
+    Removes ADA's own playback from the mic signal before VAD and upload.
+
+    The reference is what the output device actually played (tapped in the
+    playback callback and resampled to the mic rate). Both streams run
+    continuously, so mic and reference sample counters differ by a near-
+    constant delay; that delay is found by FFT cross-correlation while the
+    reference is active and re-checked every `recheck_seconds`. A block
+    NLMS filter of `filter_length` taps then models the speaker-to-mic path
+    around that delay and subtracts its estimate of the echo.
+
+    Adaptation pauses during double talk (Geigel test), so the filter
+    doesn't learn the user's voice. While the reference is silent, or the
+    delay is unknown, mic audio passes through untouched.
+    """
+
+    def __init__(self, sample_rate: int = 16000, reference_rate: int = 24000, filter_length: int = 512,
+                 block_size: int = 256, step_size: float = 0.5, max_delay_ms: float = 500,
+                 history_seconds: float = 2.0, recheck_seconds: float = 5.0, active_level: float = 100.0):
+        self.sample_rate = sample_rate
+        self.reference_rate = reference_rate
+        self.filter_length = filter_length
+        self.block_size = block_size
+        self.step_size = step_size
+        self.max_delay = int(sample_rate * max_delay_ms / 1000)
+        self.recheck_samples = int(sample_rate * recheck_seconds)
+        self.active_level = active_level
+        # Causal headroom so small delay estimation errors stay inside the filter
+        self.pre_delay = filter_length // 8
+
+        self.weights = np.zeros(filter_length)
+        self._history = np.zeros(int(sample_rate * history_seconds) + self.max_delay + filter_length)
+        self._ref_count = 0 # Reference samples received so far
+        self._mic_count = 0 # Mic samples processed so far
+        self._mic_history = np.zeros(sample_rate)
+        self.delay = None # mic index - reference index of the direct echo
+        self._delay_checked_at = None
+        self._synced = False
+
+        self.metrics = {"delay_ms": None, "erle_db": None, "double_talk_blocks": 0}
+
+    # --- Reference ---
+
+    def add_reference(self, pcm: bytes):
+        """Appends played-back 16-bit PCM (at `reference_rate`) to the reference history."""
+        if not pcm:
+            return
+        samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype="<i2").astype(np.float64)
+        samples = resample(samples, self.reference_rate, self.sample_rate)
+        n = len(samples)
+        if n >= len(self._history):
+            self._history[:] = samples[-len(self._history):]
+        else:
+            self._history = np.roll(self._history, -n)
+            self._history[-n:] = samples
+        self._ref_count += n
+
+    def _reference(self, start: int, stop: int):
+        """Reference samples with absolute indices [start, stop), zeros where unknown."""
+        out = np.zeros(stop - start)
+        oldest = self._ref_count - len(self._history)
+        lo, hi = max(start, oldest), min(stop, self._ref_count)
+        if lo < hi:
+            out[lo - start:hi - start] = self._history[lo - oldest:hi - oldest]
+        return out
+
+    # --- Delay estimation ---
+
+    def _estimate_delay(self):
+        """Finds the echo delay maximising the mic/reference cross-correlation over the last second."""
+        n = len(self._mic_history)
+        mic_end = self._mic_count
+        # ref[j] is the reference sample max_delay - j samples before mic[j]
+        ref = self._reference(mic_end - n - self.max_delay, mic_end)
+        if np.sqrt(np.mean(ref ** 2)) < self.active_level:
+            return
+        size = 1 << int(np.ceil(np.log2(len(ref) + n)))
+        # corr[k] = sum_i mic[i] * ref[i + k]; an echo delayed by D peaks at k = max_delay - D
+        corr = np.fft.irfft(np.conj(np.fft.rfft(self._mic_history, size)) * np.fft.rfft(ref, size), size)
+        k = int(np.argmax(np.abs(corr[:self.max_delay + 1])))
+        self.delay = self.max_delay - k
+        self._delay_checked_at = mic_end
+        self.metrics["delay_ms"] = round(self.delay * 1000 / self.sample_rate, 1)
+
+    # --- Mic ---
+
+    def process(self, pcm: bytes):
+        """Returns the mic chunk (16-bit PCM at `sample_rate`) with the estimated echo removed."""
+        mic = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype="<i2").astype(np.float64)
+        start = self._mic_count
+        if not self._synced:
+            # Line both counters up at "now", so the delay found is the real playback-to-capture latency
+            self._ref_count = start + len(mic)
+            self._synced = True
+        self._mic_count += len(mic)
+        self._mic_history = np.concatenate([self._mic_history, mic])[-len(self._mic_history):]
+
+        if self._delay_checked_at is None or self._mic_count - self._delay_checked_at >= self.recheck_samples:
+            self._estimate_delay()
+        if self.delay is None:
+            return pcm
+
+        offset = self.delay - self.pre_delay
+        ref = self._reference(start - offset - self.filter_length + 1, self._mic_count - offset)
+        if np.sqrt(np.mean(ref ** 2)) < self.active_level:
+            return pcm
+
+        out = mic.copy()
+        in_power = out_power = 0.0
+        L, B = self.filter_length, self.block_size
+        for b in range(0, len(mic), B):
+            d = mic[b:b + B]
+            # Row i holds ref[n_i], ref[n_i - 1], ..., ref[n_i - L + 1]
+            segment = ref[b:b + len(d) + L - 1]
+            X = np.lib.stride_tricks.sliding_window_view(segment, L)[:, ::-1]
+            e = d - X @ self.weights
+            out[b:b + len(d)] = e
+            in_power += float(d @ d)
+            out_power += float(e @ e)
+
+            # Geigel double-talk test: near-end louder than the far end could explain
+            if np.max(np.abs(d)) > 0.5 * np.max(np.abs(segment)):
+                self.metrics["double_talk_blocks"] += 1
+                continue
+            power = float(segment @ segment) / len(segment) * L
+            self.weights += self.step_size * (X.T @ e) / (power + 1e-6)
+
+        if out_power > 0 and in_power > 0:
+            self.metrics["erle_db"] = round(float(10 * np.log10(in_power / out_power)), 1)
+        return np.clip(np.round(out), -32768, 32767).astype("<i2").tobytes()
+
+    def reset(self):
+        """Forgets the filter and alignment, e.g. after capture was paused."""
+        self.weights[:] = 0
+        self.delay = None
+        self._delay_checked_at = None
+        self._synced = False
+
+
+class NoiseFloorVAD:
+    """
+    Speech threshold that follows the measured noise floor instead of a
+    fixed RMS value.
+
+    The floor drops quickly to quieter levels and rises slowly, and only
+    outside speech, so it tracks fans or room noise without creeping up on
+    the user's voice. The threshold is `margin` times the floor, clamped to
+    [min_threshold, max_threshold].
+    """
+
+    def __init__(self, initial_threshold: float = 800, margin: float = 3.0, min_threshold: float = 200,
+                 max_threshold: float = 4000, rise: float = 0.02, fall: float = 0.3):
+        self.margin = margin
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+        self.rise = rise
+        self.fall = fall
+        self.noise_floor = initial_threshold / margin
+
+    @property
+    def threshold(self):
+        return min(self.max_threshold, max(self.min_threshold, self.noise_floor * self.margin))
+
+    def update(self, rms: float, speaking: bool):
+        """Feeds one chunk's level. Returns True if it is above the speech threshold."""
+        is_speech = rms > self.threshold
+        if rms < self.noise_floor:
+            self.noise_floor += self.fall * (rms - self.noise_floor)
+        elif not speaking and not is_speech:
+            self.noise_floor += self.rise * (rms - self.noise_floor)
+        return is_speech
@@ -0,0 +1,135 @@
+import time
+
+import numpy as np
+
+
+def pcm_rms(data: bytes):
+    """RMS level of 16-bit little-endian mono PCM."""
+    samples = np.frombuffer(data, np.int16, count=len(data) // 2).astype(np.float32)
+    if not samples.size:
+        return 0
+    return int(np.sqrt(np.mean(samples * samples)))
+
+
+class BargeInDetector:
+    """
+    Decides locally when the user talks over playback, instead of waiting a
+    network round trip for the server to notice.
+
+    While playback is active, mic chunks louder than both
+    `vad_threshold * threshold_factor` and `echo_ratio` times the recent
+    playback level are barge-in candidates; the echo term keeps ADA's own
+    voice leaking into the mic from triggering it. The first loud chunk ducks
+    playback, and `confirm_chunks` consecutive loud chunks confirm the
+    barge-in (flush). A candidate that doesn't confirm releases the duck and
+    counts as a false trigger.
+
+    After a barge-in, model audio still in flight for the interrupted turn is
+    gated until the server reports the interruption or turn end, or
+    `gate_timeout` seconds pass.
+    """
+
+    def __init__(self, vad_threshold: float, threshold_factor: float = 2.0, echo_ratio: float = 0.6,
+                 confirm_chunks: int = 2, playback_hold: float = 0.3, gate_timeout: float = 1.5):
+        self.vad_threshold = vad_threshold
+        self.threshold_factor = threshold_factor
+        self.echo_ratio = echo_ratio
+        self.confirm_chunks = confirm_chunks
+        self.playback_hold = playback_hold
+        self.gate_timeout = gate_timeout
+
+        self.playback_level = 0.0
+        self._last_playback = None
+        self._loud_chunks = 0
+        self._onset = None
+        self.ducked = False
+        self._gate_until = None
+        self._pending_server = None # Onset of the last local barge-in, until the server confirms it
+
+        self.metrics = {
+            "barge_ins": 0,
+            "false_triggers": 0,
+            "last_local_ms": None, # Speech onset -> local flush
+            "last_server_ms": None, # Speech onset -> server interrupted
+        }
+
+    # --- Playback side ---
+
+    def note_playback(self, rms, now=None):
+        now = time.monotonic() if now is None else now
+        # Fast attack, slow release, so echo tails stay covered
+        if rms > self.playback_level:
+            self.playback_level = rms
+        else:
+            self.playback_level = 0.8 * self.playback_level + 0.2 * rms
+        self._last_playback = now
+
+    def playback_active(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self._last_playback is not None and now - self._last_playback < self.playback_hold
+
+    def threshold(self):
+        return max(self.vad_threshold * self.threshold_factor, self.playback_level * self.echo_ratio)
+
+    # --- Mic side ---
+
+    def process(self, rms, now=None):
+        """Feeds one mic chunk's level. Returns "duck", "barge_in", "release" or None."""
+        now = time.monotonic() if now is None else now
+        if not self.playback_active(now):
+            return self._reset(now)
+
+        if rms <= self.threshold():
+            return self._reset(now)
+
+        self._loud_chunks += 1
+        if self._loud_chunks == 1:
+            self._onset = now
+        if self._loud_chunks >= self.confirm_chunks:
+            onset = self._onset
+            self._loud_chunks = 0
+            self._onset = None
+            self.ducked = False
+            self.playback_level = 0.0
+            self._last_playback = None
+            self._gate_until = now + self.gate_timeout
+            self._pending_server = onset
+            self.metrics["barge_ins"] += 1
+            self.metrics["last_local_ms"] = round((now - onset) * 1000, 1)
+            return "barge_in"
+        if not self.ducked:
+            self.ducked = True
+            return "duck"
+        return None
+
+    def _reset(self, now):
+        self._loud_chunks = 0
+        self._onset = None
+        if self.ducked:
+            self.ducked = False
+            self.metrics["false_triggers"] += 1
+            return "release"
+        return None
+
+    # --- Server side ---
+
+    def gate_active(self, now=None):
+        """True while model audio from an interrupted turn should be dropped."""
+        if self._gate_until is None:
+            return False
+        now = time.monotonic() if now is None else now
+        if now >= self._gate_until:
+            self._gate_until = None
+            return False
+        return True
+
+    def note_server_interrupt(self, now=None):
+        """The server noticed the interruption; records the round trip from speech onset."""
+        now = time.monotonic() if now is None else now
+        if self._pending_server is not None:
+            self.metrics["last_server_ms"] = round((now - self._pending_server) * 1000, 1)
+            self._pending_server = None
+
+    def release_gate(self):
+        """The interrupted turn is over; new model audio can play."""
+        self._gate_until = None
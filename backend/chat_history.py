@@ -0,0 +1,819 @@
+import os
+import gzip
+import json
+import threading
+import time
+from collections import deque
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+try:
+    from backend.search_index import TermIndex, tokenize
+except ImportError:
+    from search_index import TermIndex, tokenize
+
+
+class ChatLogWriter:
+    """
+    Buffers chat history entries in memory and appends them to disk from a
+    background thread, so logging never blocks the event loop.
+
+    Entries are flushed when `flush_size` are pending, every `flush_interval`
+    seconds, on `flush()` and on `close()`. Each entry is one JSON line written
+    with a single write call; a torn final line left by a crash is terminated
+    before the next append so it can't merge with the following record.
+
+    fsync_policy: "none" leaves durability to the OS, "batch" fsyncs after
+    every flushed batch.
+
+    Readers never wait on the disk: `pending_entries()` returns what is still
+    queued or being written for a store, to merge with what the store reads.
+    Appends after `close()` are logged and dropped.
+    """
+
+    def __init__(self, flush_size: int = 32, flush_interval: float = 2.0,
+                 fsync_policy: str = "none", max_pending: int = 10000):
+        if fsync_policy not in ("none", "batch"):
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self._pending = deque(maxlen=max_pending) # Ring buffer of (target, line, timestamp)
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._flushed_seq = 0
+        self._queued_seq = 0
+        self._closed = False
+        self._inflight = [] # Batch taken by the writer thread and not yet on disk
+        self._checked_paths = set()
+        self._thread = None
+
+    def append(self, target, entry: dict):
+        """Queues an entry for `target` (a file path or ChatHistoryStore). Never touches the disk."""
+        line = json.dumps(entry) + "\n"
+        with self._cond:
+            if self._closed:
+                # Late turns flushed during shutdown
+                print(f"[ChatLogWriter] [WARN] Writer is closed, dropping chat entry from {entry.get('sender')}.")
+                return False
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            if not isinstance(target, ChatHistoryStore):
+                target = str(target)
+            self._pending.append((target, line, entry.get("timestamp")))
+            self._queued_seq += 1
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify_all()
+        self._ensure_thread()
+        return True
+
+    def pending_entries(self, target):
+        """Returns entries for `target` that are queued or being written but not yet on disk, oldest first."""
+        with self._cond:
+            lines = [line for t, line, _ in self._inflight + list(self._pending) if t is target]
+        return [json.loads(line) for line in lines]
+
+    def _written(self, target):
+        with self._cond:
+            self._inflight = [record for record in self._inflight if record[0] is not target]
+
+    def flush(self, wait: bool = True, timeout: float = 5.0):
+        """Requests a flush. With wait=True, blocks until everything queued so far is on disk."""
+        with self._cond:
+            target = self._queued_seq
+            if self._flushed_seq >= target:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+        self._ensure_thread()
+        if not wait:
+            return True
+        with self._cond:
+            return self._cond.wait_for(lambda: self._flushed_seq >= target, timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Flushes remaining entries and stops the writer thread."""
+        if self._closed:
+            return
+        self._ensure_thread()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._closed or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="ChatLogWriter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or self._flush_requested or len(self._pending) >= self.flush_size,
+                    self.flush_interval,
+                )
+                batch = list(self._pending)
+                self._inflight = batch
+                self._pending.clear()
+                seq = self._queued_seq
+                self._flush_requested = False
+                closed = self._closed
+
+            if batch:
+                self._write_batch(batch)
+
+            with self._cond:
+                self._inflight = []
+                self._flushed_seq = seq
+                self._cond.notify_all()
+            if closed:
+                return
+
+    def _write_batch(self, batch):
+        by_target = {}
+        for target, line, timestamp in batch:
+            by_target.setdefault(target, []).append((line, timestamp))
+
+        for target, records in by_target.items():
+            if isinstance(target, ChatHistoryStore):
+                try:
+                    target.write_records(records, fsync=self.fsync_policy == "batch",
+                                         on_written=lambda t=target: self._written(t))
+                except Exception as e:
+                    print(f"[ChatLogWriter] [ERR] Failed to write chat history to {target.root}: {e}")
+                continue
+
+            path = target
+            lines = [line for line, _ in records]
+            try:
+                with open(path, "ab") as f:
+                    if path not in self._checked_paths:
+                        self._repair_tail(f)
+                        self._checked_paths.add(path)
+                    f.write("".join(lines).encode("utf-8"))
+                    f.flush()
+                    if self.fsync_policy == "batch":
+                        os.fsync(f.fileno())
+            except Exception as e:
+                print(f"[ChatLogWriter] [ERR] Failed to write chat history to {path}: {e}")
+
+    @staticmethod
+    def _repair_tail(f):
+        """Terminates a partial last line so the next record starts on its own line."""
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        with open(f.name, "rb") as r:
+            r.seek(end - 1)
+            if r.read(1) != b"\n":
+                f.write(b"\n")
+
+
+def iter_lines_reversed(path, block_size: int = 8192, end: int = None):
+    """Yields the lines of a file from last to first, reading backwards in blocks. `end` ignores bytes after it."""
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        if end is not None:
+            pos = min(pos, end)
+        remainder = b""
+        while pos > 0:
+            read_size = min(block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            chunk = f.read(read_size) + remainder
+            lines = chunk.split(b"\n")
+            # The first piece may be the tail end of a line that starts in an earlier block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if remainder.strip():
+            yield remainder
+
+
+def _iter_entries_reversed(path, end: int = None):
+    for line in iter_lines_reversed(path, end=end):
+        try:
+            yield json.loads(line)
+        except (ValueError, UnicodeDecodeError):
+            # Torn or corrupt record
+            continue
+
+
+def read_tail(path, limit: int = 10):
+    """Returns the last `limit` entries of a JSONL history file, oldest first."""
+    if limit <= 0 or not os.path.exists(path):
+        return []
+    entries = []
+    for entry in _iter_entries_reversed(path):
+        entries.append(entry)
+        if len(entries) >= limit:
+            break
+    entries.reverse()
+    return entries
+
+
+def query(path, start: float = None, end: float = None, sender: str = None, limit: int = None):
+    """
+    Returns entries with start <= timestamp <= end (either bound optional),
+    optionally from a single sender, oldest first. `limit` keeps the most
+    recent matches. Entries are appended in time order, so the scan walks
+    backwards and stops once it passes `start`.
+    """
+    if not os.path.exists(path):
+        return []
+    entries = []
+    for entry in _iter_entries_reversed(path):
+        ts = entry.get("timestamp", 0)
+        if start is not None and ts < start:
+            break
+        if end is not None and ts > end:
+            continue
+        if sender is not None and entry.get("sender") != sender:
+            continue
+        entries.append(entry)
+        if limit is not None and len(entries) >= limit:
+            break
+    entries.reverse()
+    return entries
+
+
+def _compress(data: bytes):
+    """Compresses a sealed segment with zstd when available, gzip otherwise."""
+    if zstd is not None:
+        return zstd.ZstdCompressor(level=10).compress(data), ".zst"
+    return gzip.compress(data, compresslevel=6), ".gz"
+
+
+def _read_segment(path):
+    if path.endswith(".zst"):
+        if zstd is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        with open(path, "rb") as f:
+            return zstd.ZstdDecompressor().stream_reader(f).read()
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            return f.read()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _line_postings(data: bytes):
+    """Returns {token: [line numbers]} for a segment's lines, numbered as search results number them."""
+    index = TermIndex()
+    for line_num, line in enumerate(data.decode("utf-8", errors="ignore").split("\n"), 1):
+        index.add_line(None, line_num, line)
+    return index.doc_postings(None)
+
+
+def _line_count(data: bytes):
+    """Lines in a plain segment, counting a torn last line that the next append will terminate."""
+    return data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+
+
+def _iter_segment_entries_reversed(path, end: int = None):
+    if path.endswith(".jsonl"):
+        # The active segment is plain text and may be large; seek instead of loading it
+        yield from _iter_entries_reversed(path, end)
+        return
+    for line in reversed(_read_segment(path).split(b"\n")):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except (ValueError, UnicodeDecodeError):
+            continue
+
+
+class ChatHistoryStore:
+    """
+    Chat history for one project, split into time-bounded segments.
+
+    Segments live in `<project>/chat_history/` with a `manifest.json` that
+    records each segment's file, entry count, size and min/max timestamps.
+    The newest segment is plain JSONL that is appended to; once it exceeds
+    `max_segment_bytes` or spans `segment_seconds` it is sealed (compressed
+    with zstd, or gzip if zstandard isn't installed). Queries only open the
+    segments whose time range overlaps the request. Sealed segments are
+    dropped oldest-first beyond `max_total_bytes` or `retention_days`.
+
+    A legacy `chat_history.jsonl` in the project directory is split into
+    sealed segments by the same size/time limits when `migrate_legacy()` is
+    called (the project manager runs it in the background at project load).
+    Until then, reads fall back to the legacy file as the oldest history.
+
+    Search uses a token index (see search_index.TermIndex) over every
+    segment: each sealed segment has a `<id>.terms.json` sidecar with its
+    postings, written when it is sealed, and appended lines are indexed as
+    they are written. The index is loaded on first use, so a search only
+    opens the segments holding every query token.
+
+    Reads take a snapshot of the manifest under the store lock and open and
+    decompress segments outside it, so the writer thread never waits on a
+    reader. The active segment is read only up to its size at snapshot time;
+    if a file is sealed, migrated or dropped mid-read, the read is retried
+    on a fresh snapshot.
+    """
+
+    LEGACY_FILE = "chat_history.jsonl"
+    MANIFEST_FILE = "manifest.json"
+    TERMS_SUFFIX = ".terms.json"
+
+    def __init__(self, project_path, max_segment_bytes: int = 1024 * 1024,
+                 segment_seconds: float = 24 * 3600, max_total_bytes: int = 50 * 1024 * 1024,
+                 retention_days: float = None):
+        self.project_path = str(project_path)
+        self.root = os.path.join(self.project_path, "chat_history")
+        self.max_segment_bytes = max_segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_total_bytes = max_total_bytes
+        self.retention_days = retention_days
+        self._lock = threading.RLock()
+        self._migration_lock = threading.Lock()
+        self._tail_checked = False
+        self._stale_files = [] # Replaced files a reader still had open (Windows won't delete those)
+        self._term_index = None # Segment id -> line postings; loaded by load_search_index()
+        self._term_index_lock = threading.Lock()
+        self._active_lines = 0 # Lines in the active segment, for numbering indexed appends
+        self.legacy_path = os.path.join(self.project_path, self.LEGACY_FILE)
+        os.makedirs(self.root, exist_ok=True)
+        self._manifest = self._load_manifest()
+
+    # --- Manifest ---
+
+    def _manifest_path(self):
+        return os.path.join(self.root, self.MANIFEST_FILE)
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            manifest.setdefault("segments", [])
+            manifest.setdefault("next_id", len(manifest["segments"]))
+            return manifest
+        except FileNotFoundError:
+            return {"segments": [], "next_id": 0}
+        except ValueError as e:
+            print(f"[ChatHistoryStore] [ERR] Corrupt manifest in {self.root}, rebuilding: {e}")
+            return self._rebuild_manifest()
+
+    def _rebuild_manifest(self):
+        manifest = {"segments": [], "next_id": 0}
+        for name in sorted(os.listdir(self.root)):
+            if name == self.MANIFEST_FILE or name.endswith(".tmp") or name.endswith(self.TERMS_SUFFIX):
+                continue
+            seg = self._describe(os.path.join(self.root, name))
+            seg["sealed"] = not name.endswith(".jsonl")
+            manifest["segments"].append(seg)
+            seg_id = int(name.split(".")[0]) if name.split(".")[0].isdigit() else 0
+            manifest["next_id"] = max(manifest["next_id"], seg_id + 1)
+        # Migrated legacy segments get later ids than the history they precede
+        manifest["segments"].sort(key=lambda seg: (not seg["sealed"], seg["start"] is None, seg["start"] or 0))
+        return manifest
+
+    def _save_manifest(self):
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _describe(self, path):
+        """Scans a segment for its entry count and timestamp range."""
+        count, start, end = 0, None, None
+        for entry in _iter_segment_entries_reversed(path):
+            ts = entry.get("timestamp")
+            count += 1
+            if ts is not None:
+                start = ts if start is None else min(start, ts)
+                end = ts if end is None else max(end, ts)
+        return {
+            "file": os.path.basename(path),
+            "count": count,
+            "start": start,
+            "end": end,
+            "bytes": os.path.getsize(path),
+        }
+
+    # --- Writing ---
+
+    def _active(self):
+        segments = self._manifest["segments"]
+        if segments and not segments[-1].get("sealed"):
+            return segments[-1]
+        return None
+
+    def _new_active(self):
+        seg = {
+            "file": f"{self._manifest['next_id']:06d}.jsonl",
+            "count": 0,
+            "start": None,
+            "end": None,
+            "bytes": 0,
+            "sealed": False,
+        }
+        self._manifest["next_id"] += 1
+        self._manifest["segments"].append(seg)
+        self._tail_checked = True # Fresh file, nothing to repair
+        self._active_lines = 0
+        return seg
+
+    def _should_seal(self, seg, next_timestamp=None):
+        if seg["bytes"] >= self.max_segment_bytes:
+            return True
+        if seg["start"] is not None and next_timestamp is not None:
+            return next_timestamp - seg["start"] >= self.segment_seconds
+        return False
+
+    def write_records(self, records, fsync: bool = False, on_written=None):
+        """
+        Appends (line, timestamp) records. Called from the ChatLogWriter thread.
+        `on_written` runs under the store lock once the records are on disk.
+        Full segments are compressed after the lock is released.
+        """
+        with self._lock:
+            self._remove_stale()
+            segments = self._manifest["segments"]
+            # Segments whose seal was interrupted
+            to_seal = [seg for seg in segments[:-1] if not seg.get("sealed")]
+            seg = self._active()
+            first_ts = records[0][1] if records else None
+            if seg is not None and self._should_seal(seg, first_ts):
+                to_seal.append(seg)
+                seg = None
+            if seg is None:
+                seg = self._new_active()
+
+            path = os.path.join(self.root, seg["file"])
+            data = "".join(line for line, _ in records).encode("utf-8")
+            with open(path, "ab") as f:
+                if not self._tail_checked:
+                    ChatLogWriter._repair_tail(f)
+                    self._tail_checked = True
+                f.write(data)
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+                seg["bytes"] = f.tell()
+
+            doc = self._segment_id(seg["file"])
+            for line, ts in records:
+                if self._term_index is not None:
+                    self._active_lines += 1
+                    self._term_index.add_line(doc, self._active_lines, line)
+                seg["count"] += 1
+                if ts is not None:
+                    seg["start"] = ts if seg["start"] is None else min(seg["start"], ts)
+                    seg["end"] = ts if seg["end"] is None else max(seg["end"], ts)
+
+            if self._should_seal(seg):
+                to_seal.append(seg)
+            self._save_manifest()
+            if on_written is not None:
+                on_written()
+
+        for seg in to_seal:
+            self._seal(seg)
+
+    def _seal(self, seg):
+        """
+        Compresses a finished segment and applies retention. Only the writer
+        thread appends, so the plain file is stable while it compresses and
+        readers keep using it until the manifest swap.
+        """
+        src = os.path.join(self.root, seg["file"])
+        with open(src, "rb") as f:
+            data = f.read()
+        compressed, ext = _compress(data)
+        dest_name = seg["file"] + ext
+        tmp_path = os.path.join(self.root, dest_name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        # The sidecar exists before the segment is listed as sealed, so loading the index never has to decompress it
+        self._write_terms(seg["file"], _line_postings(data))
+        with self._lock:
+            os.replace(tmp_path, os.path.join(self.root, dest_name))
+            seg.update({"file": dest_name, "bytes": len(compressed), "sealed": True})
+            # Record the sealed file before removing the plain one, so a crash leaves no gap
+            self._save_manifest()
+            self._remove(src)
+            self._apply_retention()
+
+    def _remove(self, path):
+        """Deletes a file the manifest no longer references, retrying later if a reader still has it open."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            self._stale_files.append(path)
+
+    def _remove_stale(self):
+        stale, self._stale_files = self._stale_files, []
+        for path in stale:
+            self._remove(path)
+
+    def _apply_retention(self):
+        segments = self._manifest["segments"]
+        cutoff = time.time() - self.retention_days * 86400 if self.retention_days else None
+        while segments and segments[0].get("sealed"):
+            oldest = segments[0]
+            total = sum(s["bytes"] for s in segments)
+            expired = cutoff is not None and oldest["end"] is not None and oldest["end"] < cutoff
+            if not expired and total <= self.max_total_bytes:
+                break
+            segments.pop(0)
+            self._remove(os.path.join(self.root, oldest["file"]))
+            self._remove(self._terms_path(oldest["file"]))
+            if self._term_index is not None:
+                self._term_index.remove(self._segment_id(oldest["file"]))
+
+    def has_legacy(self):
+        # A migrated file a reader still held open stays on disk until _remove_stale() gets it
+        return os.path.exists(self.legacy_path) and self.legacy_path not in self._stale_files
+
+    def _split_legacy(self):
+        """Yields (lines, count, start, end) chunks of the legacy file within the segment size/time limits."""
+        lines, size, count, start, end = [], 0, 0, None, None
+        with open(self.legacy_path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except (ValueError, UnicodeDecodeError):
+                    # Torn or corrupt record
+                    continue
+                if not line.endswith(b"\n"):
+                    line += b"\n"
+                ts = entry.get("timestamp") if isinstance(entry, dict) else None
+                too_big = size + len(line) > self.max_segment_bytes
+                too_long = ts is not None and start is not None and ts - start >= self.segment_seconds
+                if lines and (too_big or too_long):
+                    yield lines, count, start, end
+                    lines, size, count, start, end = [], 0, 0, None, None
+                lines.append(line)
+                size += len(line)
+                count += 1
+                if ts is not None:
+                    start = ts if start is None else min(start, ts)
+                    end = ts if end is None else max(end, ts)
+        if lines:
+            yield lines, count, start, end
+
+    def migrate_legacy(self):
+        """
+        Moves a legacy chat_history.jsonl into sealed, time-bounded segments.
+        Chunks are compressed without holding the store lock; the manifest
+        swap and removal of the legacy file happen together under it.
+        """
+        with self._migration_lock:
+            if not self.has_legacy():
+                return
+            try:
+                migrated = []
+                for lines, count, start, end in self._split_legacy():
+                    with self._lock:
+                        seg_id = self._manifest["next_id"]
+                        self._manifest["next_id"] += 1
+                    data = b"".join(lines)
+                    compressed, ext = _compress(data)
+                    name = f"{seg_id:06d}.jsonl{ext}"
+                    tmp_path = os.path.join(self.root, name + ".tmp")
+                    with open(tmp_path, "wb") as f:
+                        f.write(compressed)
+                    os.replace(tmp_path, os.path.join(self.root, name))
+                    self._write_terms(name, _line_postings(data))
+                    migrated.append({"file": name, "count": count, "start": start, "end": end,
+                                     "bytes": len(compressed), "sealed": True})
+                with self._lock:
+                    # Older than anything already in the store
+                    self._manifest["segments"][0:0] = migrated
+                    self._save_manifest()
+                    self._remove(self.legacy_path)
+                    if self._term_index is not None:
+                        for seg in migrated:
+                            self._term_index.add_postings(self._segment_id(seg["file"]), self._load_terms(seg["file"]))
+                    self._apply_retention()
+                print(f"[ChatHistoryStore] Migrated {self.legacy_path} into {len(migrated)} segments in {self.root}")
+            except Exception as e:
+                print(f"[ChatHistoryStore] [ERR] Failed to migrate legacy chat history: {e}")
+
+    # --- Reading ---
+
+    # --- Search index ---
+
+    @staticmethod
+    def _segment_id(name):
+        """The id part of a segment file name; it stays the same when the segment is sealed."""
+        return name.split(".")[0]
+
+    def _terms_path(self, name):
+        return os.path.join(self.root, self._segment_id(name) + self.TERMS_SUFFIX)
+
+    def _write_terms(self, name, postings):
+        tmp_path = self._terms_path(name) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(postings, f)
+        os.replace(tmp_path, self._terms_path(name))
+
+    def _load_terms(self, name):
+        try:
+            with open(self._terms_path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"[ChatHistoryStore] [ERR] Failed to load search terms for {name}: {e}")
+            return {}
+
+    def load_search_index(self):
+        """
+        Loads the token index used by search(), once. Sealed segments from
+        before sidecars existed are indexed first, outside the store lock;
+        after that only sidecars and the active segment are read.
+        """
+        with self._term_index_lock:
+            if self._term_index is not None:
+                return
+            with self._lock:
+                sealed = [seg["file"] for seg in self._manifest["segments"] if seg.get("sealed")]
+            for name in sealed:
+                if os.path.exists(self._terms_path(name)):
+                    continue
+                try:
+                    self._write_terms(name, _line_postings(_read_segment(os.path.join(self.root, name))))
+                except FileNotFoundError:
+                    # Dropped by retention meanwhile
+                    continue
+                except Exception as e:
+                    print(f"[ChatHistoryStore] [ERR] Failed to index {name}: {e}")
+
+            with self._lock:
+                index = TermIndex()
+                segments = self._manifest["segments"]
+                for seg in segments:
+                    doc = self._segment_id(seg["file"])
+                    if seg.get("sealed"):
+                        index.add_postings(doc, self._load_terms(seg["file"]))
+                        continue
+                    try:
+                        with open(os.path.join(self.root, seg["file"]), "rb") as f:
+                            data = f.read(seg["bytes"])
+                    except FileNotFoundError:
+                        data = b""
+                    index.add_postings(doc, _line_postings(data))
+                    if seg is segments[-1]:
+                        self._active_lines = _line_count(data)
+                self._term_index = index
+
+    def search(self, needle: str):
+        """
+        Returns {"file", "line", "content"} for every stored JSON line
+        containing `needle` (case-insensitive), oldest first, including
+        sealed segments and an unmigrated legacy file. The token index picks
+        the segments and lines to check, so only segments with candidate
+        lines are opened, outside the store lock.
+        """
+        self.load_search_index()
+        tokens = tokenize(needle)
+        needle = needle.lower()
+
+        def read(candidates, segments, legacy):
+            results = []
+            sources = []
+            if legacy:
+                # Not migrated yet, so not indexed either
+                sources.append((self.legacy_path, None, None))
+            for seg in segments:
+                doc = self._segment_id(seg["file"])
+                if candidates is not None and doc not in candidates:
+                    continue
+                end = None if seg.get("sealed") else seg["bytes"]
+                sources.append((os.path.join(self.root, seg["file"]), end, None if candidates is None else candidates[doc]))
+            for path, end, line_nums in sources:
+                if end is None:
+                    data = _read_segment(path)
+                else:
+                    with open(path, "rb") as f:
+                        data = f.read(end)
+                rel = os.path.relpath(path, self.project_path).replace(os.sep, "/")
+                for line_num, line in enumerate(data.decode("utf-8", errors="ignore").split("\n"), 1):
+                    if line_nums is not None and line_num not in line_nums:
+                        continue
+                    content = line.strip()
+                    if content and needle in content.lower():
+                        results.append({"file": rel, "line": line_num, "content": content})
+            return results
+
+        # Candidates come from the index in the same critical section as the segment snapshot
+        return self._read_snapshot(read, lambda: self._term_index.candidates(tokens))
+
+    def segments(self):
+        with self._lock:
+            return [dict(seg) for seg in self._manifest["segments"]]
+
+    def _read_snapshot(self, read, pending=None, attempts: int = 3):
+        """
+        Calls `read(pending_entries, segments, legacy)` on a manifest snapshot
+        taken under the store lock, and runs it outside the lock. `pending` is
+        called in the same critical section and its result passed through, so
+        e.g. writer entries are either pending or within the snapshotted
+        segment sizes, never both. A FileNotFoundError
+        means the snapshot went stale; the last attempt reads under the lock.
+        """
+        for attempt in range(attempts):
+            with self._lock:
+                entries = pending() if pending is not None else []
+                segments = [dict(seg) for seg in self._manifest["segments"]]
+                legacy = self.has_legacy()
+                if attempt == attempts - 1:
+                    return read(entries, segments, legacy)
+            try:
+                return read(entries, segments, legacy)
+            except FileNotFoundError:
+                continue
+
+    def _iter_segment(self, seg):
+        """Entries of a snapshotted segment, newest first. The active one is read only up to its snapshot size."""
+        end = None if seg.get("sealed") else seg["bytes"]
+        return _iter_segment_entries_reversed(os.path.join(self.root, seg["file"]), end)
+
+    def read_tail(self, limit: int = 10, pending=None):
+        """
+        Returns the last `limit` entries, oldest first, opening only as many
+        segments as needed. `pending` is an optional callable returning newer
+        entries not yet written (see ChatLogWriter.pending_entries); it is
+        called under the store lock so nothing is missed or seen twice.
+        """
+        if limit <= 0:
+            return []
+
+        def read(pending_entries, segments, legacy):
+            entries = list(reversed(pending_entries[-limit:]))
+            for seg in reversed(segments):
+                if len(entries) >= limit:
+                    break
+                for entry in self._iter_segment(seg):
+                    entries.append(entry)
+                    if len(entries) >= limit:
+                        break
+            if len(entries) < limit and legacy:
+                # Not migrated yet
+                for entry in _iter_entries_reversed(self.legacy_path):
+                    entries.append(entry)
+                    if len(entries) >= limit:
+                        break
+            entries.reverse()
+            return entries
+
+        return self._read_snapshot(read, pending)
+
+    def query(self, start: float = None, end: float = None, sender: str = None, limit: int = None, pending=None):
+        """Same contract as the module-level query(), skipping segments outside [start, end]. See read_tail() for `pending`."""
+        def matches(entry):
+            ts = entry.get("timestamp", 0)
+            if (start is not None and ts < start) or (end is not None and ts > end):
+                return False
+            return sender is None or entry.get("sender") == sender
+
+        def read(pending_entries, segments, legacy):
+            entries = [entry for entry in reversed(pending_entries) if matches(entry)]
+            if limit is not None:
+                del entries[limit:]
+            sources = []
+            for seg in reversed(segments):
+                if seg["count"] == 0:
+                    continue
+                if start is not None and seg["end"] is not None and seg["end"] < start:
+                    break
+                if end is not None and seg["start"] is not None and seg["start"] > end:
+                    continue
+                sources.append(self._iter_segment(seg))
+            else:
+                if legacy:
+                    # Not migrated yet; its time range is unknown, but the backwards scan stops at `start`
+                    sources.append(_iter_entries_reversed(self.legacy_path))
+            for source in sources:
+                if limit is not None and len(entries) >= limit:
+                    break
+                for entry in source:
+                    if start is not None and entry.get("timestamp", 0) < start:
+                        break
+                    if not matches(entry):
+                        continue
+                    entries.append(entry)
+                    if limit is not None and len(entries) >= limit:
+                        break
+            entries.reverse()
+            return entries
+
+        return self._read_snapshot(read, pending)
@@ -0,0 +1,149 @@
+import hashlib
+from pathlib import Path
+
+# Files that are bookkeeping rather than project content
+EXCLUDED_FILES = {"config.json", "jules_sessions.json"}
+EXCLUDED_DIRS = {"chat_history", ".cache"}
+
+
+class ContextBuilder:
+    """
+    Builds the project context text sent to the model, within a byte budget.
+
+    Text files are summarised as a head snippet of up to `per_file_bytes`;
+    snippets are cached per file and only re-read when the file's mtime/size
+    change. Files are ordered most recently modified first, so when the
+    budget runs out it's the stale files that are left as names only.
+
+    `build_delta()` returns only what changed since the last `build()` or
+    `build_delta()`, for refreshing a live session without resending
+    everything. Files that were listed but didn't fit the budget are
+    remembered as omitted; a delta only retries them once they change or
+    when it has room left over for them.
+    """
+
+    def __init__(self, project_path, watcher, budget_bytes: int = 16000,
+                 per_file_bytes: int = 4000, max_file_size: int = 10000, max_listed_files: int = 200):
+        self.project_path = Path(project_path)
+        self.watcher = watcher
+        self.budget_bytes = budget_bytes
+        self.per_file_bytes = per_file_bytes
+        self.max_file_size = max_file_size
+        self.max_listed_files = max_listed_files
+        self._digests = {} # rel path -> (mtime_ns, size, snippet, digest)
+        self._sent = {} # rel path -> digest last sent to the session
+        self._omitted = {} # rel path -> (mtime_ns, size, block bytes) listed but left out for budget
+
+    def _files(self):
+        files = []
+        for info in self.watcher.files():
+            rel = info["path"]
+            if rel in EXCLUDED_FILES or rel.split("/")[0] in EXCLUDED_DIRS:
+                continue
+            files.append(info)
+        # Most recently touched first
+        files.sort(key=lambda info: info["mtime"], reverse=True)
+        return files
+
+    def _digest(self, info):
+        """Returns (snippet, digest) for a text file, reusing the cache while the file is unchanged."""
+        rel = info["path"]
+        cached = self._digests.get(rel)
+        if cached and cached[0] == info["mtime_ns"] and cached[1] == info["size"]:
+            return cached[2], cached[3]
+
+        if info["size"] > self.max_file_size:
+            snippet = f"(too large: {info['size']} bytes, skipped)"
+        else:
+            try:
+                with open(self.project_path / rel, "rb") as f:
+                    raw = f.read(self.per_file_bytes + 1)
+                snippet = raw[:self.per_file_bytes].decode("utf-8", errors="ignore")
+                if len(raw) > self.per_file_bytes:
+                    snippet += f"\n... (truncated, {info['size']} bytes total)"
+            except Exception as e:
+                snippet = f"(error reading: {e})"
+
+        digest = hashlib.sha1(snippet.encode("utf-8")).hexdigest()
+        self._digests[rel] = (info["mtime_ns"], info["size"], snippet, digest)
+        return snippet, digest
+
+    def _append_snippets(self, lines, files, used):
+        """Adds file snippets in order until the budget is spent. Returns the bytes used."""
+        for info in files:
+            if info["type"] != "text":
+                continue
+            snippet, digest = self._digest(info)
+            block = f"--- {info['path']} ---\n{snippet}\n"
+            size = len(block.encode("utf-8"))
+            if used + size > self.budget_bytes:
+                self._omitted[info["path"]] = (info["mtime_ns"], info["size"], size)
+                continue
+            lines.append(block)
+            used += size
+            self._sent[info["path"]] = digest
+            self._omitted.pop(info["path"], None)
+        return used
+
+    def build(self, project_name: str):
+        """Returns the full budgeted context and records it as sent."""
+        files = self._files()
+        self._sent = {}
+        self._omitted = {}
+        header = [
+            f"=== Project Context: '{project_name}' ===",
+            f"Project directory: {self.project_path}",
+            "",
+        ]
+        if not files:
+            header.append("(No files in project yet)")
+        else:
+            header.append(f"Files ({len(files)} total, most recent first):")
+            for info in files[:self.max_listed_files]:
+                header.append(f"  - {info['path']}")
+            if len(files) > self.max_listed_files:
+                header.append(f"  ... and {len(files) - self.max_listed_files} more")
+        header.append("")
+
+        lines = ["\n".join(header)]
+        used = len(lines[0].encode("utf-8"))
+        self._append_snippets(lines, files, used)
+        return "\n".join(lines)
+
+    def build_delta(self, project_name: str):
+        """Returns context for files added, changed or removed since the last send, or "" if none."""
+        files = self._files()
+        current = {info["path"] for info in files}
+        removed = sorted(rel for rel in self._sent if rel not in current)
+        for rel in removed:
+            del self._sent[rel]
+        for rel in [rel for rel in self._omitted if rel not in current]:
+            del self._omitted[rel]
+
+        changed = []
+        waiting = []
+        for info in files:
+            if info["type"] != "text":
+                continue
+            omitted = self._omitted.get(info["path"])
+            if omitted and omitted[:2] == (info["mtime_ns"], info["size"]):
+                # Unchanged since it was left out; only worth sending if there's room
+                waiting.append((info, omitted[2]))
+                continue
+            _, digest = self._digest(info)
+            if self._sent.get(info["path"]) != digest:
+                changed.append(info)
+
+        if not changed and not removed:
+            return ""
+
+        header = [f"=== Project Context Update: '{project_name}' ==="]
+        if removed:
+            header.append("Removed files: " + ", ".join(removed))
+        lines = ["\n".join(header) + "\n"]
+        used = self._append_snippets(lines, changed, len(lines[0].encode("utf-8")))
+        # Fill leftover budget with previously omitted files, without re-reading ones that can't fit
+        fits = [info for info, size in waiting if used + size <= self.budget_bytes]
+        if fits:
+            self._append_snippets(lines, fits, used)
+        return "\n".join(lines)
@@ -0,0 +1,151 @@
+import time
+import base64
+
+import cv2
+import numpy as np
+
+
+class FramePipeline:
+    """
+    Turns raw BGR camera frames into JPEG bytes for the Live session.
+
+    Frames are scaled with `cv2.resize` straight from the capture buffer and
+    encoded with `cv2.imencode`, which uses OpenCV's libjpeg-turbo build, so
+    there is no PIL image, BytesIO or colour conversion per frame. The result
+    stays as bytes; base64 happens once, inside the SDK, when it is sent.
+
+    Each frame gets a 64-bit difference hash (dHash). A frame whose hash is
+    within `hash_threshold` bits of the last emitted one is skipped, so a
+    static scene isn't encoded and re-sent every second. After
+    `keyframe_seconds` a frame is emitted anyway so the model's view never
+    goes too stale; pass 0 to disable that.
+    """
+
+    def __init__(self, max_size: int = 1024, jpeg_quality: int = 80, hash_threshold: int = 4,
+                 keyframe_seconds: float = 30.0):
+        self.max_size = max_size
+        self.hash_threshold = hash_threshold
+        self.keyframe_seconds = keyframe_seconds
+        self._encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        self._last_hash = None
+        self._last_emit = 0.0
+
+        self.stats = {
+            "frames": 0,
+            "emitted": 0,
+            "duplicates": 0,
+            "encode_errors": 0,
+            "last_bytes": 0,
+            "last_encode_ms": None,
+        }
+
+    def _resize(self, frame):
+        """Scales the frame down to fit max_size, keeping the aspect ratio."""
+        height, width = frame.shape[:2]
+        scale = self.max_size / max(height, width)
+        if scale >= 1:
+            return frame
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def dhash(frame, hash_size: int = 8) -> int:
+        """Returns the difference hash of a BGR or grayscale frame as an int."""
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+        bits = small[:, 1:] > small[:, :-1]
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    def is_duplicate(self, frame_hash: int, now: float) -> bool:
+        if self._last_hash is None:
+            return False
+        if self.keyframe_seconds and now - self._last_emit >= self.keyframe_seconds:
+            return False
+        return bin(frame_hash ^ self._last_hash).count("1") <= self.hash_threshold
+
+    def process(self, frame, now: float = None):
+        """Returns JPEG bytes for a BGR frame, or None if it is unchanged or can't be encoded."""
+        now = time.monotonic() if now is None else now
+        self.stats["frames"] += 1
+        resized = self._resize(frame)
+        frame_hash = self.dhash(resized)
+        if self.is_duplicate(frame_hash, now):
+            self.stats["duplicates"] += 1
+            return None
+
+        started = time.perf_counter()
+        ok, encoded = cv2.imencode(".jpg", resized, self._encode_params)
+        if not ok:
+            self.stats["encode_errors"] += 1
+            return None
+        data = encoded.tobytes()
+        self.stats["last_encode_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self.stats["last_bytes"] = len(data)
+        self.stats["emitted"] += 1
+        self._last_hash = frame_hash
+        self._last_emit = now
+        return data
+
+    def reset(self):
+        """Forgets the last frame so the next one is always emitted."""
+        self._last_hash = None
+
+    def metrics(self):
+        return dict(self.stats)
+
+
+class LatestFrame:
+    """
+    Single slot holding the newest frame from the UI as raw JPEG bytes.
+
+    Every `put` replaces the slot and bumps a sequence number; older frames
+    are simply dropped. `take_unsent` returns a fresh payload only for a
+    frame the session hasn't seen yet, tagged with its sequence number under
+    "_frame_seq"; the sender strips the tag and calls `mark_sent` once the
+    send succeeds. Base64 strings (optionally data URLs) are decoded once on
+    ingestion, so the only encoding left is the SDK's at send time.
+    """
+
+    def __init__(self, mime_type: str = "image/jpeg"):
+        self.mime_type = mime_type
+        self.data = None
+        self.seq = 0
+        self.sent_seq = 0
+        self.stats = {"received": 0, "sent": 0, "replaced_unsent": 0, "decode_errors": 0}
+
+    def put(self, data):
+        """Stores a frame given as bytes or base64 text. Returns its sequence number, or None if invalid."""
+        if isinstance(data, str):
+            try:
+                data = base64.b64decode(data.split(",", 1)[-1], validate=True)
+            except ValueError:
+                self.stats["decode_errors"] += 1
+                return None
+        elif isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        if not data:
+            return None
+        if self.seq > self.sent_seq and self.data is not None:
+            self.stats["replaced_unsent"] += 1
+        self.data = data
+        self.seq += 1
+        self.stats["received"] += 1
+        return self.seq
+
+    def take_unsent(self):
+        """Returns a payload for the newest frame if it hasn't been sent yet, otherwise None."""
+        if self.data is None or self.seq == self.sent_seq:
+            return None
+        return {"mime_type": self.mime_type, "data": self.data, "_frame_seq": self.seq}
+
+    def mark_sent(self, seq: int):
+        if seq > self.sent_seq:
+            self.sent_seq = seq
+            self.stats["sent"] += 1
+
+    def mark_unseen(self):
+        """Makes the current frame sendable again, e.g. for a new session without the old context."""
+        self.sent_seq = 0
+
+    def metrics(self):
+        return dict(self.stats, seq=self.seq, sent_seq=self.sent_seq)
@@ -0,0 +1,140 @@
+import time
+import asyncio
+from collections import deque
+
+
+class JitterBuffer:
+    """
+    Playback buffer for model audio that smooths bursty network delivery.
+
+    Playback starts once `target_latency_ms` of audio is buffered (or the
+    first chunk has waited that long, or the turn has ended), so short
+    delivery gaps are absorbed instead of heard. Running dry mid-turn counts
+    as an underrun: playback re-primes and the target grows by
+    `adapt_step_ms` up to `max_latency_ms`. After `stable_seconds` without an
+    underrun it shrinks back one step, down to `min_latency_ms`.
+
+    Buffering more than `max_buffer_ms` drops the oldest audio (an overrun).
+    `flush()` (barge-in) is O(1). `mark_end_of_turn()` lets the tail of a
+    turn play out without waiting for the target or counting the final
+    drain as an underrun.
+    """
+
+    def __init__(self, sample_rate: int = 24000, sample_width: int = 2, channels: int = 1,
+                 target_latency_ms: float = 150, min_latency_ms: float = 60, max_latency_ms: float = 400,
+                 max_buffer_ms: float = 60000, adapt_step_ms: float = 20, stable_seconds: float = 30):
+        self.bytes_per_ms = sample_rate * sample_width * channels / 1000
+        self.target_latency_ms = target_latency_ms
+        self.min_latency_ms = min_latency_ms
+        self.max_latency_ms = max_latency_ms
+        self.max_buffer_ms = max_buffer_ms
+        self.adapt_step_ms = adapt_step_ms
+        self.stable_seconds = stable_seconds
+
+        self._chunks = deque()
+        self._bytes = 0
+        self._playing = False
+        self._end_of_turn = False
+        self._first_chunk_at = None # When priming started, for the priming timeout
+        self._event = asyncio.Event()
+
+        self.underruns = 0
+        self.overruns = 0
+        self.flushes = 0
+        self._underrun_times = deque()
+        self._last_adjust = time.monotonic()
+
+    # --- Producer side ---
+
+    def put(self, data: bytes):
+        if not data:
+            return
+        self._chunks.append(data)
+        self._bytes += len(data)
+        while self._bytes > self.max_buffer_ms * self.bytes_per_ms and len(self._chunks) > 1:
+            self._bytes -= len(self._chunks.popleft())
+            self.overruns += 1
+        if self._first_chunk_at is None:
+            self._first_chunk_at = time.monotonic()
+        self._event.set()
+
+    def mark_end_of_turn(self):
+        """Lets buffered audio play out to the end without waiting for more."""
+        self._end_of_turn = True
+        self._event.set()
+
+    def flush(self):
+        """Drops everything buffered (barge-in)."""
+        self._chunks = deque()
+        self._bytes = 0
+        self._playing = False
+        self._end_of_turn = False
+        self._first_chunk_at = None
+        self.flushes += 1
+        self._event.set()
+
+    # --- Consumer side ---
+
+    def depth_ms(self):
+        return self._bytes / self.bytes_per_ms
+
+    def _priming_wait(self):
+        """Returns 0 if playback can start now, otherwise seconds until the priming timeout."""
+        if self._end_of_turn or self.depth_ms() >= self.target_latency_ms:
+            return 0
+        waited_ms = (time.monotonic() - self._first_chunk_at) * 1000
+        return max(0, self.target_latency_ms - waited_ms) / 1000
+
+    async def get(self):
+        """Waits for the next chunk to play."""
+        while True:
+            timeout = None
+            if self._chunks:
+                timeout = 0 if self._playing else self._priming_wait()
+                if timeout == 0:
+                    self._playing = True
+                    chunk = self._chunks.popleft()
+                    self._bytes -= len(chunk)
+                    self._relax()
+                    return chunk
+            else:
+                if self._playing and not self._end_of_turn:
+                    self._record_underrun()
+                self._playing = False
+                self._end_of_turn = False
+                self._first_chunk_at = None
+
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- Adaptation / metrics ---
+
+    def _record_underrun(self):
+        now = time.monotonic()
+        self.underruns += 1
+        self._underrun_times.append(now)
+        self.target_latency_ms = min(self.max_latency_ms, self.target_latency_ms + self.adapt_step_ms)
+        self._last_adjust = now
+
+    def _relax(self):
+        now = time.monotonic()
+        if now - self._last_adjust >= self.stable_seconds:
+            self.target_latency_ms = max(self.min_latency_ms, self.target_latency_ms - self.adapt_step_ms)
+            self._last_adjust = now
+
+    def metrics(self):
+        now = time.monotonic()
+        while self._underrun_times and now - self._underrun_times[0] > 60:
+            self._underrun_times.popleft()
+        return {
+            "depth_ms": round(self.depth_ms(), 1),
+            "target_latency_ms": self.target_latency_ms,
+            "playing": self._playing,
+            "underruns": self.underruns,
+            "underruns_per_minute": len(self._underrun_times),
+            "overruns": self.overruns,
+            "flushes": self.flushes,
+        }
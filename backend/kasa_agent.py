@@ -1,11 +1,36 @@
 import asyncio
 import os
-from kasa import Discover, SmartDevice, SmartBulb, SmartPlug
+from kasa import Device, DeviceConfig, Discover, SmartDevice, SmartBulb, SmartPlug, SmartStrip, SmartDimmer
+
+# Device classes by the "type" persisted in settings, for entries saved
+# before the connection config was. These legacy classes only speak the old
+# XOR protocol, so a device that doesn't answer falls back to discovery.
+DEVICE_CLASSES = {
+    "bulb": SmartBulb,
+    "plug": SmartPlug,
+    "strip": SmartStrip,
+    "dimmer": SmartDimmer,
+}
 
 class KasaAgent:
-    def __init__(self, known_devices=None):
+    def __init__(self, known_devices=None, refresh_interval=30, known_groups=None, on_groups_changed=None, max_concurrency=8, connect_timeout=2.0):
         self.devices = {}
+        # Cached state per IP, in the same shape the frontend expects.
+        # Commands update it optimistically; the refresher reconciles it.
+        self.device_states = {}
         self.known_devices_config = known_devices or []
+        self.refresh_interval = refresh_interval
+        self._refresh_task = None
+        self._connect_task = None
+        self.connect_timeout = connect_timeout
+        # IPs whose device object has completed at least one update()
+        self._ready = set()
+        # Saved connection configs (DeviceConfig.to_dict()) per IP, so any protocol reconnects without discovery
+        self._configs = {}
+        # Named groups/scenes: {name: [ip or alias, ...]}, persisted by the owner via on_groups_changed
+        self.groups = dict(known_groups or {})
+        self.on_groups_changed = on_groups_changed
+        self.max_concurrency = max_concurrency
         self.include_raw = os.environ.get("INCLUDE_RAW_LOGS", "False") == "True"
 
     def _log(self, *args, **kwargs):
@@ -13,37 +38,126 @@ class KasaAgent:
             print(*args, **kwargs)
 
     async def initialize(self):
-        """Initializes devices from the saved configuration."""
-        if self.known_devices_config:
-            self._log(f"[KasaAgent] Initializing {len(self.known_devices_config)} known devices...")
-            tasks = []
-            # The config can be a list of dicts from a file, or a dict from the test fixture
-            if isinstance(self.known_devices_config, dict):
-                for ip, info in self.known_devices_config.items():
-                    alias = info.get('alias')
-                    tasks.append(self._add_known_device(ip, alias, info))
+        """Initializes devices from the saved configuration.
+
+        Devices with a saved connection config are reconnected with
+        Device.connect() and those with only a persisted type are
+        constructed directly; both are seeded from settings. Connectivity
+        is checked in the background with a short timeout, so startup does
+        not wait on (offline) devices.
+        """
+        if not self.known_devices_config:
+            return
+
+        self._log(f"[KasaAgent] Initializing {len(self.known_devices_config)} known devices...")
+        # The config can be a list of dicts from a file, or a dict from the test fixture
+        if isinstance(self.known_devices_config, dict):
+            entries = [(ip, info) for ip, info in self.known_devices_config.items()]
+        else:
+            entries = [(d.get('ip'), d) for d in self.known_devices_config if d]
+
+        untyped = []
+        for ip, info in entries:
+            if not ip:
+                continue
+            dev_type = self._persisted_type(info)
+            if info.get('config'):
+                # Connected in the background; the cached alias resolves commands until then
+                self._configs[ip] = info['config']
+                self._seed_state(ip, info, dev_type)
+            elif dev_type in DEVICE_CLASSES:
+                self.devices[ip] = self._build_device(ip, dev_type)
+                self._seed_state(ip, info, dev_type)
             else:
-                for d in self.known_devices_config:
-                    if not d: continue
-                    ip = d.get('ip')
-                    alias = d.get('alias')
-                    if ip:
-                        # Create a device instance from IP
-                        tasks.append(self._add_known_device(ip, alias, d))
-            
-            if tasks:
-                await asyncio.gather(*tasks)
+                # Older settings without a type still need discovery - done in the background
+                untyped.append(ip)
+
+        self._connect_task = asyncio.create_task(self._check_known_devices(untyped))
+
+    def _persisted_type(self, info):
+        dev_type = info.get('type')
+        if dev_type:
+            return dev_type
+        for flag, name in (("is_bulb", "bulb"), ("is_plug", "plug"), ("is_strip", "strip"), ("is_dimmer", "dimmer")):
+            if info.get(flag):
+                return name
+        return None
+
+    def _build_device(self, ip, dev_type):
+        """Constructs a device object without any network I/O."""
+        return DEVICE_CLASSES[dev_type](ip)
 
-    async def _add_known_device(self, ip, alias, info):
-        """Adds a device from settings without discovery scan."""
+    def _seed_state(self, ip, info, dev_type):
+        """Fills the state cache from settings until the device answers."""
+        self.device_states[ip] = {
+            "ip": ip,
+            "alias": info.get('alias') or ip,
+            "model": info.get('model'),
+            "type": dev_type,
+            "is_on": info.get('is_on', False),
+            "brightness": None,
+            "hsv": None,
+            "has_color": info.get('has_color', False),
+            "has_brightness": info.get('has_brightness', dev_type in ("bulb", "dimmer")),
+            "online": None,
+        }
+
+    async def _check_known_devices(self, untyped):
+        """Background connectivity check for saved devices (short timeouts, concurrent)."""
+        tasks = [self._ensure_ready(ip, dev) for ip, dev in list(self.devices.items())]
+        tasks += [self._ensure_ready(ip) for ip in self._configs if ip not in self.devices]
+        tasks += [self._add_known_device(ip) for ip in untyped]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        online = sum(1 for st in self.device_states.values() if st.get("online"))
+        self._log(f"[KasaAgent] Connectivity check done: {online}/{len(self.device_states)} devices online.")
+
+    async def wait_until_ready(self):
+        """Waits for the background connectivity check started by initialize()."""
+        if self._connect_task:
+            await asyncio.gather(self._connect_task, return_exceptions=True)
+
+    async def _ensure_ready(self, ip, dev=None):
+        """Connects a saved device on first use, storing the live object in self.devices. Returns True if reachable."""
+        if ip in self._ready:
+            return True
+        dev = await self._connect_known(ip, dev)
+        if dev is None:
+            self._apply_optimistic(ip, online=False)
+            return False
+        self.devices[ip] = dev
+        self._ready.add(ip)
+        self._snapshot(ip, dev)
+        self._log(f"[KasaAgent] Loaded known device: {dev.alias} ({ip})")
+        return True
+
+    async def _connect_known(self, ip, dev=None):
+        """Returns an updated device for a saved IP, or None if it can't be reached."""
+        config = self._configs.get(ip)
+        try:
+            if config is not None:
+                return await asyncio.wait_for(Device.connect(config=DeviceConfig.from_dict(config)), timeout=self.connect_timeout)
+            if dev is not None:
+                await asyncio.wait_for(dev.update(), timeout=self.connect_timeout)
+                return dev
+        except Exception as e:
+            self._log(f"[KasaAgent] Device {ip} did not answer with its saved settings: {e}")
+        # New firmware or protocols (KLAP/AES, "smart" devices) need discovery to pick the right transport
         try:
-            # We can't know the exact class (Bulb/Plug) without connecting, 
-            # but Discover.discover_single might work, or just SmartDevice(ip)
-            # SmartDevice is the base class.
-            dev = await Discover.discover_single(ip)
+            return await asyncio.wait_for(Discover.discover_single(ip), timeout=self.connect_timeout)
+        except Exception as e:
+            self._log(f"[KasaAgent] Device {ip} unreachable: {e}")
+            return None
+
+    async def _add_known_device(self, ip):
+        """Adds a saved device whose type is unknown via a single discovery probe."""
+        try:
+            dev = await asyncio.wait_for(Discover.discover_single(ip), timeout=self.connect_timeout)
             if dev:
-                await dev.update()
+                # discover_single returns an already-updated device
                 self.devices[ip] = dev
+                self._ready.add(ip)
+                self._snapshot(ip, dev)
                 self._log(f"[KasaAgent] Loaded known device: {dev.alias} ({ip})")
             else:
                  self._log(f"[KasaAgent] Could not connect to known device at {ip}")
@@ -62,58 +176,143 @@ class KasaAgent:
         # User said: "If a device that is in settings can not be found just list as not found."
         # This implies we might want to mark them offline.
         
-        for ip, dev in found_devices.items():
-            await dev.update()
-            self.devices[ip] = dev
-            
-        device_list = []
-        for ip, dev in self.devices.items():
-            # Determine type and capabilities
-            dev_type = "unknown"
-            if dev.is_bulb:
-                dev_type = "bulb"
-            elif dev.is_plug:
-                dev_type = "plug"
-            elif dev.is_strip:
-                dev_type = "strip"
-            elif dev.is_dimmer:
-                dev_type = "dimmer"
-
-            device_info = {
+        # Refresh all found devices concurrently rather than one round trip at a time
+        ips = list(found_devices.keys())
+        results = await asyncio.gather(*(found_devices[ip].update() for ip in ips), return_exceptions=True)
+        for ip, res in zip(ips, results):
+            if isinstance(res, Exception):
+                self._log(f"[KasaAgent] Failed to update {ip}: {res}")
+                continue
+            self.devices[ip] = found_devices[ip]
+            self._ready.add(ip)
+            self._snapshot(ip, found_devices[ip])
+
+        device_list = self.get_device_list()
+        self._log(f"Total Kasa devices (found + cached): {len(device_list)}")
+        return device_list
+
+    def _device_type(self, dev):
+        if dev.is_bulb:
+            return "bulb"
+        elif dev.is_plug:
+            return "plug"
+        elif dev.is_strip:
+            return "strip"
+        elif dev.is_dimmer:
+            return "dimmer"
+        return "unknown"
+
+    def _snapshot(self, ip, dev):
+        """Stores the current state of a device object in the state cache."""
+        try:
+            self.device_states[ip] = {
                 "ip": ip,
                 "alias": dev.alias,
                 "model": dev.model,
-                "type": dev_type,
+                "type": self._device_type(dev),
                 "is_on": dev.is_on,
                 "brightness": dev.brightness if dev.is_bulb or dev.is_dimmer else None,
                 "hsv": dev.hsv if dev.is_bulb and dev.is_color else None,
                 "has_color": dev.is_color if dev.is_bulb else False,
-                "has_brightness": dev.is_dimmable if dev.is_bulb or dev.is_dimmer else False
+                "has_brightness": dev.is_dimmable if dev.is_bulb or dev.is_dimmer else False,
+                "online": True
             }
-            device_list.append(device_info)
-            
-        self._log(f"Total Kasa devices (found + cached): {len(device_list)}")
-        return device_list
+        except Exception as e:
+            self._log(f"[KasaAgent] Could not snapshot state for {ip}: {e}")
+        return self.device_states.get(ip)
+
+    def _apply_optimistic(self, ip, **changes):
+        """Applies the expected result of a successful command to the cache."""
+        state = self.device_states.get(ip)
+        if state is not None:
+            state.update(changes)
+
+    def get_device_list(self):
+        """Returns the cached state of all devices (no network I/O)."""
+        return [dict(state) for state in self.device_states.values()]
+
+    def get_device_config(self, ip):
+        """Returns the connection config of a device that has answered, for persisting in settings, or None."""
+        if ip in self._ready:
+            try:
+                return self.devices[ip].config.to_dict()
+            except Exception as e:
+                self._log(f"[KasaAgent] Could not read connection config for {ip}: {e}")
+        return self._configs.get(ip)
+
+    async def refresh_all(self):
+        """Updates every known device concurrently and refreshes the cache."""
+        # Saved devices that haven't connected yet get another attempt
+        waiting = [ip for ip in self._configs if ip not in self.devices]
+        if not self.devices and not waiting:
+            return
+        ips = list(self.devices.keys())
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self.devices[ip].update(), timeout=self.connect_timeout) for ip in ips),
+            *(self._ensure_ready(ip) for ip in waiting),
+            return_exceptions=True
+        )
+        for ip, res in zip(ips, results):
+            if isinstance(res, Exception):
+                self._log(f"[KasaAgent] Refresh failed for {ip}: {res}")
+                self._apply_optimistic(ip, online=False)
+            else:
+                self._ready.add(ip)
+                self._snapshot(ip, self.devices[ip])
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._log(f"[KasaAgent] Refresh loop error: {e}")
+
+    def start_refresh_loop(self):
+        """Starts the single background refresher if it is not already running."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self._connect_task:
+            self._connect_task.cancel()
+            self._connect_task = None
 
     def get_device_by_alias(self, alias):
         """Finds a device by its alias (case-insensitive)."""
-        for ip, dev in self.devices.items():
-            if dev.alias.lower() == alias.lower():
-                return dev
-        return None
+        return self._resolve_target(alias)[1]
 
     def _resolve_device(self, target):
         """Resolves a target string (IP or Alias) to a device object."""
+        return self._resolve_target(target)[1]
+
+    def _known_ips(self):
+        """IPs of all devices, including saved ones still connecting (no device object yet)."""
+        return list(self.devices) + [ip for ip in self._configs if ip not in self.devices]
+
+    def _resolve_target(self, target):
+        """Resolves a target string (IP or Alias) to an (ip, device) pair."""
+        known = self._known_ips()
         # check if it is an IP 
-        if target in self.devices:
-            return self.devices[target]
+        if target in known:
+            return target, self.devices.get(target)
         
-        # Check alias
-        dev = self.get_device_by_alias(target)
-        if dev:
-            return dev
+        # Check alias. Devices that have not answered yet have no live alias,
+        # so fall back to the one cached from settings.
+        for ip in known:
+            if ip in self._ready:
+                alias = self.devices[ip].alias
+            else:
+                alias = self.device_states.get(ip, {}).get("alias")
+            if alias and alias.lower() == target.lower():
+                return ip, self.devices.get(ip)
             
-        return None
+        return None, None
 
     def name_to_hsv(self, color_name):
         """Converts common color names to HSV (Hue, Saturation, Value).
@@ -138,11 +337,13 @@ class KasaAgent:
 
     async def turn_on(self, target):
         """Turns on the device (Target: IP or Alias)."""
-        dev = self._resolve_device(target)
-        if dev:
+        ip, dev = self._resolve_target(target)
+        if ip is not None:
             try:
-                await dev.turn_on()
-                await dev.update()
+                if not await self._ensure_ready(ip, dev):
+                    return False
+                await self.devices[ip].turn_on()
+                self._apply_optimistic(ip, is_on=True)
                 return True
             except Exception as e:
                 print(f"Error turning on {target}: {e}")
@@ -153,9 +354,12 @@ class KasaAgent:
              try:
                 dev = await Discover.discover_single(target)
                 if dev:
+                    # discover_single returns an already-updated device
                     self.devices[target] = dev
+                    self._ready.add(target)
                     await dev.turn_on()
-                    await dev.update()
+                    self._snapshot(target, dev)
+                    self._apply_optimistic(target, is_on=True)
                     return True
              except Exception:
                  pass
@@ -163,11 +367,13 @@ class KasaAgent:
 
     async def turn_off(self, target):
         """Turns off the device (Target: IP or Alias)."""
-        dev = self._resolve_device(target)
-        if dev:
+        ip, dev = self._resolve_target(target)
+        if ip is not None:
             try:
-                await dev.turn_off()
-                await dev.update()
+                if not await self._ensure_ready(ip, dev):
+                    return False
+                await self.devices[ip].turn_off()
+                self._apply_optimistic(ip, is_on=False)
                 return True
             except Exception as e:
                 print(f"Error turning off {target}: {e}")
@@ -178,8 +384,10 @@ class KasaAgent:
                 dev = await Discover.discover_single(target)
                 if dev:
                     self.devices[target] = dev
+                    self._ready.add(target)
                     await dev.turn_off()
-                    await dev.update()
+                    self._snapshot(target, dev)
+                    self._apply_optimistic(target, is_on=False)
                     return True
              except Exception:
                  pass
@@ -187,11 +395,15 @@ class KasaAgent:
 
     async def set_brightness(self, target, brightness):
         """Sets brightness (0-100)."""
-        dev = self._resolve_device(target)
-        if dev and (dev.is_dimmable or dev.is_bulb):
+        ip, dev = self._resolve_target(target)
+        if ip is None or not await self._ensure_ready(ip, dev):
+            return False
+        dev = self.devices[ip]
+        if dev.is_dimmable or dev.is_bulb:
             try:
                 await dev.set_brightness(int(brightness))
-                await dev.update()
+                # Kasa bulbs switch on when brightness is set
+                self._apply_optimistic(ip, brightness=int(brightness), is_on=True)
                 return True
             except Exception as e:
                  print(f"Error setting brightness for {target}: {e}")
@@ -199,8 +411,11 @@ class KasaAgent:
 
     async def set_color(self, target, color_input):
         """Sets color by name or direct HSV tuple."""
-        dev = self._resolve_device(target)
-        if not dev or not dev.is_color:
+        ip, dev = self._resolve_target(target)
+        if ip is None or not await self._ensure_ready(ip, dev):
+            return False
+        dev = self.devices[ip]
+        if not dev.is_color:
             return False
 
         hsv = None
@@ -213,12 +428,129 @@ class KasaAgent:
             try:
                 # Kasa expects Hue (0-360), Sat (0-100), Val (0-100)
                 await dev.set_hsv(int(hsv[0]), int(hsv[1]), int(hsv[2]))
-                await dev.update()
+                self._apply_optimistic(ip, hsv=(int(hsv[0]), int(hsv[1]), int(hsv[2])), brightness=int(hsv[2]), is_on=True)
                 return True
             except Exception as e:
                  print(f"Error setting color for {target}: {e}")
         return False
 
+    async def control(self, target, action, brightness=None, color=None):
+        """Runs a single light command and returns a per-device result dict.
+           Action: 'turn_on', 'turn_off' or 'set' (brightness/color only).
+        """
+        result_msg = f"Action '{action}' on '{target}' failed."
+        success = False
+
+        if action == "turn_on":
+            success = await self.turn_on(target)
+            if success:
+                result_msg = f"Turned ON '{target}'."
+        elif action == "turn_off":
+            success = await self.turn_off(target)
+            if success:
+                result_msg = f"Turned OFF '{target}'."
+        elif action == "set":
+            success = True
+            result_msg = f"Updated '{target}':"
+
+        # Apply extra attributes if 'set' or if we just turned it on and want to set them too
+        if success:
+            if brightness is not None:
+                if await self.set_brightness(target, brightness):
+                    result_msg += f" Set brightness to {brightness}."
+            if color is not None:
+                if await self.set_color(target, color):
+                    result_msg += f" Set color to {color}."
+
+        return {"target": target, "success": success, "message": result_msg}
+
+    # --- Groups / Scenes ---
+
+    def list_groups(self):
+        """Returns all saved groups."""
+        return {name: list(targets) for name, targets in self.groups.items()}
+
+    def _find_group(self, name):
+        for group_name, targets in self.groups.items():
+            if group_name.lower() == name.lower():
+                return group_name, targets
+        return None, None
+
+    def save_group(self, name, targets):
+        """Creates or replaces a named group of devices (IPs or aliases)."""
+        name = (name or "").strip()
+        if not name:
+            return False, "Group name is required."
+        if name.lower() == "all":
+            return False, "'all' is reserved for every known device."
+        targets = [t for t in (targets or []) if t]
+        if not targets:
+            return False, "A group needs at least one device."
+
+        existing, _ = self._find_group(name)
+        if existing:
+            del self.groups[existing]
+        self.groups[name] = targets
+        self._groups_changed()
+        return True, f"Saved group '{name}' with {len(targets)} devices."
+
+    def delete_group(self, name):
+        existing, _ = self._find_group(name)
+        if not existing:
+            return False, f"No group named '{name}'."
+        del self.groups[existing]
+        self._groups_changed()
+        return True, f"Deleted group '{existing}'."
+
+    def _groups_changed(self):
+        if self.on_groups_changed:
+            try:
+                self.on_groups_changed(self.list_groups())
+            except Exception as e:
+                print(f"[KasaAgent] Failed to persist groups: {e}")
+
+    def resolve_group(self, name):
+        """Expands a group name into its member targets. 'all' means every known device."""
+        if name.lower() == "all":
+            return self._known_ips()
+        _, targets = self._find_group(name)
+        return list(targets) if targets else None
+
+    async def control_group(self, action, group=None, targets=None, brightness=None, color=None):
+        """Fans a command out to many devices concurrently (bounded by max_concurrency).
+           Returns one response with a result per device.
+        """
+        members = []
+        if group:
+            resolved = self.resolve_group(group)
+            if resolved is None:
+                return {"group": group, "results": [], "succeeded": 0, "failed": 0,
+                        "message": f"No group named '{group}'."}
+            members.extend(resolved)
+        if targets:
+            members.extend(targets)
+        # De-duplicate while keeping order
+        members = list(dict.fromkeys(members))
+
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        async def run_one(target):
+            async with semaphore:
+                try:
+                    return await self.control(target, action, brightness, color)
+                except Exception as e:
+                    return {"target": target, "success": False, "message": f"Error: {e}"}
+
+        results = await asyncio.gather(*(run_one(t) for t in members))
+        succeeded = sum(1 for r in results if r["success"])
+        return {
+            "group": group,
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "message": f"{action} on {len(results)} devices: {succeeded} succeeded, {len(results) - succeeded} failed."
+        }
+
 # Standalone test
 if __name__ == "__main__":
     async def main():
@@ -0,0 +1,235 @@
+import os
+import json
+import asyncio
+from pathlib import Path
+
+import numpy as np
+
+MEMORY_DIR = Path(".cache") / "memory"
+CHUNK_CHARS = 800
+CHUNK_OVERLAP = 100
+# Bigger files (logs, data dumps) would cost hundreds of embedding calls per sync
+MAX_FILE_BYTES = 256 * 1024
+# Project files that are bookkeeping rather than memory
+EXCLUDED_FILES = {"config.json", "jules_sessions.json"}
+EXCLUDED_DIRS = {"chat_history", ".cache"}
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP):
+    """Splits text into overlapping windows, preferring to break on newlines."""
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            newline = text.rfind("\n", start + size // 2, end)
+            if newline != -1:
+                end = newline
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def chunk_chat(entries, size: int = CHUNK_CHARS):
+    """Groups consecutive chat entries into chunks of roughly `size` characters."""
+    chunks = []
+    lines, length, first_ts = [], 0, None
+    for entry in entries:
+        line = f"{entry.get('sender', 'Unknown')}: {entry.get('text', '')}".strip()
+        if lines and length + len(line) > size:
+            chunks.append(("\n".join(lines), first_ts))
+            lines, length, first_ts = [], 0, None
+        if first_ts is None:
+            first_ts = entry.get("timestamp")
+        lines.append(line)
+        length += len(line) + 1
+    if lines:
+        chunks.append(("\n".join(lines), first_ts))
+    return chunks
+
+
+class MemoryIndex:
+    """
+    Flat cosine-similarity index over a project's chat history and text
+    files, stored in `<project>/.cache/memory/` as `vectors.npy` (normalised
+    float32, one row per chunk), `chunks.jsonl` (metadata, same order) and
+    `state.json` (what has been indexed so far).
+
+    `sync()` embeds only what is new: chat entries after the last indexed
+    timestamp, and project files whose mtime/size changed (their old chunks
+    are replaced). Files over `max_file_bytes` are not embedded. Embedding calls are batched through `embed_fn`, an async
+    callable taking a list of strings and returning a list of vectors.
+
+    `recall()` only queries what is already indexed; callers keep the index
+    current with `sync_if_changed()` from a background task, so a recall
+    never waits on embedding the project.
+    """
+
+    def __init__(self, project_manager, project_path, embed_fn, batch_size: int = 100,
+                 max_file_bytes: int = MAX_FILE_BYTES):
+        self.project_manager = project_manager
+        self.project_path = Path(project_path)
+        self.root = self.project_path / MEMORY_DIR
+        self.embed_fn = embed_fn
+        self.batch_size = batch_size
+        self.max_file_bytes = max_file_bytes
+        self.vectors = None # (N, D) float32, rows normalised
+        self.chunks = [] # [{"source", "text", "timestamp"}]
+        self.state = {"chat_until": 0.0, "files": {}}
+        self._lock = asyncio.Lock()
+        self._synced_version = None # Watcher catalog version at the last sync
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        try:
+            with open(self.root / "state.json", "r", encoding="utf-8") as f:
+                state = json.load(f)
+            with open(self.root / "chunks.jsonl", "r", encoding="utf-8") as f:
+                chunks = [json.loads(line) for line in f if line.strip()]
+            vectors = np.load(self.root / "vectors.npy") if chunks else None
+            if vectors is not None and len(vectors) != len(chunks):
+                raise ValueError("vectors and chunks are out of sync")
+            self.state, self.chunks, self.vectors = state, chunks, vectors
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[MemoryIndex] [ERR] Failed to load memory index, rebuilding: {e}")
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.vectors is not None:
+            # np.save appends .npy to names that lack it, so keep the suffix on the temp file
+            tmp_vectors = self.root / "vectors.tmp.npy"
+            np.save(tmp_vectors, self.vectors)
+            os.replace(tmp_vectors, self.root / "vectors.npy")
+        tmp_chunks = self.root / "chunks.jsonl.tmp"
+        with open(tmp_chunks, "w", encoding="utf-8") as f:
+            for chunk in self.chunks:
+                f.write(json.dumps(chunk) + "\n")
+        os.replace(tmp_chunks, self.root / "chunks.jsonl")
+        tmp_state = self.root / "state.json.tmp"
+        with open(tmp_state, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_state, self.root / "state.json")
+
+    # --- Indexing ---
+
+    async def _embed(self, texts):
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = await self.embed_fn(texts[i:i + self.batch_size])
+            vectors.extend(batch)
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def _remove_source(self, source):
+        keep = [i for i, chunk in enumerate(self.chunks) if chunk["source"] != source]
+        if len(keep) == len(self.chunks):
+            return
+        self.chunks = [self.chunks[i] for i in keep]
+        self.vectors = self.vectors[keep] if keep else None
+
+    def _append(self, chunks, vectors):
+        self.chunks.extend(chunks)
+        self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+
+    def _pending_file_chunks(self):
+        """Returns (sources to drop, new chunks) for project files that changed."""
+        catalog = {}
+        for info in self.project_manager.get_file_catalog():
+            rel = info["path"]
+            if info["type"] != "text" or rel in EXCLUDED_FILES or rel.split("/")[0] in EXCLUDED_DIRS:
+                continue
+            catalog[rel] = info
+
+        indexed = self.state["files"]
+        drop, chunks = [], []
+        for rel in set(indexed) - set(catalog):
+            drop.append(f"file:{rel}")
+        for rel, info in catalog.items():
+            key = [info["mtime_ns"], info["size"]]
+            if indexed.get(rel) == key:
+                continue
+            drop.append(f"file:{rel}")
+            if info["size"] > self.max_file_bytes:
+                continue
+            try:
+                with open(self.project_path / rel, "r", encoding="utf-8", errors="ignore") as f:
+                    text = f.read()
+            except Exception as e:
+                print(f"[MemoryIndex] [ERR] Failed to read {rel}: {e}")
+                continue
+            for piece in chunk_text(text):
+                chunks.append({"source": f"file:{rel}", "text": piece, "timestamp": info["mtime"]})
+        return drop, chunks, {rel: [info["mtime_ns"], info["size"]] for rel, info in catalog.items()}
+
+    def _pending_chat_chunks(self):
+        since = self.state["chat_until"]
+        entries = [e for e in self.project_manager.get_chat_history(start=since) if e.get("timestamp", 0) > since]
+        if not entries:
+            return [], since
+        chunks = [{"source": "chat", "text": text, "timestamp": ts} for text, ts in chunk_chat(entries)]
+        return chunks, max(e.get("timestamp", 0) for e in entries)
+
+    async def sync(self):
+        """Embeds new chat history and changed project files. Returns the number of chunks added."""
+        async with self._lock:
+            drop, file_chunks, file_state = await asyncio.to_thread(self._pending_file_chunks)
+            chat_chunks, chat_until = await asyncio.to_thread(self._pending_chat_chunks)
+            new_chunks = file_chunks + chat_chunks
+            if not drop and not new_chunks:
+                return 0
+
+            vectors = await self._embed([c["text"] for c in new_chunks]) if new_chunks else None
+            for source in drop:
+                self._remove_source(source)
+            if new_chunks:
+                self._append(new_chunks, vectors)
+            self.state["files"] = file_state
+            self.state["chat_until"] = chat_until
+            await asyncio.to_thread(self._save)
+            return len(new_chunks)
+
+    async def sync_if_changed(self):
+        """Syncs only if the project catalog or chat history moved since the last sync. Returns chunks added."""
+        version = self.project_manager.get_watcher().version
+        latest = await asyncio.to_thread(self.project_manager.get_recent_chat_history, 1)
+        chat_ts = latest[-1].get("timestamp", 0) if latest else 0
+        if version == self._synced_version and chat_ts <= self.state["chat_until"]:
+            return 0
+        added = await self.sync()
+        self._synced_version = version
+        return added
+
+    async def add_text(self, text: str, source: str):
+        """Chunks, embeds and stores arbitrary text, replacing anything previously stored under `source`."""
+        chunks = [{"source": source, "text": piece, "timestamp": None} for piece in chunk_text(text)]
+        if not chunks:
+            return 0
+        async with self._lock:
+            vectors = await self._embed([c["text"] for c in chunks])
+            self._remove_source(source)
+            self._append(chunks, vectors)
+            await asyncio.to_thread(self._save)
+        return len(chunks)
+
+    # --- Retrieval ---
+
+    async def recall(self, query: str, k: int = 5):
+        """Returns the k chunks most similar to the query as {"source", "text", "timestamp", "score"}."""
+        k = max(0, min(k, len(self.chunks)))
+        if self.vectors is None or k == 0:
+            return []
+        query_vector = (await self._embed([query]))[0]
+        scores = self.vectors @ query_vector
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.chunks[i], score=round(float(scores[i]), 4)) for i in top]
@@ -40,14 +40,15 @@ class ProactiveAgent:
 
     async def _get_contextual_suggestion(self):
         """Analyzes the project context and returns a suggestion."""
-        project_path = self.project_manager.get_current_project_path()
-        files = list(project_path.glob("**/*"))
+        # The watcher keeps the file catalog current, so this doesn't touch the disk, but it
+        # can wait on the watcher's first scan of a big project; keep that off the event loop
+        files = await asyncio.to_thread(self.project_manager.get_file_catalog)
 
         if not files:
             return "This project is empty. Would you like to create a new file?"
 
         # Get the last modified time of all files
-        last_modified_time = max(os.path.getmtime(f) for f in files)
+        last_modified_time = max(f["mtime"] for f in files)
         time_since_last_modification = time.time() - last_modified_time
 
         if time_since_last_modification > 3600:  # 1 hour
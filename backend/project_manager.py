@@ -1,20 +1,40 @@
 import os
+import copy
 import json
 import shutil
 import time
+import tempfile
+import threading
 from pathlib import Path
 try:
     from backend.writing_prompts import WRITING_MODE_SYSTEM_PROMPT
+    from backend.chat_history import ChatLogWriter, ChatHistoryStore
+    from backend.search_index import SearchIndex, rank_results
+    from backend.project_watcher import ProjectWatcher
+    from backend.context_builder import ContextBuilder
 except ImportError:
     from writing_prompts import WRITING_MODE_SYSTEM_PROMPT
+    from chat_history import ChatLogWriter, ChatHistoryStore
+    from search_index import SearchIndex, rank_results
+    from project_watcher import ProjectWatcher
+    from context_builder import ContextBuilder
 
 DEFAULT_SYSTEM_PROMPT = "Your name is James and you speak with a british accent at all times.. You have a witty and professional personality, like a cheeky butler. Sarcasm is welcome. Your creator is Chad, and you address him as 'Sir'. When answering, respond using complete and concise sentences to keep a quick pacing and keep the conversation flowing. You are a professional assistant."
 
 class ProjectManager:
-    def __init__(self, workspace_root: str):
+    def __init__(self, workspace_root: str, chat_fsync_policy: str = "none"):
         self.workspace_root = Path(workspace_root)
         self.projects_dir = self.workspace_root / "projects"
         self.current_project = "temp"
+        self.chat_writer = ChatLogWriter(fsync_policy=chat_fsync_policy)
+        self._chat_stores = {} # project path -> ChatHistoryStore
+        self._chat_store_lock = threading.Lock()
+        self._config_cache = {} # config path -> ((mtime_ns, size), config)
+        self._search_indexes = {} # project path -> SearchIndex
+        self._context_builders = {} # project path -> ContextBuilder
+        self._watcher = None # Watches the current project only
+        self._watcher_lock = threading.Lock() # get_watcher is called from worker threads and the event loop
+        self._config_lock = threading.Lock() # Serialises config read-modify-write across threads
         
         # Ensure projects root exists
         if not self.projects_dir.exists():
@@ -36,6 +56,9 @@ class ProjectManager:
             
         # Ensure temp project receives fresh creation
         self.create_project("temp")
+        # Start cataloguing now so the first tool call doesn't pay for the scan
+        self.get_watcher()
+        self.get_chat_store()
 
     def create_project(self, name: str):
         """Creates a new project directory with subfolders."""
@@ -64,27 +87,49 @@ class ProjectManager:
             json.dump(DEFAULT_CONFIG, f, indent=4)
 
     def get_project_config(self):
-        """Reads and returns the config for the current project."""
+        """Returns the config for the current project, re-reading config.json only when it changes on disk."""
         config_path = self.get_current_project_path() / "config.json"
-        if not config_path.exists():
-            return {}
         try:
-            with open(config_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+            stat = config_path.stat()
+        except FileNotFoundError:
+            self._config_cache.pop(str(config_path), None)
             return {}
 
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._config_cache.get(str(config_path))
+        if cached is None or cached[0] != key:
+            try:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            except json.JSONDecodeError:
+                return {}
+            cached = (key, config)
+            self._config_cache[str(config_path)] = cached
+        # Callers may modify the result, so never hand out the cached dict itself
+        return copy.deepcopy(cached[1])
+
     def update_project_config(self, new_config: dict):
         """Updates and saves the config for the current project."""
         config_path = self.get_current_project_path() / "config.json"
-        current_config = self.get_project_config()
-        current_config.update(new_config)
-        try:
-            with open(config_path, "w", encoding="utf-8") as f:
-                json.dump(current_config, f, indent=4)
-            return True, "Configuration updated successfully."
-        except Exception as e:
-            return False, f"Failed to update configuration: {e}"
+        tmp_path = None
+        with self._config_lock:
+            current_config = self.get_project_config()
+            current_config.update(new_config)
+            try:
+                # Write to a temp file of our own and rename, so readers never see a partial file
+                # and concurrent writers can't interleave into the same temp file
+                with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=config_path.parent,
+                                                 prefix=config_path.name + ".", suffix=".tmp", delete=False) as f:
+                    tmp_path = f.name
+                    json.dump(current_config, f, indent=4)
+                os.replace(tmp_path, config_path)
+                stat = config_path.stat()
+                self._config_cache[str(config_path)] = ((stat.st_mtime_ns, stat.st_size), copy.deepcopy(current_config))
+                return True, "Configuration updated successfully."
+            except Exception as e:
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return False, f"Failed to update configuration: {e}"
 
     def switch_project(self, name: str):
         """Switches the active project context."""
@@ -93,6 +138,9 @@ class ProjectManager:
         
         if project_path.exists():
             self.current_project = safe_name
+            # The new watcher scans on its own thread
+            self.get_watcher()
+            self.get_chat_store()
             print(f"[ProjectManager] Switched to project: {safe_name}")
             return True, f"Switched to project '{safe_name}'."
         return False, f"Project '{safe_name}' does not exist."
@@ -104,16 +152,58 @@ class ProjectManager:
     def get_current_project_path(self):
         return self.projects_dir / self.current_project
 
+    def get_chat_store(self):
+        """Returns the segmented chat history store for the current project, migrating legacy history in the background."""
+        project_path = str(self.get_current_project_path())
+        with self._chat_store_lock:
+            store = self._chat_stores.get(project_path)
+            if store is None:
+                store = ChatHistoryStore(project_path)
+                self._chat_stores[project_path] = store
+                if store.has_legacy():
+                    threading.Thread(target=store.migrate_legacy, name="ChatHistoryMigration", daemon=True).start()
+                # Loaded ahead of the first search, off the caller's thread
+                threading.Thread(target=store.load_search_index, name="ChatHistoryIndex", daemon=True).start()
+        return store
+
     def log_chat(self, sender: str, text: str):
-        """Appends a chat message to the current project's history."""
-        log_file = self.get_current_project_path() / "chat_history.jsonl"
+        """Queues a chat message for the current project's history. Written in the background."""
         entry = {
             "timestamp": time.time(),
             "sender": sender,
             "text": text
         }
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry) + "\n")
+        self.chat_writer.append(self.get_chat_store(), entry)
+
+    def flush_chat_log(self, wait: bool = False):
+        """Pushes buffered chat messages to disk. Only blocks when wait=True."""
+        return self.chat_writer.flush(wait=wait)
+
+    def close(self):
+        """Flushes pending chat history and stops background threads."""
+        self.chat_writer.close()
+        self._stop_watcher()
+
+    def get_watcher(self):
+        """Returns the file watcher for the current project, starting it if the project changed."""
+        project_path = str(self.get_current_project_path())
+        with self._watcher_lock:
+            if self._watcher is None or str(self._watcher.project_path) != project_path:
+                if self._watcher is not None:
+                    self._watcher.stop()
+                self._watcher = ProjectWatcher(project_path)
+                self._watcher.start()
+            return self._watcher
+
+    def _stop_watcher(self):
+        with self._watcher_lock:
+            if self._watcher is not None:
+                self._watcher.stop()
+                self._watcher = None
+
+    def get_file_catalog(self):
+        """Returns {"path", "size", "mtime", "mtime_ns", "type"} for every file in the current project."""
+        return self.get_watcher().files()
 
     def save_cad_artifact(self, source_path: str, prompt: str):
         """Copies a generated CAD file to the project's 'cad' folder."""
@@ -131,84 +221,58 @@ class ProjectManager:
         
         try:
             shutil.copy2(source_path, dest_path)
+            self.notify_file_changed(dest_path)
             print(f"[ProjectManager] Saved CAD artifact to: {dest_path}")
             return str(dest_path)
         except Exception as e:
             print(f"[ProjectManager] [ERR] Failed to save artifact: {e}")
             return None
 
+    def get_context_builder(self):
+        """Returns the context builder for the current project."""
+        project_path = str(self.get_current_project_path())
+        builder = self._context_builders.get(project_path)
+        if builder is None:
+            builder = ContextBuilder(project_path, self.get_watcher())
+            self._context_builders[project_path] = builder
+        builder.watcher = self.get_watcher()
+        return builder
+
     def get_project_context(self, max_file_size: int = 10000) -> str:
         """
         Gathers context about the current project for the AI.
-        Lists all files and reads text file contents (up to max_file_size bytes).
+        Lists all files and includes snippets of the most recently changed text
+        files, within the builder's overall byte budget.
         """
         project_path = self.get_current_project_path()
         if not project_path.exists():
             return f"Project '{self.current_project}' does not exist."
+        builder = self.get_context_builder()
+        builder.max_file_size = max_file_size
+        return builder.build(self.current_project)
 
-        context_lines = [f"=== Project Context: '{self.current_project}' ==="]
-        context_lines.append(f"Project directory: {project_path}")
-        context_lines.append("")
-
-        # List all files recursively
-        all_files = []
-        for root, dirs, files in os.walk(project_path):
-            for f in files:
-                rel_path = os.path.relpath(os.path.join(root, f), project_path)
-                all_files.append(rel_path)
-
-        if not all_files:
-            context_lines.append("(No files in project yet)")
-        else:
-            context_lines.append(f"Files ({len(all_files)} total):")
-            for f in all_files:
-                context_lines.append(f"  - {f}")
-
-        context_lines.append("")
-
-        # Read text files (skip binary and large files)
-        text_extensions = {'.txt', '.py', '.js', '.jsx', '.ts', '.tsx', '.json', '.md', '.html', '.css', '.jsonl'}
-        for rel_path in all_files:
-            ext = os.path.splitext(rel_path)[1].lower()
-            if ext not in text_extensions:
-                continue
-
-            full_path = project_path / rel_path
-            try:
-                file_size = full_path.stat().st_size
-                if file_size > max_file_size:
-                    context_lines.append(f"--- {rel_path} (too large: {file_size} bytes, skipped) ---")
-                    continue
-
-                with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                context_lines.append(f"--- {rel_path} ---")
-                context_lines.append(content)
-                context_lines.append("")
-            except Exception as e:
-                context_lines.append(f"--- {rel_path} (error reading: {e}) ---")
-
-        return "\n".join(context_lines)
+    def get_project_context_delta(self) -> str:
+        """Returns only the context that changed since it was last built, or "" if nothing did."""
+        if not self.get_current_project_path().exists():
+            return ""
+        return self.get_context_builder().build_delta(self.current_project)
 
     def get_recent_chat_history(self, limit: int = 10):
         """Returns the last 'limit' chat messages from history."""
-        log_file = self.get_current_project_path() / "chat_history.jsonl"
-        if not log_file.exists():
+        store = self.get_chat_store()
+        try:
+            # Messages still in the write buffer are merged in rather than waiting for the disk
+            return store.read_tail(limit, pending=lambda: self.chat_writer.pending_entries(store))
+        except Exception as e:
+            print(f"[ProjectManager] [ERR] Failed to read chat history: {e}")
             return []
-            
+
+    def get_chat_history(self, start: float = None, end: float = None, sender: str = None, limit: int = None):
+        """Returns chat messages between the 'start' and 'end' timestamps, optionally from one sender."""
+        store = self.get_chat_store()
         try:
-            with open(log_file, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-                
-            # Parse last N lines
-            history = []
-            for line in lines[-limit:]:
-                try:
-                    entry = json.loads(line)
-                    history.append(entry)
-                except json.JSONDecodeError:
-                    continue
-            return history
+            return store.query(start=start, end=end, sender=sender, limit=limit,
+                               pending=lambda: self.chat_writer.pending_entries(store))
         except Exception as e:
             print(f"[ProjectManager] [ERR] Failed to read chat history: {e}")
             return []
@@ -274,28 +338,30 @@ class ProjectManager:
         config = self.get_project_config()
         return config.get("system_prompt", DEFAULT_SYSTEM_PROMPT)
 
+    def get_search_index(self):
+        """Returns the full-text index for the current project."""
+        project_path = str(self.get_current_project_path())
+        watcher = self.get_watcher()
+        index = self._search_indexes.get(project_path)
+        if index is None:
+            index = SearchIndex(project_path, watcher=watcher)
+            self._search_indexes[project_path] = index
+        index.watcher = watcher
+        return index
+
+    def notify_file_changed(self, path):
+        """Tells the file catalog and search index a project file was written."""
+        self.get_watcher().notify_changed(path)
+        self.get_search_index().notify_changed(path)
+
     def search_files(self, query: str):
-        """Searches for a query in all text files within the current project."""
-        project_path = self.get_current_project_path()
-        results = []
-        text_extensions = {'.txt', '.py', '.js', '.jsx', '.ts', '.tsx', '.json', '.md', '.html', '.css', '.jsonl'}
-
-        for root, _, files in os.walk(project_path):
-            for file in files:
-                if os.path.splitext(file)[1].lower() in text_extensions:
-                    file_path = Path(root) / file
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            for line_num, line in enumerate(f, 1):
-                                if query.lower() in line.lower():
-                                    results.append({
-                                        "file": str(file_path.relative_to(project_path)),
-                                        "line": line_num,
-                                        "content": line.strip()
-                                    })
-                    except Exception as e:
-                        print(f"[ProjectManager] [ERR] Failed to read file {file_path}: {e}")
-        return results
+        """Searches for a query in all text files within the current project, including all chat history."""
+        try:
+            results = self.get_search_index().search(query) + self.get_chat_store().search(query)
+            return rank_results(results, query.lower())
+        except Exception as e:
+            print(f"[ProjectManager] [ERR] Search failed: {e}")
+            return []
 
     def enable_writing_mode(self):
         """Enables Writing Mode for the current project."""
@@ -0,0 +1,221 @@
+import os
+import threading
+from pathlib import Path
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+TEXT_EXTENSIONS = {'.txt', '.py', '.js', '.jsx', '.ts', '.tsx', '.json', '.md', '.html', '.css', '.jsonl'}
+IGNORED_DIRS = {".cache"}
+
+
+def _file_info(rel, stat):
+    return {
+        "path": rel,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "mtime_ns": stat.st_mtime_ns,
+        "type": "text" if os.path.splitext(rel)[1].lower() in TEXT_EXTENSIONS else "binary",
+    }
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        paths = [event.src_path]
+        if getattr(event, "dest_path", None):
+            paths.append(event.dest_path)
+        for path in paths:
+            self.watcher._refresh_path(path)
+
+
+class ProjectWatcher:
+    """
+    Keeps a live in-memory catalog of the files in one project directory:
+    {rel path: {"path", "size", "mtime", "mtime_ns", "type"}}.
+
+    Uses watchdog (inotify on Linux) when it is installed, otherwise rescans
+    the tree with stat-only walks every `poll_interval` seconds from a
+    background thread. Consumers read the catalog instead of walking the disk.
+
+    `start()` returns immediately; the first full scan runs on the watcher's
+    own thread, and queries wait (up to `ready_timeout`) until it is done, so
+    call them off the event loop. `notify_changed()` never waits: paths
+    reported during the first scan are queued and applied once it finishes.
+    """
+
+    def __init__(self, project_path, poll_interval: float = 2.0, use_watchdog: bool = True,
+                 ready_timeout: float = 10.0):
+        self.project_path = Path(project_path)
+        self.poll_interval = poll_interval
+        self.use_watchdog = use_watchdog and Observer is not None
+        self.ready_timeout = ready_timeout
+        self.version = 0 # Bumped on every catalog change
+        self._catalog = {}
+        self._lock = threading.RLock()
+        self._observer = None
+        self._poll_thread = None
+        self._stop_event = threading.Event()
+        self._ready = threading.Event() # Set once the first scan has finished
+        self._pending_paths = [] # notify_changed() calls that arrived during the first scan
+        self._started = False
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self._stop_event.clear()
+        with self._lock:
+            self._ready.clear()
+            self._pending_paths = []
+        # The initial walk can be slow on big projects, so it never runs on the caller's thread
+        self._poll_thread = threading.Thread(target=self._run, name="ProjectWatcher", daemon=True)
+        self._poll_thread.start()
+
+    def _run(self):
+        try:
+            self.rescan()
+        except Exception as e:
+            print(f"[ProjectWatcher] [ERR] Initial scan failed: {e}")
+        finally:
+            with self._lock:
+                # The scan may have walked past files written meanwhile; apply those writes on top
+                pending, self._pending_paths = self._pending_paths, []
+                for path in pending:
+                    self._refresh_path(path)
+                self._ready.set()
+        if self._stop_event.is_set():
+            return
+        if self.use_watchdog:
+            try:
+                observer = Observer()
+                observer.schedule(_EventHandler(self), str(self.project_path), recursive=True)
+                observer.daemon = True
+                observer.start()
+                self._observer = observer
+                if self._stop_event.is_set():
+                    # stop() ran while the observer was starting
+                    observer.stop()
+                    self._observer = None
+                return
+            except Exception as e:
+                print(f"[ProjectWatcher] [ERR] Failed to start file watcher, polling instead: {e}")
+                self._observer = None
+        self._poll_loop()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+            except Exception:
+                pass
+            self._observer = None
+        self._poll_thread = None
+        self._started = False
+
+    def wait_ready(self, timeout: float = None):
+        """Blocks until the first scan has finished. Returns False on timeout."""
+        if not self._started:
+            # Nothing is scanning; callers use rescan()/notify_changed() directly
+            return self._ready.is_set()
+        return self._ready.wait(self.ready_timeout if timeout is None else timeout)
+
+    def _poll_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.rescan()
+            except Exception as e:
+                print(f"[ProjectWatcher] [ERR] Rescan failed: {e}")
+
+    # --- Catalog maintenance ---
+
+    def _rel(self, path):
+        try:
+            rel = Path(path).resolve().relative_to(self.project_path.resolve()).as_posix()
+        except ValueError:
+            return None
+        if rel == "." or rel.split("/")[0] in IGNORED_DIRS:
+            return None
+        return rel
+
+    def rescan(self):
+        """Walks the project once, updating the catalog from stat() only."""
+        found = {}
+        for root, dirs, files in os.walk(self.project_path):
+            if Path(root) == self.project_path:
+                dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+            for name in files:
+                full_path = Path(root) / name
+                try:
+                    stat = full_path.stat()
+                except FileNotFoundError:
+                    continue
+                rel = full_path.relative_to(self.project_path).as_posix()
+                found[rel] = _file_info(rel, stat)
+        with self._lock:
+            if found != self._catalog:
+                self._catalog = found
+                self.version += 1
+
+    def _refresh_path(self, path):
+        """Re-stats one path reported by the watcher. Directories are rescanned as a subtree."""
+        rel = self._rel(path)
+        if rel is None:
+            return
+        full_path = self.project_path / rel
+        with self._lock:
+            if full_path.is_dir():
+                for root, _, files in os.walk(full_path):
+                    for name in files:
+                        self._refresh_path(Path(root) / name)
+                return
+            try:
+                info = _file_info(rel, full_path.stat())
+            except FileNotFoundError:
+                # Deleted file, or a deleted directory taking its children with it
+                prefix = rel + "/"
+                removed = [p for p in self._catalog if p == rel or p.startswith(prefix)]
+                for p in removed:
+                    del self._catalog[p]
+                if removed:
+                    self.version += 1
+                return
+            if self._catalog.get(rel) != info:
+                self._catalog[rel] = info
+                self.version += 1
+
+    def notify_changed(self, path):
+        """Applies a known write immediately instead of waiting for the next event or poll. Never blocks on the first scan."""
+        with self._lock:
+            if self._started and not self._ready.is_set():
+                self._pending_paths.append(path)
+                return
+            self._refresh_path(path)
+
+    # --- Queries ---
+
+    def snapshot(self):
+        """Returns a copy of the catalog, keyed by path relative to the project."""
+        self.wait_ready()
+        with self._lock:
+            return dict(self._catalog)
+
+    def files(self, type: str = None):
+        """Returns catalog entries, optionally only "text" or "binary" files."""
+        self.wait_ready()
+        with self._lock:
+            return [info for info in self._catalog.values() if type is None or info["type"] == type]
+
+    def latest_mtime(self):
+        self.wait_ready()
+        with self._lock:
+            return max((info["mtime"] for info in self._catalog.values()), default=None)
@@ -0,0 +1,200 @@
+import math
+import time
+import shutil
+import platform
+import subprocess
+
+import cv2
+import mss
+import numpy as np
+
+
+def active_window_region():
+    """Returns the foreground window as an mss region dict, or None if it can't be determined."""
+    system = platform.system()
+    try:
+        if system == "Windows":
+            import ctypes
+            from ctypes import wintypes
+            user32 = ctypes.windll.user32
+            hwnd = user32.GetForegroundWindow()
+            rect = wintypes.RECT()
+            if not hwnd or not user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+                return None
+            return {"left": rect.left, "top": rect.top, "width": rect.right - rect.left, "height": rect.bottom - rect.top}
+
+        if system == "Darwin":
+            # pyobjc is optional; without it we fall back to the whole monitor
+            import Quartz
+            windows = Quartz.CGWindowListCopyWindowInfo(
+                Quartz.kCGWindowListOptionOnScreenOnly | Quartz.kCGWindowListExcludeDesktopElements,
+                Quartz.kCGNullWindowID,
+            )
+            for window in windows:
+                # The list is front to back; layer 0 is normal application windows
+                if window.get("kCGWindowLayer") == 0:
+                    bounds = window["kCGWindowBounds"]
+                    return {"left": int(bounds["X"]), "top": int(bounds["Y"]), "width": int(bounds["Width"]), "height": int(bounds["Height"])}
+            return None
+
+        if shutil.which("xdotool"):
+            output = subprocess.run(
+                ["xdotool", "getactivewindow", "getwindowgeometry", "--shell"],
+                capture_output=True, text=True, timeout=1,
+            ).stdout
+            values = dict(line.split("=", 1) for line in output.splitlines() if "=" in line)
+            return {"left": int(values["X"]), "top": int(values["Y"]), "width": int(values["WIDTH"]), "height": int(values["HEIGHT"])}
+    except Exception as e:
+        print(f"[ScreenCapture] [WARN] Could not find the active window: {e}")
+    return None
+
+
+class ScreenCapture:
+    """
+    Screen frames for the Live session, sent only when the screen changes.
+
+    Each grab is viewed in place from the mss buffer and block-averaged with
+    NumPy into a reusable frame of at most `max_size` pixels on the long
+    side. The frame is split into `tile_size` tiles and compared with the last
+    frame that was sent; it is encoded and returned only if at least
+    `min_changed_tiles` tiles moved by more than `tile_threshold` (mean
+    absolute difference, 0-255). A blinking cursor or clock doesn't count.
+
+    The grab interval adapts: it drops to `min_interval` when something
+    changes and backs off by `backoff` up to `max_interval` while the screen
+    is idle, so an idle desktop costs one cheap grab every few seconds and no
+    bandwidth.
+
+    `region` is "monitor" (the primary monitor), "active_window" (the
+    foreground window, falling back to the monitor) or an mss region dict.
+    mss handles are tied to the thread that created them, so call `capture()`
+    from a single thread.
+    """
+
+    def __init__(self, region="monitor", max_size: int = 1024, tile_size: int = 32, tile_threshold: float = 12.0,
+                 min_changed_tiles: int = 2, min_interval: float = 0.5, max_interval: float = 5.0,
+                 backoff: float = 1.5, jpeg_quality: int = 70):
+        self.region = region
+        self.max_size = max_size
+        self.tile_size = tile_size
+        self.tile_threshold = tile_threshold
+        self.min_changed_tiles = min_changed_tiles
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self._encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+
+        self._sct = None
+        # Reused between grabs; reallocated only when the captured size changes
+        self._accum = None
+        self._frame = None
+        self._sent = None
+        self._diff = None
+
+        self.stats = {
+            "grabs": 0,
+            "sent": 0,
+            "unchanged": 0,
+            "last_changed_tiles": 0,
+            "last_bytes": 0,
+            "last_grab_ms": None,
+        }
+
+    def _monitor(self):
+        """Resolves the capture region, clamped to the visible screen."""
+        screen = self._sct.monitors[0]
+        primary = self._sct.monitors[1] if len(self._sct.monitors) > 1 else screen
+        if self.region == "active_window":
+            region = active_window_region() or primary
+        elif isinstance(self.region, dict):
+            region = self.region
+        else:
+            region = primary
+
+        left = max(region["left"], screen["left"])
+        top = max(region["top"], screen["top"])
+        right = min(region["left"] + region["width"], screen["left"] + screen["width"])
+        bottom = min(region["top"] + region["height"], screen["top"] + screen["height"])
+        if right - left < 16 or bottom - top < 16:
+            # Minimised or off-screen window
+            return primary
+        return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+    def grab(self):
+        """Grabs the capture region. Returns an (h, w, 4) BGRA view of the mss buffer."""
+        if self._sct is None:
+            self._sct = mss.mss()
+        shot = self._sct.grab(self._monitor())
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+    def _downsample(self, bgra):
+        """Block-averages the grab into the reusable BGR frame."""
+        height, width = bgra.shape[:2]
+        factor = max(1, math.ceil(max(height, width) / self.max_size))
+        out_h, out_w = height // factor, width // factor
+        if self._frame is None or self._frame.shape[:2] != (out_h, out_w):
+            self._accum = np.empty((out_h, out_w, 3), dtype=np.float32)
+            self._frame = np.empty((out_h, out_w, 3), dtype=np.uint8)
+            self._diff = np.empty((out_h, out_w, 3), dtype=np.uint8)
+            self._sent = None
+
+        bgr = bgra[:out_h * factor, :out_w * factor, :3]
+        if factor == 1:
+            np.copyto(self._frame, bgr)
+        else:
+            # Reshaping the slice is still a view, so the only copy is the mean itself
+            blocks = bgr.reshape(out_h, factor, out_w, factor, 3)
+            blocks.mean(axis=(1, 3), dtype=np.float32, out=self._accum)
+            np.copyto(self._frame, self._accum, casting="unsafe")
+        return self._frame
+
+    def changed_tiles(self, frame):
+        """Counts tiles that differ meaningfully from the last frame sent."""
+        if self._sent is None:
+            return -1
+        cv2.absdiff(frame, self._sent, dst=self._diff)
+        height, width = frame.shape[:2]
+        tiles = (math.ceil(width / self.tile_size), math.ceil(height / self.tile_size))
+        # Area interpolation averages each tile
+        tile_means = cv2.resize(self._diff, tiles, interpolation=cv2.INTER_AREA)
+        return int(np.count_nonzero(tile_means.max(axis=-1) > self.tile_threshold))
+
+    def process(self, bgra):
+        """Returns JPEG bytes if the frame changed enough to send, otherwise None."""
+        frame = self._downsample(bgra)
+        changed = self.changed_tiles(frame)
+        self.stats["last_changed_tiles"] = changed
+        if 0 <= changed < self.min_changed_tiles:
+            self.stats["unchanged"] += 1
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+            return None
+
+        self.interval = self.min_interval
+        ok, encoded = cv2.imencode(".jpg", frame, self._encode_params)
+        if not ok:
+            return None
+        if self._sent is None:
+            self._sent = np.empty_like(frame)
+        np.copyto(self._sent, frame)
+        data = encoded.tobytes()
+        self.stats["sent"] += 1
+        self.stats["last_bytes"] = len(data)
+        return data
+
+    def capture(self):
+        """Grabs the screen and returns JPEG bytes if it changed, otherwise None."""
+        started = time.perf_counter()
+        bgra = self.grab()
+        self.stats["grabs"] += 1
+        data = self.process(bgra)
+        self.stats["last_grab_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return data
+
+    def close(self):
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
+
+    def metrics(self):
+        return dict(self.stats, interval=round(self.interval, 2))
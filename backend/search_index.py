@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import threading
+import time
+from pathlib import Path
+try:
+    from backend.project_watcher import TEXT_EXTENSIONS
+except ImportError:
+    from project_watcher import TEXT_EXTENSIONS
+
+INDEX_DIR = ".cache"
+INDEX_FILE = "search_index.json"
+INDEX_VERSION = 2
+# Chat history is searched through ChatHistoryStore, which can read sealed segments
+CHAT_HISTORY_PATHS = {"chat_history", "chat_history.jsonl"}
+# Substrings up to this length are indexed per vocabulary term for partial-word matches
+GRAM_SIZE = 3
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _grams(term: str, size: int):
+    return {term[i:i + size] for i in range(len(term) - size + 1)}
+
+
+class TermIndex:
+    """
+    In-memory inverted index: token -> {doc -> [line numbers]}, plus the
+    per-doc vocabulary and an n-gram index over all tokens, so partial words
+    are found without scanning the vocabulary. Not thread-safe; owners guard
+    it with their own lock.
+    """
+
+    def __init__(self, postings=None):
+        self.postings = {} # token -> {doc -> [line numbers]}
+        self._doc_tokens = {} # doc -> set of tokens
+        self._grams = {} # substring of length 1..GRAM_SIZE -> set of tokens containing it
+        for token, doc_postings in (postings or {}).items():
+            self.postings[token] = doc_postings
+            self._add_grams(token)
+            for doc in doc_postings:
+                self._doc_tokens.setdefault(doc, set()).add(token)
+
+    def _add_grams(self, token):
+        for size in range(1, GRAM_SIZE + 1):
+            for gram in _grams(token, size):
+                self._grams.setdefault(gram, set()).add(token)
+
+    def _remove_grams(self, token):
+        for size in range(1, GRAM_SIZE + 1):
+            for gram in _grams(token, size):
+                terms = self._grams.get(gram)
+                if terms is not None:
+                    terms.discard(token)
+                    if not terms:
+                        del self._grams[gram]
+
+    def add_line(self, doc, line_num: int, text: str):
+        tokens = self._doc_tokens.setdefault(doc, set())
+        for token in set(tokenize(text)):
+            if token not in self.postings:
+                self.postings[token] = {}
+                self._add_grams(token)
+            self.postings[token].setdefault(doc, []).append(line_num)
+            tokens.add(token)
+
+    def add_postings(self, doc, postings):
+        """Merges a doc's {token: [line numbers]}, e.g. loaded from disk."""
+        tokens = self._doc_tokens.setdefault(doc, set())
+        for token, line_nums in postings.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                self._add_grams(token)
+            self.postings[token].setdefault(doc, []).extend(line_nums)
+            tokens.add(token)
+
+    def doc_postings(self, doc):
+        """Returns {token: [line numbers]} for one doc."""
+        return {token: self.postings[token][doc] for token in self._doc_tokens.get(doc, ())}
+
+    def remove(self, doc):
+        for token in self._doc_tokens.pop(doc, ()):
+            doc_postings = self.postings.get(token)
+            if doc_postings is not None:
+                doc_postings.pop(doc, None)
+                if not doc_postings:
+                    del self.postings[token]
+                    self._remove_grams(token)
+
+    def terms(self, token):
+        """Returns the indexed tokens containing `token`: the exact posting plus longer words via the n-gram index."""
+        terms = {token} if token in self.postings else set()
+        if len(token) <= GRAM_SIZE:
+            terms |= self._grams.get(token, set())
+            return terms
+        grams = sorted(_grams(token, GRAM_SIZE), key=lambda gram: len(self._grams.get(gram, ())))
+        candidates = set(self._grams.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            candidates &= self._grams.get(gram, set())
+        # Shared n-grams don't guarantee a contiguous match
+        terms |= {term for term in candidates if token in term}
+        return terms
+
+    def candidates(self, tokens):
+        """Returns {doc: set(line numbers)} containing every query token, or None if the query has no tokens."""
+        if not tokens:
+            return None
+        result = None
+        for token in set(tokens):
+            # Partial words still match, as they did with the plain substring search
+            hits = {}
+            for term in self.terms(token):
+                for doc, line_nums in self.postings[term].items():
+                    hits.setdefault(doc, set()).update(line_nums)
+            if result is None:
+                result = hits
+            else:
+                result = {
+                    doc: result[doc] & hits[doc]
+                    for doc in result.keys() & hits.keys()
+                    if result[doc] & hits[doc]
+                }
+            if not result:
+                return {}
+        return result
+
+
+def rank_results(results, needle: str):
+    """Orders {"file", "line", "content"} hits with the most hits per file first; files named like the query get a boost."""
+    by_file = {}
+    for hit in results:
+        by_file.setdefault(hit["file"], []).append(hit)
+    ranked = sorted(
+        by_file.items(),
+        key=lambda item: (-len(item[1]) - (5 if needle in item[0].lower() else 0), item[0]),
+    )
+    return [hit for _, hits in ranked for hit in hits]
+
+
+class SearchIndex:
+    """
+    Persistent inverted index (token -> file -> line numbers) over a project's
+    text files, stored in `<project>/.cache/search_index.json`.
+
+    Files are re-indexed only when their mtime/size changes. With a
+    ProjectWatcher, changes are found from its in-memory catalog on every
+    search. Without one, the tree is rescanned at most every
+    `rescan_interval` seconds; files reported through `notify_changed` are
+    re-indexed on the next search regardless.
+    Results keep the substring semantics of the old linear search: postings
+    narrow the candidates and the matched lines are read back from the file
+    and checked for the full query. Query tokens are looked up exactly, and
+    longer words containing them are found through an in-memory n-gram index
+    over the vocabulary (see TermIndex), so no query scans the whole
+    vocabulary. Only postings and file metadata are persisted, never the
+    file text.
+    """
+
+    def __init__(self, project_path, rescan_interval: float = 30.0, max_file_bytes: int = 2 * 1024 * 1024, watcher=None):
+        self.project_path = Path(project_path)
+        self.watcher = watcher
+        self._watcher_version = None
+        self.index_path = self.project_path / INDEX_DIR / INDEX_FILE
+        self.rescan_interval = rescan_interval
+        self.max_file_bytes = max_file_bytes
+        self.files = {} # rel path -> {"mtime_ns", "size", "line_count"}
+        self.term_index = TermIndex()
+        self._dirty_paths = set()
+        self._last_scan = 0.0
+        self._changed = False
+        self._lock = threading.RLock()
+        self._load()
+
+    # --- Persistence ---
+
+    @property
+    def postings(self):
+        """token -> {rel path -> [line numbers]}"""
+        return self.term_index.postings
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                return
+            self.files = data.get("files", {})
+            self.term_index = TermIndex(data.get("postings", {}))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[SearchIndex] [ERR] Failed to load index, rebuilding: {e}")
+            self.files, self.term_index = {}, TermIndex()
+
+    def save(self):
+        with self._lock:
+            if not self._changed:
+                return
+            try:
+                self.index_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.index_path.with_name(INDEX_FILE + ".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"version": INDEX_VERSION, "files": self.files, "postings": self.postings}, f)
+                os.replace(tmp_path, self.index_path)
+                self._changed = False
+            except Exception as e:
+                print(f"[SearchIndex] [ERR] Failed to save index: {e}")
+
+    # --- Indexing ---
+
+    def _rel(self, path):
+        try:
+            return Path(path).resolve().relative_to(self.project_path.resolve()).as_posix()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _indexable(rel):
+        if rel is None or rel.split("/")[0] == INDEX_DIR or rel.split("/")[0] in CHAT_HISTORY_PATHS:
+            return False
+        return os.path.splitext(rel)[1].lower() in TEXT_EXTENSIONS
+
+    def _remove(self, rel):
+        entry = self.files.pop(rel, None)
+        if entry is None:
+            return
+        self.term_index.remove(rel)
+        self._changed = True
+
+    def _index_file(self, rel, mtime_ns=None, size=None):
+        full_path = self.project_path / rel
+        if mtime_ns is None:
+            try:
+                stat = full_path.stat()
+            except FileNotFoundError:
+                self._remove(rel)
+                return
+            mtime_ns, size = stat.st_mtime_ns, stat.st_size
+
+        entry = self.files.get(rel)
+        if entry is not None and entry["mtime_ns"] == mtime_ns and entry["size"] == size:
+            return
+
+        self._remove(rel)
+        if size > self.max_file_bytes:
+            return
+        try:
+            with open(full_path, "r", encoding="utf-8", errors="ignore") as f:
+                lines = [line.strip() for line in f]
+        except Exception as e:
+            print(f"[SearchIndex] [ERR] Failed to read file {full_path}: {e}")
+            return
+
+        self.files[rel] = {"mtime_ns": mtime_ns, "size": size, "line_count": len(lines)}
+        for line_num, line in enumerate(lines, 1):
+            self.term_index.add_line(rel, line_num, line)
+        self._changed = True
+
+    def notify_changed(self, path):
+        """Marks a file as written so the next search re-indexes it without a full rescan."""
+        rel = self._rel(path)
+        if self._indexable(rel):
+            with self._lock:
+                self._dirty_paths.add(rel)
+
+    def refresh(self, force: bool = False):
+        """Brings the index up to date. Walks the tree only when the rescan interval has passed."""
+        with self._lock:
+            if self.watcher is not None:
+                self._sync_from_watcher()
+            elif force or time.monotonic() - self._last_scan >= self.rescan_interval:
+                seen = set()
+                for root, dirs, files in os.walk(self.project_path):
+                    if Path(root) == self.project_path and INDEX_DIR in dirs:
+                        dirs.remove(INDEX_DIR)
+                    for name in files:
+                        full_path = Path(root) / name
+                        rel = full_path.relative_to(self.project_path).as_posix()
+                        if not self._indexable(rel):
+                            continue
+                        seen.add(rel)
+                        try:
+                            stat = full_path.stat()
+                        except FileNotFoundError:
+                            continue
+                        self._index_file(rel, stat.st_mtime_ns, stat.st_size)
+                for rel in set(self.files) - seen:
+                    self._remove(rel)
+                self._dirty_paths.clear()
+                self._last_scan = time.monotonic()
+            else:
+                for rel in self._dirty_paths:
+                    self._index_file(rel)
+                self._dirty_paths.clear()
+            self.save()
+
+    def _sync_from_watcher(self):
+        """Diffs the index against the watcher's catalog; no disk walk."""
+        if self.watcher.version != self._watcher_version:
+            self._watcher_version = self.watcher.version
+            catalog = {info["path"]: info for info in self.watcher.files("text")}
+            for rel, info in catalog.items():
+                self._index_file(rel, info["mtime_ns"], info["size"])
+            for rel in set(self.files) - set(catalog):
+                self._remove(rel)
+        # Files written by us may not have reached the catalog yet
+        for rel in self._dirty_paths:
+            self._index_file(rel)
+        self._dirty_paths.clear()
+
+    # --- Querying ---
+
+    def _read_lines(self, rel):
+        try:
+            with open(self.project_path / rel, "r", encoding="utf-8", errors="ignore") as f:
+                return [line.strip() for line in f]
+        except OSError as e:
+            print(f"[SearchIndex] [ERR] Failed to read file {rel}: {e}")
+            return []
+
+    def search(self, query: str, limit: int = None):
+        """Returns matching lines as {"file", "line", "content"}, files with the most hits first."""
+        self.refresh()
+        needle = query.lower()
+        with self._lock:
+            candidates = self.term_index.candidates(tokenize(query))
+            if candidates is None:
+                candidates = {rel: None for rel in self.files}
+
+        results = []
+        for rel, line_nums in candidates.items():
+            # Only files with candidate lines are read, and the full query is checked on the current text
+            lines = self._read_lines(rel)
+            numbers = range(1, len(lines) + 1) if line_nums is None else sorted(n for n in line_nums if n <= len(lines))
+            for line_num in numbers:
+                content = lines[line_num - 1]
+                if needle in content.lower():
+                    results.append({"file": rel, "line": line_num, "content": content})
+
+        results = rank_results(results, needle)
+        return results[:limit] if limit is not None else results
@@ -0,0 +1,130 @@
+import time
+import asyncio
+from collections import deque
+
+
+class SendPipeline:
+    """
+    Uplink to the Live session with separate audio and image lanes.
+
+    Producers never block: `put_audio` and `put_image` return immediately,
+    so a stalled uplink can't back up into the capture loop. Audio has
+    priority. When several audio payloads are waiting they are coalesced
+    into one send of up to `coalesce_max_bytes`. The audio lane holds at most
+    `max_audio_bytes` and drops the oldest audio beyond that. The image lane
+    keeps only the newest `max_images` frames, because a stale frame is worth
+    less than a fresh one. An image is still sent after
+    `max_audio_before_image` consecutive audio sends, so frames aren't
+    starved during long utterances.
+
+    `send_fn` is an async callable taking one payload dict. A failed send is
+    counted and dropped rather than stopping the pipeline, since the session
+    may be swapped underneath it during a reconnect.
+    """
+
+    def __init__(self, send_fn, max_audio_bytes: int = 160000, coalesce_max_bytes: int = 32000,
+                 max_images: int = 1, max_audio_before_image: int = 8):
+        self.send_fn = send_fn
+        self.max_audio_bytes = max_audio_bytes
+        self.coalesce_max_bytes = coalesce_max_bytes
+        self.max_images = max_images
+        self.max_audio_before_image = max_audio_before_image
+
+        self._audio = deque()
+        self._audio_bytes = 0
+        self._images = deque()
+        self._event = asyncio.Event()
+        self._audio_streak = 0
+
+        self.stats = {
+            "audio_sent": 0,
+            "audio_coalesced": 0,
+            "audio_dropped": 0,
+            "images_sent": 0,
+            "images_dropped": 0,
+            "send_errors": 0,
+            "last_send_ms": None,
+        }
+
+    # --- Producers ---
+
+    def put_audio(self, payload):
+        self._audio.append(payload)
+        self._audio_bytes += len(payload["data"])
+        while self._audio_bytes > self.max_audio_bytes and len(self._audio) > 1:
+            dropped = self._audio.popleft()
+            self._audio_bytes -= len(dropped["data"])
+            self.stats["audio_dropped"] += 1
+        self._event.set()
+
+    def put_image(self, payload):
+        self._images.append(payload)
+        while len(self._images) > self.max_images:
+            self._images.popleft()
+            self.stats["images_dropped"] += 1
+        self._event.set()
+
+    # --- Consumer ---
+
+    def _next_audio(self):
+        """Pops the next audio payload, merged with any queued payloads of the same type that fit."""
+        first = self._audio.popleft()
+        self._audio_bytes -= len(first["data"])
+        if not self._audio:
+            return first
+        parts = [first["data"]]
+        size = len(first["data"])
+        while self._audio:
+            candidate = self._audio[0]
+            if candidate["mime_type"] != first["mime_type"] or size + len(candidate["data"]) > self.coalesce_max_bytes:
+                break
+            self._audio.popleft()
+            self._audio_bytes -= len(candidate["data"])
+            parts.append(candidate["data"])
+            size += len(candidate["data"])
+        if len(parts) == 1:
+            return first
+        self.stats["audio_coalesced"] += len(parts) - 1
+        return dict(first, data=b"".join(parts))
+
+    def _next(self):
+        """Returns (lane, payload) for the next send, or (None, None) when both lanes are empty."""
+        image_due = self._images and (not self._audio or self._audio_streak >= self.max_audio_before_image)
+        if image_due:
+            self._audio_streak = 0
+            return "images", self._images.popleft()
+        if self._audio:
+            self._audio_streak += 1
+            return "audio", self._next_audio()
+        return None, None
+
+    async def run(self):
+        while True:
+            lane, payload = self._next()
+            if payload is None:
+                self._event.clear()
+                await self._event.wait()
+                continue
+            started = time.monotonic()
+            try:
+                await self.send_fn(payload)
+            except Exception as e:
+                self.stats["send_errors"] += 1
+                print(f"[SendPipeline] [ERR] Send failed, dropping {lane} payload: {e}")
+                await asyncio.sleep(0.05)
+                continue
+            self.stats["last_send_ms"] = round((time.monotonic() - started) * 1000, 1)
+            self.stats["audio_sent" if lane == "audio" else "images_sent"] += 1
+
+    def clear(self):
+        self._audio.clear()
+        self._audio_bytes = 0
+        self._images.clear()
+
+    def metrics(self):
+        return dict(
+            self.stats,
+            audio_depth=len(self._audio),
+            audio_depth_bytes=self._audio_bytes,
+            image_depth=len(self._images),
+        )
@@ -51,6 +51,15 @@ def signal_handler(sig, frame):
             audio_loop.stop() 
         except:
             pass
+    # Write out any buffered chat history before exiting
+    try:
+        project_manager.close()
+    except:
+        pass
+    try:
+        ada.audio_device_manager.close()
+    except:
+        pass
     # Force kill
     print("[SERVER] Force exiting...")
     os._exit(0)
@@ -75,7 +84,7 @@ async def handle_slack_message(message):
         print(f"[SERVER] Forwarding Slack message to audio loop: {message}")
         # This function mimics the behavior of the user_input socket event
         if audio_loop.project_manager:
-            audio_loop.project_manager.log_chat("User", message)
+            audio_loop.log_chat("User", message)
 
         # Set the source of the message to 'slack'
         audio_loop.message_source = 'slack'
@@ -102,7 +111,8 @@ DEFAULT_SETTINGS = {
         "list_projects": True
     },
     "printers": [], # List of {host, port, name, type}
-    "kasa_devices": [], # List of {ip, alias, model}
+    "kasa_devices": [], # List of {ip, alias, model, type, has_color, has_brightness, config}
+    "kasa_groups": {}, # {group_name: [ip or alias, ...]}
     "camera_flipped": False # Invert cursor horizontal direction
 }
 
@@ -146,8 +156,16 @@ def save_settings():
 # Load on startup
 load_settings()
 
+def save_kasa_groups(groups):
+    SETTINGS["kasa_groups"] = groups
+    save_settings()
+
 authenticator = None
-kasa_agent = KasaAgent(known_devices=SETTINGS.get("kasa_devices"))
+kasa_agent = KasaAgent(
+    known_devices=SETTINGS.get("kasa_devices"),
+    known_groups=SETTINGS.get("kasa_groups"),
+    on_groups_changed=save_kasa_groups
+)
 # tool_permissions is now SETTINGS["tool_permissions"]
 
 @app.on_event("startup")
@@ -166,6 +184,7 @@ async def startup_event():
 
     print("[SERVER] Startup: Initializing Kasa Agent...")
     await kasa_agent.initialize()
+    kasa_agent.start_refresh_loop()
 
     print("[SERVER] Startup: Initializing Slack Agent...")
     slack_agent = SlackAgent(on_message=handle_slack_message)
@@ -185,6 +204,9 @@ async def status():
 async def connect(sid, environ):
     print(f"Client connected: {sid}")
     await sio.emit('status', {'msg': 'Connected to A.D.A Backend'}, room=sid)
+    if audio_loop and audio_loop.timer_agent:
+        # Timers are only broadcast on change, so give new clients the current list
+        await sio.emit('timers_update', audio_loop.timer_agent.get_timers_payload(), room=sid)
 
     global authenticator
     
@@ -328,6 +350,10 @@ async def start_audio(sid, data=None):
         else:
             asyncio.create_task(sio.emit('display_content', data))
 
+    # Callback to report how long a reconnect left the assistant unavailable
+    def on_reconnect_metrics(metrics):
+        asyncio.create_task(sio.emit('reconnect_metrics', metrics))
+
     # Initialize ADA
     try:
         print(f"Initializing AudioLoop with device_index={device_index}")
@@ -351,7 +377,8 @@ async def start_audio(sid, data=None):
             kasa_agent=kasa_agent,
             project_manager=project_manager,
             slack_agent=slack_agent,
-            scraper_agent=scraper_agent
+            scraper_agent=scraper_agent,
+            on_reconnect_metrics=on_reconnect_metrics
         )
         print("AudioLoop initialized successfully.")
 
@@ -448,6 +475,22 @@ async def stop_audio(sid):
         audio_loop = None
         await sio.emit('status', {'msg': 'A.D.A Stopped'})
 
+@sio.event
+async def set_audio_device(sid, data):
+    # data: { "device_index": int|null, "device_name": str|null }
+    device_index = data.get('device_index')
+    device_name = data.get('device_name')
+    print(f"Switching input device: Name='{device_name}', Index={device_index}")
+    if audio_loop:
+        opened = await audio_loop.set_input_device(device_name, device_index)
+    else:
+        # Open it now so the next start_audio finds it ready
+        opened = await asyncio.to_thread(ada.audio_device_manager.set_input_device, device_name, device_index)
+    if opened:
+        await sio.emit('status', {'msg': 'Microphone Switched'})
+    else:
+        await sio.emit('error', {'msg': f"Failed to open microphone '{device_name or device_index}'"})
+
 @sio.event
 async def pause_audio(sid):
     global audio_loop
@@ -503,6 +546,11 @@ async def shutdown(sid, data=None):
         print("[SERVER] Stopping Authenticator...")
         authenticator.stop()
 
+    # Write out any buffered chat history
+    print("[SERVER] Flushing chat history...")
+    project_manager.close()
+    ada.audio_device_manager.close()
+
     print("[SERVER] Graceful shutdown complete. Terminating process...")
 
     # Force exit immediately - os._exit bypasses cleanup but ensures termination
@@ -583,17 +631,17 @@ async def user_input(sid, data):
         
         # Log User Input to Project History
         if audio_loop and audio_loop.project_manager:
-            audio_loop.project_manager.log_chat("User", text)
+            audio_loop.log_chat("User", text)
             
         # Use the same 'send' method that worked for audio, as 'send_realtime_input' and 'send_client_content' seem unstable in this env
         # INJECT VIDEO FRAME IF AVAILABLE (VAD-style logic for Text Input)
-        if audio_loop and audio_loop._latest_image_payload:
-            print(f"[SERVER DEBUG] Piggybacking video frame with text input.")
-            try:
-                # Send frame first
-                await audio_loop.session.send(input=audio_loop._latest_image_payload, end_of_turn=False)
-            except Exception as e:
-                print(f"[SERVER DEBUG] Failed to send piggyback frame: {e}")
+        # Only a frame the model hasn't seen yet is sent
+        try:
+            # Send frame first
+            if await audio_loop.send_latest_frame():
+                print(f"[SERVER DEBUG] Piggybacking video frame with text input.")
+        except Exception as e:
+            print(f"[SERVER DEBUG] Failed to send piggyback frame: {e}")
                 
         await audio_loop.session.send(input=text, end_of_turn=True)
         print(f"[SERVER DEBUG] Message sent to model successfully.")
@@ -609,9 +657,8 @@ async def video_frame(sid, data):
     # data should contain 'image' which is binary (blob) or base64 encoded
     image_data = data.get('image')
     if image_data and audio_loop:
-        # We don't await this because we don't want to block the socket handler
-        # But send_frame is async, so we create a task
-        asyncio.create_task(audio_loop.send_frame(image_data))
+        # Only fills the latest-frame slot, so it's cheap enough to await inline and keeps frames in order
+        await audio_loop.send_frame(image_data)
 
 @sio.event
 async def save_memory(sid, data):
@@ -640,11 +687,19 @@ async def save_memory(sid, data):
             filename = memory_dir / f"memory_{timestamp}.txt"
 
         # Write to file
+        lines = []
+        for msg in messages:
+            sender = msg.get('sender', 'Unknown')
+            text = msg.get('text', '')
+            lines.append(f"{sender}: {text}")
+        memory_text = "\n".join(lines) + "\n"
         with open(filename, 'w', encoding='utf-8') as f:
-            for msg in messages:
-                sender = msg.get('sender', 'Unknown')
-                text = msg.get('text', '')
+            f.write(memory_text)
         print(f"Conversation saved to {filename}")
+
+        # Make the saved conversation searchable through the recall tool
+        if audio_loop:
+            await audio_loop.get_memory_index().add_text(memory_text, source=f"memory:{filename.name}")
         await sio.emit('status', {'msg': 'Memory Saved Successfully'})
 
     except Exception as e:
@@ -670,12 +725,15 @@ async def upload_memory(sid, data):
              await sio.emit('error', {'msg': "System not ready (No active session)"})
              return
 
-        # Send to model
-        print("Sending memory context to model...")
-        context_msg = f"System Notification: The user has uploaded a long-term memory file. Please load the following context into your understanding. The format is a text log of previous conversations:\n\n{memory_text}"
-        
+        # Index the memory instead of pasting all of it into the session;
+        # the model pulls in the relevant parts with the recall tool.
+        print("Indexing uploaded memory...")
+        source = f"memory:{data.get('filename') or 'upload'}"
+        chunk_count = await audio_loop.get_memory_index().add_text(memory_text, source=source)
+
+        context_msg = f"System Notification: The user has uploaded a long-term memory file of previous conversations ({chunk_count} passages). Use the recall tool to look up anything relevant from it."
         await audio_loop.session.send(input=context_msg, end_of_turn=True)
-        print("Memory context sent successfully.")
+        print("Memory indexed successfully.")
         await sio.emit('status', {'msg': 'Memory Loaded into Context'})
 
     except Exception as e:
@@ -694,10 +752,16 @@ async def discover_kasa(sid):
         # devices is a list of full device info dicts. minimizing for storage.
         saved_devices = []
         for d in devices:
+            # The connection config lets KasaAgent reconnect on next startup without discovery,
+            # whatever protocol the device speaks; type/capabilities seed the cached state
             saved_devices.append({
                 "ip": d["ip"],
                 "alias": d["alias"],
-                "model": d["model"]
+                "model": d["model"],
+                "type": d["type"],
+                "has_color": d["has_color"],
+                "has_brightness": d["has_brightness"],
+                "config": kasa_agent.get_device_config(d["ip"]),
             })
         
         # Merge with existing to preserve any manual overrides? 
@@ -1053,10 +1117,59 @@ async def control_kasa(sid, data):
          print(f"Error controlling kasa: {e}")
          await sio.emit('error', {'msg': f"Kasa Control Error: {str(e)}"})
 
+@sio.event
+async def get_kasa_groups(sid):
+    await sio.emit('kasa_groups', kasa_agent.list_groups())
+
+@sio.event
+async def save_kasa_group(sid, data):
+    # data: { name, targets: [ip, ...] }
+    success, msg = kasa_agent.save_group(data.get('name'), data.get('targets', []))
+    if success:
+        await sio.emit('kasa_groups', kasa_agent.list_groups())
+        await sio.emit('status', {'msg': msg})
+    else:
+        await sio.emit('error', {'msg': msg})
+
+@sio.event
+async def delete_kasa_group(sid, data):
+    success, msg = kasa_agent.delete_group(data.get('name', ''))
+    if success:
+        await sio.emit('kasa_groups', kasa_agent.list_groups())
+        await sio.emit('status', {'msg': msg})
+    else:
+        await sio.emit('error', {'msg': msg})
+
+@sio.event
+async def control_kasa_group(sid, data):
+    # data: { group | targets, action: "turn_on"|"turn_off"|"set", brightness?, color? }
+    print(f"Kasa Group Control: {data.get('group') or data.get('targets')} -> {data.get('action')}")
+    try:
+        result = await kasa_agent.control_group(
+            data.get('action'),
+            group=data.get('group'),
+            targets=data.get('targets'),
+            brightness=data.get('brightness'),
+            color=data.get('color')
+        )
+        await sio.emit('kasa_group_result', result)
+        await sio.emit('kasa_devices', kasa_agent.get_device_list())
+        if result["failed"]:
+            await sio.emit('error', {'msg': result["message"]})
+    except Exception as e:
+        print(f"Error controlling kasa group: {e}")
+        await sio.emit('error', {'msg': f"Kasa Group Control Error: {str(e)}"})
+
 @sio.event
 async def get_settings(sid):
     await sio.emit('settings', SETTINGS)
 
+@sio.event
+async def get_audio_metrics(sid):
+    # Playback buffer depth, underruns per minute and device over/underruns
+    if audio_loop:
+        await sio.emit('audio_metrics', audio_loop.get_audio_metrics(), room=sid)
+
 @sio.event
 async def update_settings(sid, data):
     # Generic update
@@ -1092,7 +1205,7 @@ async def delete_timer(sid, data):
     if name and audio_loop and audio_loop.timer_agent:
         print(f"Received delete_timer request for: {name}")
         result = audio_loop.timer_agent.delete_entry(name)
-        # The broadcast loop in TimerAgent will handle updating clients,
+        # TimerAgent broadcasts the change to clients itself,
         # but we can send a confirmation or the result back.
         await sio.emit('status', {'msg': result})
     else:
@@ -0,0 +1,129 @@
+import asyncio
+from collections import deque
+
+
+def _compress_turn(sender: str, text: str, max_chars: int = 160):
+    """Fallback compression: keep the first sentence, capped at max_chars."""
+    text = " ".join(text.split())
+    for end in (". ", "? ", "! "):
+        cut = text.find(end)
+        if 0 < cut < max_chars:
+            text = text[:cut + 1]
+            break
+    if len(text) > max_chars:
+        text = text[:max_chars - 3].rstrip() + "..."
+    return f"{sender}: {text}"
+
+
+class SessionContext:
+    """
+    Conversation state carried across Live sessions.
+
+    Keeps the most recent turns verbatim (bounded by `max_recent_turns` and
+    `max_recent_chars`) and folds older turns into a rolling summary of at
+    most `max_summary_chars`. Folding uses `summarize_fn` (an async
+    callable taking the previous summary and the turns to fold, returning
+    the new summary) when provided, and a cheap extractive compression
+    otherwise or if it fails. `build_rehydration()` renders both into one
+    bounded message for a freshly connected session.
+
+    The context belongs to one project; callers keep one per project so a
+    project switch doesn't carry the previous conversation along.
+    """
+
+    def __init__(self, summarize_fn=None, max_recent_turns: int = 12,
+                 max_recent_chars: int = 4000, max_summary_chars: int = 2000):
+        self.summarize_fn = summarize_fn
+        self.max_recent_turns = max_recent_turns
+        self.max_recent_chars = max_recent_chars
+        self.max_summary_chars = max_summary_chars
+        self.summary = ""
+        self.recent = deque() # (sender, text)
+        self._recent_chars = 0
+        self._to_fold = []
+        self._fold_task = None
+
+    def add_turn(self, sender: str, text: str):
+        text = text.strip()
+        if not sender or not text:
+            return
+        self.recent.append((sender, text))
+        self._recent_chars += len(text)
+        while self.recent and (len(self.recent) > self.max_recent_turns or self._recent_chars > self.max_recent_chars):
+            old_sender, old_text = self.recent.popleft()
+            self._recent_chars -= len(old_text)
+            self._to_fold.append((old_sender, old_text))
+        if self._to_fold:
+            self._schedule_fold()
+
+    def seed(self, entries):
+        """Starts from persisted chat history (e.g. after an app restart) when nothing is in memory yet."""
+        if self.recent or self.summary:
+            return
+        for entry in entries:
+            self.add_turn(entry.get("sender", "Unknown"), entry.get("text", ""))
+
+    def _schedule_fold(self):
+        if self.summarize_fn is None:
+            self._fold_extractive()
+            return
+        if self._fold_task is not None and not self._fold_task.done():
+            return # The running fold picks up the new turns when it finishes
+        try:
+            self._fold_task = asyncio.get_running_loop().create_task(self._fold_with_model())
+        except RuntimeError:
+            # No running loop
+            self._fold_extractive()
+
+    def _fold_extractive(self):
+        folded = [_compress_turn(sender, text) for sender, text in self._to_fold]
+        self._to_fold = []
+        self.summary = self._trim_summary("\n".join(filter(None, [self.summary] + folded)))
+
+    async def _fold_with_model(self):
+        while self._to_fold:
+            batch, self._to_fold = self._to_fold, []
+            try:
+                summary = await self.summarize_fn(self.summary, batch)
+                self.summary = self._trim_summary(summary.strip())
+            except Exception as e:
+                print(f"[SessionContext] [ERR] Summarization failed, compressing instead: {e}")
+                self._to_fold = batch + self._to_fold
+                self._fold_extractive()
+
+    def _trim_summary(self, summary: str):
+        """Drops the oldest summary lines until it fits."""
+        if len(summary) <= self.max_summary_chars:
+            return summary
+        lines = summary.split("\n")
+        while len(lines) > 1 and len("\n".join(lines)) > self.max_summary_chars:
+            lines.pop(0)
+        return "\n".join(lines)[-self.max_summary_chars:]
+
+    def is_empty(self):
+        return not self.recent and not self.summary and not self._to_fold
+
+    def build_rehydration(self, reconnect: bool = True):
+        """
+        Returns one bounded message restoring the conversation, or "" if there
+        is nothing to restore. `reconnect` picks the wording: a dropped
+        connection, or earlier history for a session that is starting fresh.
+        """
+        if self._to_fold:
+            # A fold is still pending; make sure those turns aren't lost from the payload
+            pending = [_compress_turn(sender, text) for sender, text in self._to_fold]
+            summary = self._trim_summary("\n".join(filter(None, [self.summary] + pending)))
+        else:
+            summary = self.summary
+        if not summary and not self.recent:
+            return ""
+
+        if reconnect:
+            parts = ["System Notification: The connection was re-established. This is the conversation so far; continue it naturally without mentioning the reconnect."]
+        else:
+            parts = ["System Notification: This is the earlier conversation in this project, for context. Don't bring it up unless it is relevant."]
+        if summary:
+            parts.append(f"Summary of earlier conversation:\n{summary}")
+        if self.recent:
+            parts.append("Most recent turns:\n" + "\n".join(f"{sender}: {text}" for sender, text in self.recent))
+        return "\n\n".join(parts)
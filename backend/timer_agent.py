@@ -1,144 +1,329 @@
 import asyncio
 import datetime
+import heapq
+import itertools
 import time
 import json
 import os
-import math
-import struct
+import threading
+from functools import lru_cache
+import numpy as np
 import pyaudio
 from tzlocal import get_localzone
 from time_utils import get_local_time
 
+TONE_SAMPLE_RATE = 44100
+TONE_CHUNK = 1024
+
+@lru_cache(maxsize=8)
+def _tone_bytes(frequency, duration, sample_rate=TONE_SAMPLE_RATE):
+    """Returns a sine tone as int16 PCM, generated once per (frequency, duration)."""
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    wave = np.sin(2 * np.pi * frequency * t)
+    # Short fade in/out to avoid clicks at the edges
+    fade = min(len(wave) // 2, int(sample_rate * 0.01))
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade)
+        wave[:fade] *= ramp
+        wave[-fade:] *= ramp[::-1]
+    # Leave headroom so a few overlapping alerts can be mixed without harsh clipping
+    return (wave * 0.5 * 32767).astype(np.int16).tobytes()
+
 class TimerAgent:
-    def __init__(self, session=None, sio=None, storage_file="timers.json"):
+    """Timers and reminders driven by a single scheduler task.
+
+    Deadlines live in a heap keyed by time.monotonic(); the scheduler sleeps
+    until the earliest one (or until the heap changes). State is persisted as
+    a snapshot (storage_file) plus an append-only journal that is compacted
+    back into the snapshot every `compact_every` entries.
+    """
+
+    def __init__(self, session=None, sio=None, storage_file="timers.json", compact_every=50):
         self.session = session
         self.sio = sio
         self.storage_file = storage_file
+        self.journal_file = os.path.splitext(storage_file)[0] + ".journal.jsonl"
+        self.compact_every = compact_every
         self.active_timers = {}
         self.active_reminders = {}
         self._pyaudio_instance = pyaudio.PyAudio()
-        self._active_tasks = {} # To track all running timer/reminder tasks
+        self._voices = [] # [tone samples, play position] mixed by the sound thread
+        self._sound_cond = threading.Condition()
+        self._sound_thread = None # Started on first notification
+        self._sound_stop = False
+        self._heap = [] # (deadline_monotonic, seq, name)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._scheduler_task = None # Started on demand
+        self._broadcast_pending = False
+        self._journal_entries = 0
         self._load_from_disk()
-        self._update_loop_task = None # Will be started on demand
+        self._ensure_scheduler()
 
-    def _start_update_loop_if_needed(self):
-        """Starts the background broadcast loop if it's not already running."""
-        if self._update_loop_task is None:
-            try:
-                # Check if a loop is running
-                loop = asyncio.get_running_loop()
-                if loop.is_running():
-                    self._update_loop_task = asyncio.create_task(self._broadcast_updates())
-            except RuntimeError:
-                # No running loop, do nothing. This happens in synchronous contexts like tests.
-                pass
+    # --- Scheduling ---
 
-    def stop(self):
-        """Stops all running tasks."""
-        if self._update_loop_task:
-            self._update_loop_task.cancel()
-        for task in self._active_tasks.values():
-            task.cancel()
-        self._active_tasks = {}
-
-    async def _broadcast_updates(self):
-        """Periodically sends the status of all timers and reminders to the frontend."""
+    def _ensure_scheduler(self):
+        """Starts the scheduler task if there is a running loop and it isn't running yet."""
+        if self._scheduler_task is not None and not self._scheduler_task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No running loop, do nothing. This happens in synchronous contexts like tests.
+            return
+        self._scheduler_task = asyncio.create_task(self._run_scheduler())
+
+    def _schedule(self, name, epoch_deadline):
+        """Pushes a deadline for `name` and returns its sequence number."""
+        seq = next(self._seq)
+        deadline = time.monotonic() + (epoch_deadline - time.time())
+        heapq.heappush(self._heap, (deadline, seq, name))
+        self._wakeup.set()
+        self._ensure_scheduler()
+        return seq
+
+    def _is_current(self, seq, name):
+        """Heap entries are never removed eagerly; an entry is live only if its seq still matches."""
+        entry = self.active_timers.get(name) or self.active_reminders.get(name)
+        return entry is not None and entry["seq"] == seq
+
+    async def _run_scheduler(self):
         while True:
             try:
-                if self.sio:
-                    # Prepare the data for the frontend
-                    timers_list = []
-                    for name, data in self.active_timers.items():
-                        timers_list.append({
-                            'name': name,
-                            'type': 'timer',
-                            'end_time': data['end_time'],
-                            'duration': data['duration'],
-                        })
-                    for name, data in self.active_reminders.items():
-                        timers_list.append({
-                            'name': name,
-                            'type': 'reminder',
-                            'reminder_time': data['reminder_time'],
-                        })
-
-                    await self.sio.emit('timers_update', {'timers': timers_list})
-
-                await asyncio.sleep(1) # Broadcast every second for live countdowns
+                self._wakeup.clear()
+                now = time.monotonic()
+                while self._heap and (self._heap[0][0] <= now or not self._is_current(self._heap[0][1], self._heap[0][2])):
+                    _, seq, name = heapq.heappop(self._heap)
+                    if self._is_current(seq, name):
+                        self._fire(name)
+
+                timeout = self._heap[0][0] - now if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                print(f"Error in TimerAgent update loop: {e}")
-                await asyncio.sleep(5) # Wait longer if there's an error
+                print(f"Error in TimerAgent scheduler: {e}")
+                await asyncio.sleep(1)
+
+    def _fire(self, name):
+        if name in self.active_timers:
+            self.active_timers.pop(name)
+            self._journal({"op": "del", "name": name})
+            asyncio.create_task(self._deliver_timer(name))
+        elif name in self.active_reminders:
+            entry = self.active_reminders.pop(name)
+            self._journal({"op": "del", "name": name})
+            asyncio.create_task(self._deliver_reminder(name, entry["reminder_time"]))
+        self._notify_change()
+
+    async def _deliver_timer(self, name):
+        try:
+            await self._send_notification(f"Timer '{name}' is up!")
+            if self.sio:
+                await self.sio.emit('timer_finished', {'name': name})
+        except Exception as e:
+            print(f"Error delivering timer '{name}': {e}")
+
+    async def _deliver_reminder(self, name, timestamp):
+        try:
+            await self._send_notification(f"Reminder: '{name}'")
+            if self.sio:
+                await self.sio.emit('reminder_due', {'name': name, 'timestamp': timestamp})
+        except Exception as e:
+            print(f"Error delivering reminder '{name}': {e}")
+
+    def stop(self):
+        """Stops the scheduler and the sound thread."""
+        if self._scheduler_task:
+            self._scheduler_task.cancel()
+            self._scheduler_task = None
+        with self._sound_cond:
+            self._sound_stop = True
+            self._voices = []
+            self._sound_cond.notify()
+
+    # --- Frontend updates ---
+
+    def get_timers_payload(self):
+        timers_list = []
+        for name, data in self.active_timers.items():
+            timers_list.append({
+                'name': name,
+                'type': 'timer',
+                'end_time': data['end_time'],
+                'duration': data['duration'],
+            })
+        for name, data in self.active_reminders.items():
+            timers_list.append({
+                'name': name,
+                'type': 'reminder',
+                'reminder_time': data['reminder_time'],
+            })
+        return {'timers': timers_list}
+
+    async def broadcast_timers(self):
+        """Sends the current timers to the frontend. The UI counts down from end_time itself."""
+        self._broadcast_pending = False
+        if self.sio:
+            try:
+                await self.sio.emit('timers_update', self.get_timers_payload())
+            except Exception as e:
+                print(f"Error in TimerAgent broadcast: {e}")
 
-    def _play_notification_sound(self):
-        # A simple notification sound using pyaudio
+    def _notify_change(self):
+        """Schedules one broadcast for any number of changes made in the same loop iteration."""
+        if not self.sio or self._broadcast_pending:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._broadcast_pending = True
+        asyncio.create_task(self.broadcast_timers())
+
+    # --- Notification sound ---
+
+    def _play_notification_sound(self, frequency=440.0, duration=0.5):
+        """Queues a tone on the output thread and returns immediately."""
+        try:
+            tone = np.frombuffer(_tone_bytes(frequency, duration), dtype=np.int16)
+            with self._sound_cond:
+                self._voices.append([tone, 0])
+                self._sound_cond.notify()
+            self._ensure_sound_thread()
+        except Exception as e:
+            print(f"Error playing notification sound: {e}")
+
+    def _ensure_sound_thread(self):
+        if self._sound_thread is not None and self._sound_thread.is_alive():
+            return
+        self._sound_stop = False
+        self._sound_thread = threading.Thread(target=self._sound_worker, name="TimerAgentSound", daemon=True)
+        self._sound_thread.start()
+
+    def _sound_worker(self):
+        """Mixes all pending tones into one output stream, so overlapping alerts play together."""
+        stream = None
         try:
-            sample_rate = 44100
-            duration = 0.5
-            frequency = 440.0
-            
-            # Generate a simple sine wave
-            num_samples = int(sample_rate * duration)
-            samples = []
-            for i in range(num_samples):
-                sample = math.sin(2 * math.pi * frequency * i / sample_rate)
-                samples.append(int(sample * 32767))
-            
-            # Pack into binary data
-            data = struct.pack('<' + ('h' * len(samples)), *samples)
-            
             stream = self._pyaudio_instance.open(
                 format=pyaudio.paInt16,
                 channels=1,
-                rate=sample_rate,
-                output=True
+                rate=TONE_SAMPLE_RATE,
+                output=True,
+                frames_per_buffer=TONE_CHUNK,
             )
-            stream.write(data)
-            stream.stop_stream()
-            stream.close()
+            while True:
+                with self._sound_cond:
+                    while not self._voices and not self._sound_stop:
+                        self._sound_cond.wait()
+                    if self._sound_stop:
+                        break
+                    chunk = np.zeros(TONE_CHUNK, dtype=np.int32)
+                    for voice in self._voices:
+                        tone, pos = voice
+                        part = tone[pos:pos + TONE_CHUNK]
+                        chunk[:len(part)] += part
+                        voice[1] = pos + len(part)
+                    self._voices = [v for v in self._voices if v[1] < len(v[0])]
+                stream.write(np.clip(chunk, -32768, 32767).astype(np.int16).tobytes())
         except Exception as e:
-            print(f"Error playing notification sound: {e}")
+            print(f"Error in notification sound thread: {e}")
+        finally:
+            if stream is not None:
+                try:
+                    stream.stop_stream()
+                    stream.close()
+                except Exception:
+                    pass
+
+    # --- Persistence ---
+
+    @staticmethod
+    def _timer_record(data):
+        return {"end_time": data["end_time"], "name": data["name"], "duration": data["duration"]}
+
+    @staticmethod
+    def _reminder_record(data):
+        return {"reminder_time": data["reminder_time"], "name": data["name"]}
+
+    def _snapshot_data(self):
+        timers_to_save = {name: self._timer_record(data) for name, data in self.active_timers.items()}
+        reminders_to_save = {name: self._reminder_record(data) for name, data in self.active_reminders.items()}
+        return {"timers": timers_to_save, "reminders": reminders_to_save}
+
+    def _compact(self):
+        """Rewrites the snapshot atomically and truncates the journal."""
+        tmp_file = f"{self.storage_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self._snapshot_data(), f)
+        os.replace(tmp_file, self.storage_file)
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._journal_entries = 0
+
+    def _journal(self, record):
+        """Appends one change to the journal, compacting when it grows too long."""
+        try:
+            with open(self.journal_file, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            self._journal_entries += 1
+            if self._journal_entries >= self.compact_every:
+                self._compact()
+        except Exception as e:
+            print(f"Error writing timer journal: {e}")
 
-    def _save_to_disk(self):
-        timers_to_save = {
-            name: {
-                "end_time": data["end_time"],
-                "name": data["name"],
-                "duration": data["duration"],
-            }
-            for name, data in self.active_timers.items()
-        }
-        reminders_to_save = {
-            name: {
-                "reminder_time": data["reminder_time"],
-                "name": data["name"],
-            }
-            for name, data in self.active_reminders.items()
-        }
-        with open(self.storage_file, "w") as f:
-            json.dump({"timers": timers_to_save, "reminders": reminders_to_save}, f)
+    def _journal_put(self, kind, name):
+        if kind == "timer":
+            data = self._timer_record(self.active_timers[name])
+        else:
+            data = self._reminder_record(self.active_reminders[name])
+        self._journal({"op": "put", "kind": kind, "name": name, "data": data})
 
     def _load_from_disk(self):
-        if not os.path.exists(self.storage_file):
+        timers = {}
+        reminders = {}
+        if os.path.exists(self.storage_file):
+            try:
+                with open(self.storage_file, "r") as f:
+                    data = json.load(f)
+                timers.update(data.get("timers", {}))
+                reminders.update(data.get("reminders", {}))
+            except (ValueError, OSError) as e:
+                print(f"Error loading timers snapshot: {e}")
+
+        # Replay the journal on top of the snapshot. A torn last line from a crash is skipped.
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    name = record.get("name")
+                    if record.get("op") == "put":
+                        target = timers if record.get("kind") == "timer" else reminders
+                        (reminders if target is timers else timers).pop(name, None)
+                        target[name] = record["data"]
+                    elif record.get("op") == "del":
+                        timers.pop(name, None)
+                        reminders.pop(name, None)
+
+        if not timers and not reminders and not os.path.exists(self.journal_file):
             return
 
-        with open(self.storage_file, "r") as f:
-            data = json.load(f)
-
-        for name, timer_data in data.get("timers", {}).items():
-            remaining_duration = timer_data["end_time"] - time.time()
-            if remaining_duration > 0:
-                task = asyncio.create_task(self._timer_task(remaining_duration, name))
-                self._active_tasks[name] = task
+        for name, timer_data in timers.items():
+            if timer_data["end_time"] - time.time() > 0:
                 self.active_timers[name] = {
-                    "task": task,
                     "end_time": timer_data["end_time"],
                     "name": name,
                     "duration": timer_data["duration"],
                 }
+                self.active_timers[name]["seq"] = self._schedule(name, timer_data["end_time"])
 
-        for name, reminder_data in data.get("reminders", {}).items():
+        for name, reminder_data in reminders.items():
             try:
                 reminder_time = datetime.datetime.fromisoformat(reminder_data["reminder_time"])
                 # Ensure the loaded time is timezone-aware for correct comparison
@@ -147,69 +332,43 @@ class TimerAgent:
                 now = get_local_time()
                 delay = (reminder_time - now).total_seconds()
                 if delay > 0:
-                    task = asyncio.create_task(self._reminder_task(delay, name, reminder_data["reminder_time"]))
-                    self._active_tasks[name] = task
                     self.active_reminders[name] = {
-                        "task": task,
                         "reminder_time": reminder_data["reminder_time"],
                         "name": name,
                     }
+                    self.active_reminders[name]["seq"] = self._schedule(name, time.time() + delay)
             except ValueError:
                 print(f"Error loading reminder '{name}': Invalid timestamp format.")
 
+        # Start from a clean snapshot with expired entries dropped
+        try:
+            self._compact()
+        except Exception as e:
+            print(f"Error compacting timers: {e}")
 
     async def _send_notification(self, message):
         self._play_notification_sound()
         if self.session:
             await self.session.send(input=f"System Notification: {message}", end_of_turn=True)
 
-    async def _timer_task(self, duration, name):
-        try:
-            await asyncio.sleep(duration)
-            if name in self.active_timers: # Check if it wasn't cancelled
-                await self._send_notification(f"Timer '{name}' is up!")
-                if self.sio:
-                    await self.sio.emit('timer_finished', {'name': name})
-                self.active_timers.pop(name, None)
-                self._active_tasks.pop(name, None)
-                self._save_to_disk()
-        except asyncio.CancelledError:
-            # Timer was cancelled, do nothing.
-            pass
-
+    # --- Public API ---
 
     async def set_timer(self, duration: int, name: str):
         """Sets a timer for a specified duration in seconds."""
         if name in self.active_timers or name in self.active_reminders:
             return f"A timer or reminder with the name '{name}' already exists."
 
-        self._start_update_loop_if_needed()
-        task = asyncio.create_task(self._timer_task(duration, name))
-        self._active_tasks[name] = task
+        end_time = time.time() + duration
         self.active_timers[name] = {
-            "task": task,
-            "end_time": time.time() + duration,
+            "end_time": end_time,
             "name": name,
             "duration": duration
         }
-        self._save_to_disk()
+        self.active_timers[name]["seq"] = self._schedule(name, end_time)
+        self._journal_put("timer", name)
+        self._notify_change()
         return f"Timer '{name}' set for {duration} seconds."
 
-    async def _reminder_task(self, delay, name, timestamp):
-        try:
-            await asyncio.sleep(delay)
-            if name in self.active_reminders: # Check if it wasn't cancelled
-                await self._send_notification(f"Reminder: '{name}'")
-                if self.sio:
-                    await self.sio.emit('reminder_due', {'name': name, 'timestamp': timestamp})
-                self.active_reminders.pop(name, None)
-                self._active_tasks.pop(name, None)
-                self._save_to_disk()
-        except asyncio.CancelledError:
-            # Reminder was cancelled, do nothing.
-            pass
-
-
     async def set_reminder(self, timestamp: str, name: str):
         """Sets a reminder for a specific time (e.g., 'YYYY-MM-DDTHH:MM:SS')."""
         if name in self.active_timers or name in self.active_reminders:
@@ -226,16 +385,14 @@ class TimerAgent:
             if delay <= 0:
                 return "The specified time is in the past."
 
-            self._start_update_loop_if_needed()
             aware_timestamp = reminder_time.isoformat()
-            task = asyncio.create_task(self._reminder_task(delay, name, aware_timestamp))
-            self._active_tasks[name] = task
             self.active_reminders[name] = {
-                "task": task,
                 "reminder_time": aware_timestamp,
                 "name": name
             }
-            self._save_to_disk()
+            self.active_reminders[name]["seq"] = self._schedule(name, time.time() + delay)
+            self._journal_put("reminder", name)
+            self._notify_change()
             return f"Reminder '{name}' set for {aware_timestamp}."
 
         except ValueError:
@@ -245,18 +402,15 @@ class TimerAgent:
         """Modifies an existing timer or reminder."""
         if name in self.active_timers:
             if new_duration is not None:
-                # Cancel the old task
-                self.active_timers[name]["task"].cancel()
-                self._active_tasks.pop(name, None)
-                # Create a new task with the new duration
-                task = asyncio.create_task(self._timer_task(new_duration, name))
-                self._active_tasks[name] = task
+                # Rescheduling supersedes the old heap entry via the new seq
+                end_time = time.time() + new_duration
                 self.active_timers[name].update({
-                    "task": task,
-                    "end_time": time.time() + new_duration,
+                    "end_time": end_time,
                     "duration": new_duration,
+                    "seq": self._schedule(name, end_time),
                 })
-                self._save_to_disk()
+                self._journal_put("timer", name)
+                self._notify_change()
                 return f"Timer '{name}' modified to {new_duration} seconds."
             else:
                 return "Please provide a new duration for the timer."
@@ -273,18 +427,13 @@ class TimerAgent:
                     if delay <= 0:
                         return "The specified time is in the past."
 
-                    # Cancel the old task
-                    self.active_reminders[name]["task"].cancel()
-                    self._active_tasks.pop(name, None)
-                    # Create a new task with the new timestamp
                     aware_timestamp = reminder_time.isoformat()
-                    task = asyncio.create_task(self._reminder_task(delay, name, aware_timestamp))
-                    self._active_tasks[name] = task
                     self.active_reminders[name].update({
-                        "task": task,
                         "reminder_time": aware_timestamp,
+                        "seq": self._schedule(name, time.time() + delay),
                     })
-                    self._save_to_disk()
+                    self._journal_put("reminder", name)
+                    self._notify_change()
                     return f"Reminder '{name}' modified to {aware_timestamp}."
                 except ValueError:
                     return "Invalid timestamp format. Please use ISO format (e.g., 'YYYY-MM-DDTHH:MM:SS')."
@@ -315,16 +464,16 @@ class TimerAgent:
     def delete_entry(self, name: str):
         """Deletes a timer or reminder by name."""
         if name in self.active_timers:
-            self.active_timers[name]["task"].cancel()
-            self._active_tasks.pop(name, None)
             del self.active_timers[name]
-            self._save_to_disk()
+            self._journal({"op": "del", "name": name})
+            self._wakeup.set()
+            self._notify_change()
             return f"Timer '{name}' deleted."
         elif name in self.active_reminders:
-            self.active_reminders[name]["task"].cancel()
-            self._active_tasks.pop(name, None)
             del self.active_reminders[name]
-            self._save_to_disk()
+            self._journal({"op": "del", "name": name})
+            self._wakeup.set()
+            self._notify_change()
             return f"Reminder '{name}' deleted."
         else:
             return f"No timer or reminder found with the name '{name}'."
@@ -702,6 +702,15 @@ function App() {
         if (selectedMicId) {
             localStorage.setItem('selectedMicId', selectedMicId);
             console.log('[Settings] Saved microphone:', selectedMicId);
+            // Once connected, switch the backend microphone in place instead of restarting the session
+            if (hasAutoConnectedRef.current) {
+                const index = micDevices.findIndex(d => d.deviceId === selectedMicId);
+                const device = micDevices[index];
+                socket.emit('set_audio_device', {
+                    device_index: index >= 0 ? index : null,
+                    device_name: device ? device.label : null
+                });
+            }
         }
     }, [selectedMicId]);
 
@@ -4,6 +4,14 @@ import { X } from 'lucide-react';
 const TimerWidget = ({ timer, onDismiss }) => {
   const [isDue, setIsDue] = useState(false);
   const [isFinished, setIsFinished] = useState(false);
+  const [, setTick] = useState(0);
+
+  useEffect(() => {
+    // The backend only sends timers_update on changes, so count down locally
+    if (timer.type !== 'timer') return;
+    const intervalId = setInterval(() => setTick((t) => t + 1), 1000);
+    return () => clearInterval(intervalId);
+  }, [timer.type]);
 
   useEffect(() => {
     // Logic to handle reminder due state
@@ -0,0 +1,195 @@
+import asyncio
+import struct
+
+from backend.audio_devices import AudioDeviceManager, RingBuffer, downmix
+
+
+class FakeStream:
+    def __init__(self, channels, callback):
+        self.channels = channels
+        self.callback = callback
+        self.closed = False
+
+    def capture(self, frames):
+        """Simulates PortAudio delivering a block; channel n carries the value n + 1."""
+        data = struct.pack(f"<{frames * self.channels}h", *([c + 1 for c in range(self.channels)] * frames))
+        return self.callback(data, frames, None, 0)
+
+    def play(self, frames):
+        return self.callback(None, frames, None, 0)[0]
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakePyAudio:
+    def __init__(self, devices, supported_channels=None):
+        self.devices = devices
+        self.supported_channels = supported_channels or {}
+        self.opens = []
+        self.info_calls = 0
+
+    def get_device_count(self):
+        return len(self.devices)
+
+    def get_device_info_by_index(self, i):
+        self.info_calls += 1
+        return self.devices[i]
+
+    def get_default_input_device_info(self):
+        return self.devices[0]
+
+    def open(self, **kwargs):
+        self.opens.append(kwargs)
+        if kwargs.get("input"):
+            allowed = self.supported_channels.get(kwargs["input_device_index"], [1])
+            if kwargs["channels"] not in allowed:
+                raise OSError("Invalid number of channels")
+        return FakeStream(kwargs["channels"], kwargs["stream_callback"])
+
+
+DEVICES = [
+    {"index": 0, "name": "Built-in Microphone", "maxInputChannels": 1},
+    {"index": 1, "name": "Speakers", "maxInputChannels": 0},
+    {"index": 2, "name": "USB Audio Interface", "maxInputChannels": 4},
+]
+
+
+def make_manager(pya):
+    return AudioDeviceManager(pya, format=8, input_rate=16000, output_rate=24000, frames_per_buffer=4)
+
+
+def test_downmix_keeps_first_channel():
+    data = struct.pack("<6h", 1, 2, 3, 4, 5, 6)
+    assert downmix(data, 2) == struct.pack("<3h", 1, 3, 5)
+    assert downmix(data, 1) == data
+
+
+def test_resolves_by_name_and_caches_lookups():
+    pya = FakePyAudio(DEVICES)
+    manager = make_manager(pya)
+    assert manager.resolve_input(name="usb audio") == 2
+    calls = pya.info_calls
+    assert manager.resolve_input(name="usb audio") == 2
+    assert pya.info_calls == calls
+    # Output-only devices are never picked as input
+    assert manager.resolve_input(name="speakers") == 0
+
+
+def test_ring_buffer_wraps_and_bounds():
+    ring = RingBuffer(8)
+    assert ring.write(b"abcdef") == 6
+    assert ring.read(4) == b"abcd"
+    # Wraps around the end of the buffer
+    assert ring.write(b"ghijklmn") == 6
+    assert ring.available() == 8
+    assert ring.read(100) == b"efghijkl"
+    ring.write(b"xy")
+    ring.discard()
+    assert ring.available() == 0
+
+
+def test_probes_channels_once_per_device():
+    pya = FakePyAudio(DEVICES, supported_channels={2: [2, 4]})
+    manager = make_manager(pya)
+    assert manager.set_input_device(name="USB Audio Interface")
+    assert [o["channels"] for o in pya.opens] == [1, 2]
+    # Captured blocks come back downmixed to mono
+    manager._input[1].capture(4)
+    assert asyncio.run(manager.read_chunk(4)) == struct.pack("<4h", 1, 1, 1, 1)
+
+    # Selecting the open device again is a no-op
+    assert manager.set_input_device(name="USB Audio Interface")
+    assert len(pya.opens) == 2
+
+    # Coming back to the device after a swap uses the cached channel count
+    manager.set_input_device(index=0)
+    manager.set_input_device(name="USB Audio Interface")
+    assert pya.opens[-1]["channels"] == 2
+
+
+def test_hot_swap_closes_old_stream_only_after_success():
+    pya = FakePyAudio(DEVICES, supported_channels={0: [1], 2: []})
+    manager = make_manager(pya)
+    assert manager.set_input_device(index=0)
+    old_stream = manager._input[1]
+
+    # Device 2 can't be opened: the old device keeps working
+    assert manager.set_input_device(index=2)
+    assert manager._input[0] == 0
+    assert not old_stream.closed
+
+    pya.supported_channels[2] = [1]
+    manager.refresh()
+    assert manager.set_input_device(index=2)
+    assert manager._input[0] == 2
+    assert old_stream.closed
+    # A late callback from the old stream doesn't reach the ring
+    old_stream.capture(4)
+    assert manager._input_ring.available() == 0
+
+
+def test_read_chunk_wakes_on_capture_from_another_thread():
+    pya = FakePyAudio(DEVICES)
+    manager = make_manager(pya)
+    manager.set_input_device(index=0)
+    stream = manager._input[1]
+
+    async def scenario():
+        reader = asyncio.create_task(manager.read_chunk(8))
+        await asyncio.sleep(0.01)
+        assert not reader.done()
+        # Two blocks from the PortAudio thread complete the chunk
+        await asyncio.to_thread(stream.capture, 4)
+        await asyncio.to_thread(stream.capture, 4)
+        return await asyncio.wait_for(reader, timeout=1)
+
+    assert asyncio.run(scenario()) == struct.pack("<8h", *([1] * 8))
+
+
+def test_input_overrun_is_counted():
+    pya = FakePyAudio(DEVICES)
+    manager = AudioDeviceManager(pya, format=8, input_rate=8, output_rate=8, frames_per_buffer=4, input_buffer_seconds=1)
+    manager.set_input_device(index=0)
+    stream = manager._input[1]
+    stream.capture(4)
+    stream.capture(4)
+    assert manager.metrics["input_overruns"] == 0
+    stream.capture(4)
+    assert manager.metrics["input_overruns"] == 1
+
+
+def test_playback_pads_underruns_and_flushes():
+    pya = FakePyAudio(DEVICES)
+    manager = make_manager(pya)
+    assert manager.set_output_device(None)
+    assert manager.set_output_device(None)
+    assert len([o for o in pya.opens if o.get("output")]) == 1
+    stream = manager._output[1]
+
+    asyncio.run(manager.write_chunk(b"\x01\x00\x02\x00"))
+    # Short data is padded with silence and counted
+    assert stream.play(4) == b"\x01\x00\x02\x00" + b"\x00" * 4
+    assert manager.metrics["output_underruns"] == 1
+    # Nothing queued is plain silence, not an underrun
+    assert stream.play(2) == b"\x00" * 4
+    assert manager.metrics["output_underruns"] == 1
+
+    asyncio.run(manager.write_chunk(b"\x05\x00" * 4))
+    manager.flush_output()
+    assert stream.play(4) == b"\x00" * 8
+
+    manager.close()
+    assert stream.closed
+
+
+def test_output_gain_ducks_playback():
+    pya = FakePyAudio(DEVICES)
+    manager = make_manager(pya)
+    manager.set_output_device(None)
+    asyncio.run(manager.write_chunk(struct.pack("<2h", 1000, -1000)))
+    manager.output_gain = 0.5
+    assert manager._output[1].play(2) == struct.pack("<2h", 500, -500)
@@ -0,0 +1,50 @@
+import struct
+import pytest
+
+from backend.audio_encoding import PCMEncoder, DownsamplingPCMEncoder, create_encoder
+
+# 64 ms at 16 kHz
+CHUNK = b"\x01\x00" * 1024
+
+
+def test_batches_chunks_until_full():
+    encoder = PCMEncoder(sample_rate=16000, batch_ms=128)
+    assert encoder.encode(CHUNK, captured_at=1.0) is None
+    payload = encoder.encode(CHUNK, captured_at=1.064)
+    assert payload["data"] == CHUNK * 2
+    assert payload["mime_type"] == "audio/pcm;rate=16000"
+    # Latency is measured from the first chunk in the batch
+    assert payload["_captured_at"] == 1.0
+    assert encoder.flush() is None
+
+
+def test_flush_sends_partial_batch():
+    encoder = PCMEncoder(batch_ms=500)
+    encoder.encode(CHUNK)
+    payload = encoder.flush()
+    assert payload["data"] == CHUNK
+    assert encoder.metrics()["payloads"] == 1
+
+
+def test_downsampling_halves_bytes():
+    encoder = DownsamplingPCMEncoder(sample_rate=16000, target_rate=8000, batch_ms=64)
+    pcm = struct.pack("<4h", 100, 300, -200, -400)
+    payload = encoder.encode(pcm * 256)
+    assert payload["mime_type"] == "audio/pcm;rate=8000"
+    assert payload["data"][:4] == struct.pack("<2h", 200, -300)
+    assert len(payload["data"]) == len(pcm * 256) // 2
+    assert encoder.metrics()["ratio"] == 0.5
+
+
+def test_metrics_report_rate_and_latency():
+    encoder = PCMEncoder(batch_ms=64, window_seconds=1.0)
+    payload = encoder.encode(CHUNK, captured_at=10.0)
+    encoder.record_sent(payload["_captured_at"], sent_at=10.15)
+    metrics = encoder.metrics()
+    assert metrics["sent_bytes_per_second"] == len(CHUNK)
+    assert metrics["last_send_latency_ms"] == pytest.approx(150.0)
+
+
+def test_unknown_encoder_falls_back_to_pcm():
+    assert isinstance(create_encoder("opus"), PCMEncoder)
+    assert isinstance(create_encoder("pcm_low"), DownsamplingPCMEncoder)
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from backend.audio_processing import EchoCanceller, NoiseFloorVAD, resample
+
+RATE = 16000
+CHUNK = 1024
+
+
+def to_pcm(samples):
+    return np.clip(np.round(samples), -32768, 32767).astype("<i2").tobytes()
+
+
+def from_pcm(pcm):
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float64)
+
+
+def run_echo(canceller, seconds, delay, near_end=None):
+    """Plays noise as the reference and feeds back a delayed, filtered copy as the mic."""
+    rng = np.random.default_rng(0)
+    total = int(RATE * seconds)
+    reference = rng.normal(0, 3000, total + delay)
+    path = np.array([0.5, 0.2, -0.1])
+    echo = np.convolve(reference, path)[:total + delay]
+    mic = echo[:total] if delay == 0 else np.concatenate([np.zeros(delay), echo[:total - delay]])
+    if near_end is not None:
+        mic = mic + near_end[:total]
+
+    out = []
+    for start in range(0, total - CHUNK + 1, CHUNK):
+        # Same rate for reference and mic keeps the test exact
+        canceller.add_reference(to_pcm(reference[start:start + CHUNK]))
+        out.append(from_pcm(canceller.process(to_pcm(mic[start:start + CHUNK]))))
+    return mic, np.concatenate(out)
+
+
+def test_resample_length():
+    samples = np.arange(2400, dtype=np.float64)
+    assert len(resample(samples, 24000, 16000)) == 1600
+    assert resample(samples, 16000, 16000) is samples
+
+
+def test_finds_delay_and_cancels_echo():
+    canceller = EchoCanceller(sample_rate=RATE, reference_rate=RATE, max_delay_ms=100)
+    mic, out = run_echo(canceller, seconds=6, delay=480)
+    assert canceller.delay == pytest.approx(480, abs=2)
+    # The last second should have most of the echo removed
+    tail_in = np.mean(mic[len(out) - RATE:len(out)] ** 2)
+    tail_out = np.mean(out[-RATE:] ** 2)
+    assert 10 * np.log10(tail_in / tail_out) > 15
+
+
+def test_keeps_near_end_speech():
+    canceller = EchoCanceller(sample_rate=RATE, reference_rate=RATE, max_delay_ms=100)
+    total = RATE * 6
+    t = np.arange(total) / RATE
+    # The user talks during the last two seconds
+    near_end = np.where(t >= 4, 8000 * np.sin(2 * np.pi * 300 * t), 0)
+    _, out = run_echo(canceller, seconds=6, delay=160, near_end=near_end)
+    tail = slice(len(out) - RATE, len(out))
+    residual = out[tail] - near_end[tail]
+    assert np.mean(residual ** 2) < 0.1 * np.mean(near_end[tail] ** 2)
+
+
+def test_passes_through_without_reference():
+    canceller = EchoCanceller(sample_rate=RATE, reference_rate=RATE)
+    pcm = to_pcm(np.full(CHUNK, 1000.0))
+    canceller.add_reference(to_pcm(np.zeros(CHUNK)))
+    assert canceller.process(pcm) == pcm
+
+
+def test_noise_floor_vad_adapts():
+    vad = NoiseFloorVAD(initial_threshold=800, margin=3.0, min_threshold=200)
+    # A noisy room raises the threshold, so steady noise isn't speech
+    for _ in range(500):
+        vad.update(600, speaking=False)
+    assert vad.threshold > 1500
+    assert not vad.update(600, speaking=False)
+    assert vad.update(3000, speaking=False)
+
+    # Quiet again: the floor drops quickly
+    for _ in range(20):
+        vad.update(50, speaking=False)
+    assert vad.threshold == 200
+
+
+def test_noise_floor_holds_during_speech():
+    vad = NoiseFloorVAD(initial_threshold=800)
+    threshold = vad.threshold
+    for _ in range(100):
+        vad.update(700, speaking=True)
+    assert vad.threshold == threshold
@@ -0,0 +1,60 @@
+import struct
+import pytest
+
+from backend.barge_in import BargeInDetector, pcm_rms
+
+
+def make_detector(**kwargs):
+    return BargeInDetector(vad_threshold=100, threshold_factor=2.0, echo_ratio=0.5, confirm_chunks=2, **kwargs)
+
+
+def test_pcm_rms():
+    assert pcm_rms(b"") == 0
+    assert pcm_rms(struct.pack("<4h", 300, -300, 300, -300)) == 300
+
+
+def test_ignores_speech_without_playback():
+    detector = make_detector()
+    assert detector.process(5000, now=1.0) is None
+    assert detector.metrics["barge_ins"] == 0
+
+
+def test_ducks_then_confirms_barge_in():
+    detector = make_detector()
+    detector.note_playback(200, now=1.0)
+    assert detector.process(500, now=1.05) == "duck"
+    assert detector.process(500, now=1.1) == "barge_in"
+    assert detector.metrics["barge_ins"] == 1
+    assert detector.metrics["last_local_ms"] == pytest.approx(50.0)
+    # In-flight audio for the interrupted turn is gated until the server catches up
+    assert detector.gate_active(now=1.2)
+    detector.note_server_interrupt(now=1.35)
+    assert detector.metrics["last_server_ms"] == pytest.approx(300.0)
+    detector.release_gate()
+    assert not detector.gate_active(now=1.4)
+
+
+def test_echo_of_own_playback_does_not_trigger():
+    detector = make_detector()
+    detector.note_playback(2000, now=1.0)
+    # Loud enough for plain VAD, but below half the playback level
+    assert detector.process(900, now=1.05) is None
+    assert detector.process(900, now=1.1) is None
+    assert detector.metrics["barge_ins"] == 0
+
+
+def test_unconfirmed_candidate_releases_duck():
+    detector = make_detector()
+    detector.note_playback(200, now=1.0)
+    assert detector.process(500, now=1.05) == "duck"
+    assert detector.process(50, now=1.1) == "release"
+    assert detector.metrics["false_triggers"] == 1
+
+
+def test_gate_times_out():
+    detector = make_detector(gate_timeout=0.5)
+    detector.note_playback(200, now=1.0)
+    detector.process(500, now=1.05)
+    detector.process(500, now=1.1)
+    assert detector.gate_active(now=1.5)
+    assert not detector.gate_active(now=1.7)
@@ -0,0 +1,272 @@
+import os
+import json
+import threading
+
+import pytest
+from backend import chat_history
+from backend.chat_history import ChatLogWriter, ChatHistoryStore, read_tail, query
+
+
+def _read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_append_is_buffered_until_flush(tmp_path):
+    """Entries stay in memory until a flush is requested."""
+    log_file = tmp_path / "chat_history.jsonl"
+    writer = ChatLogWriter(flush_size=100, flush_interval=60)
+    writer.append(log_file, {"sender": "User", "text": "hello"})
+    assert not log_file.exists()
+
+    assert writer.flush(wait=True)
+    assert _read_lines(log_file) == [{"sender": "User", "text": "hello"}]
+    writer.close()
+
+
+def test_flushes_on_size(tmp_path):
+    """Reaching flush_size triggers a write without an explicit flush."""
+    log_file = tmp_path / "chat_history.jsonl"
+    writer = ChatLogWriter(flush_size=3, flush_interval=60)
+    for i in range(3):
+        writer.append(log_file, {"i": i})
+    with writer._cond:
+        writer._cond.wait_for(lambda: writer._flushed_seq >= 3, 2)
+    assert [e["i"] for e in _read_lines(log_file)] == [0, 1, 2]
+    writer.close()
+
+
+def test_close_writes_pending_entries(tmp_path):
+    """Closing drains the buffer, and later appends are dropped without raising."""
+    log_file = tmp_path / "chat_history.jsonl"
+    writer = ChatLogWriter(flush_size=100, flush_interval=60, fsync_policy="batch")
+    writer.append(log_file, {"text": "bye"})
+    writer.close()
+    assert _read_lines(log_file) == [{"text": "bye"}]
+    assert writer.append(log_file, {"text": "late"}) is False
+    assert _read_lines(log_file) == [{"text": "bye"}]
+
+
+def test_repairs_torn_last_line(tmp_path):
+    """A partial record left by a crash doesn't swallow the next entry."""
+    log_file = tmp_path / "chat_history.jsonl"
+    log_file.write_text('{"text": "ok"}\n{"text": "tor')
+    writer = ChatLogWriter()
+    writer.append(log_file, {"text": "next"})
+    writer.close()
+    lines = log_file.read_text().splitlines()
+    assert lines[1] == '{"text": "tor'
+    assert json.loads(lines[2]) == {"text": "next"}
+
+
+def test_invalid_fsync_policy():
+    with pytest.raises(ValueError):
+        ChatLogWriter(fsync_policy="sometimes")
+
+
+def _write_history(path, count, block_pad=""):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            sender = "User" if i % 2 == 0 else "ADA"
+            f.write(json.dumps({"timestamp": float(i), "sender": sender, "text": f"msg {i}{block_pad}"}) + "\n")
+
+
+def test_read_tail_across_blocks(tmp_path):
+    """The tail reader returns the last N entries in order, even when lines span read blocks."""
+    log_file = tmp_path / "chat_history.jsonl"
+    _write_history(log_file, 500, block_pad="x" * 100)
+    entries = read_tail(log_file, 10)
+    assert [e["timestamp"] for e in entries] == [float(i) for i in range(490, 500)]
+    assert len(read_tail(log_file, 1000)) == 500
+    assert read_tail(tmp_path / "missing.jsonl", 10) == []
+
+
+def test_read_tail_skips_torn_line(tmp_path):
+    log_file = tmp_path / "chat_history.jsonl"
+    _write_history(log_file, 3)
+    with open(log_file, "a") as f:
+        f.write('{"timestamp": 3.0, "sen')
+    assert [e["timestamp"] for e in read_tail(log_file, 2)] == [1.0, 2.0]
+
+
+def test_query_by_time_and_sender(tmp_path):
+    log_file = tmp_path / "chat_history.jsonl"
+    _write_history(log_file, 100)
+    entries = query(log_file, start=10, end=19)
+    assert [e["timestamp"] for e in entries] == [float(i) for i in range(10, 20)]
+    entries = query(log_file, start=10, end=19, sender="ADA")
+    assert all(e["sender"] == "ADA" for e in entries) and len(entries) == 5
+    entries = query(log_file, sender="User", limit=2)
+    assert [e["timestamp"] for e in entries] == [96.0, 98.0]
+
+
+def _records(start, count, sender="User"):
+    return [
+        (json.dumps({"timestamp": float(i), "sender": sender, "text": f"msg {i}"}) + "\n", float(i))
+        for i in range(start, start + count)
+    ]
+
+
+def test_store_seals_time_bounded_segments(tmp_path):
+    """Segments roll over by age, and sealed ones are compressed with their time range recorded."""
+    store = ChatHistoryStore(tmp_path, segment_seconds=10)
+    for i in range(0, 30, 5):
+        store.write_records(_records(i, 5))
+    segments = store.segments()
+    assert [(s["start"], s["end"]) for s in segments] == [(0.0, 9.0), (10.0, 19.0), (20.0, 29.0)]
+    assert all(s["sealed"] for s in segments[:-1])
+    assert not segments[-1]["sealed"]
+    assert not segments[0]["file"].endswith(".jsonl")
+
+    assert [e["timestamp"] for e in store.read_tail(12)] == [float(i) for i in range(18, 30)]
+    assert [e["timestamp"] for e in store.query(start=8, end=11)] == [8.0, 9.0, 10.0, 11.0]
+
+
+def test_reads_decompress_outside_the_store_lock(tmp_path, monkeypatch):
+    store = ChatHistoryStore(tmp_path, segment_seconds=10)
+    for i in range(0, 30, 5):
+        store.write_records(_records(i, 5))
+    read_segment = chat_history._read_segment
+
+    def write_while_reading(path):
+        # The writer thread gets the lock while a sealed segment is being decompressed
+        writer = threading.Thread(target=store.write_records, args=(_records(30, 1),))
+        writer.start()
+        writer.join(2)
+        assert not writer.is_alive()
+        return read_segment(path)
+
+    monkeypatch.setattr(chat_history, "_read_segment", write_while_reading)
+    # The write lands after the snapshot, so it isn't part of this read
+    assert [e["timestamp"] for e in store.read_tail(15)] == [float(i) for i in range(15, 30)]
+    monkeypatch.setattr(chat_history, "_read_segment", read_segment)
+    assert [e["timestamp"] for e in store.read_tail(16)] == [float(i) for i in range(15, 31)]
+
+
+def test_store_query_skips_unrelated_segments(tmp_path):
+    store = ChatHistoryStore(tmp_path, segment_seconds=10)
+    for i in range(0, 30, 5):
+        store.write_records(_records(i, 5))
+    # Corrupting a segment outside the range proves it is never opened
+    first = store.segments()[0]["file"]
+    (tmp_path / "chat_history" / first).write_bytes(b"not compressed")
+    assert [e["timestamp"] for e in store.query(start=20, end=22)] == [20.0, 21.0, 22.0]
+
+
+def test_store_retention_drops_oldest(tmp_path):
+    store = ChatHistoryStore(tmp_path, segment_seconds=10, max_total_bytes=1)
+    for i in range(0, 30, 5):
+        store.write_records(_records(i, 5))
+    segments = store.segments()
+    # Only the segment being written to survives such a tight budget
+    assert len(segments) == 1 and not segments[0]["sealed"]
+
+
+def test_store_migrates_legacy_file(tmp_path):
+    _write_history(tmp_path / "chat_history.jsonl", 30)
+    store = ChatHistoryStore(tmp_path, segment_seconds=10)
+    store.write_records(_records(30, 1))
+    # Readable before the migration has run
+    assert [e["timestamp"] for e in store.read_tail(3)] == [28.0, 29.0, 30.0]
+    assert [e["timestamp"] for e in store.query(start=8, end=11)] == [8.0, 9.0, 10.0, 11.0]
+
+    store.migrate_legacy()
+    assert not (tmp_path / "chat_history.jsonl").exists()
+    segments = store.segments()
+    # Split by the same time limit as new segments, ahead of the newer history
+    assert [(s["start"], s["end"]) for s in segments[:3]] == [(0.0, 9.0), (10.0, 19.0), (20.0, 29.0)]
+    assert all(s["sealed"] for s in segments[:3])
+    assert [e["timestamp"] for e in store.read_tail(100)] == [float(i) for i in range(31)]
+    assert [e["timestamp"] for e in store.query(start=8, end=11)] == [8.0, 9.0, 10.0, 11.0]
+
+    reopened = ChatHistoryStore(tmp_path)
+    assert reopened.segments() == store.segments()
+
+
+def test_legacy_segments_respect_size_limit(tmp_path):
+    _write_history(tmp_path / "chat_history.jsonl", 50, block_pad="x" * 100)
+    store = ChatHistoryStore(tmp_path, max_segment_bytes=1000)
+    store.migrate_legacy()
+    segments = store.segments()
+    assert len(segments) > 5
+    assert sum(s["count"] for s in segments) == 50
+    assert [e["timestamp"] for e in store.read_tail(50)] == [float(i) for i in range(50)]
+
+
+def test_writer_targets_store(tmp_path):
+    store = ChatHistoryStore(tmp_path)
+    writer = ChatLogWriter()
+    writer.append(store, {"timestamp": 1.0, "sender": "User", "text": "hi"})
+    writer.close()
+    assert store.read_tail(1) == [{"timestamp": 1.0, "sender": "User", "text": "hi"}]
+
+
+def test_reads_merge_unwritten_entries(tmp_path):
+    """Readers see queued entries without waiting for the writer to reach the disk."""
+    store = ChatHistoryStore(tmp_path)
+    store.write_records(_records(0, 3))
+    writer = ChatLogWriter(flush_size=100, flush_interval=60)
+    for i in range(3, 5):
+        writer.append(store, {"timestamp": float(i), "sender": "Ada", "text": f"msg {i}"})
+    pending = lambda: writer.pending_entries(store)
+
+    assert [e["timestamp"] for e in store.read_tail(3, pending=pending)] == [2.0, 3.0, 4.0]
+    assert [e["timestamp"] for e in store.query(start=1, sender="Ada", pending=pending)] == [3.0, 4.0]
+    assert [e["timestamp"] for e in store.query(start=1, limit=3, pending=pending)] == [2.0, 3.0, 4.0]
+
+    # Once written they come from disk, and aren't counted twice
+    writer.close()
+    assert writer.pending_entries(store) == []
+    assert [e["timestamp"] for e in store.read_tail(10, pending=pending)] == [float(i) for i in range(5)]
+
+
+def test_store_search_covers_sealed_segments(tmp_path):
+    store = ChatHistoryStore(tmp_path, segment_seconds=10)
+    for i in range(0, 30, 5):
+        store.write_records(_records(i, 5))
+    results = store.search("MSG 3")
+    # msg 3 is in a compressed segment, msg 3x in the sealed and active ones
+    assert [json.loads(r["content"])["timestamp"] for r in results] == [3.0]
+    assert results[0]["file"].startswith("chat_history/") and not results[0]["file"].endswith(".jsonl")
+    assert len(store.search("msg 2")) == 11
+
+
+def test_store_search_only_opens_matching_segments(tmp_path, monkeypatch):
+    store = ChatHistoryStore(tmp_path, segment_seconds=10)
+    for i in range(0, 30, 5):
+        store.write_records(_records(i, 5))
+    # Sealed segments carry their postings, so loading the index decompresses nothing
+    assert len(list((tmp_path / "chat_history").glob("*.terms.json"))) == 2
+    opened = []
+    read_segment = chat_history._read_segment
+
+    def recording_read(path):
+        opened.append(os.path.basename(path))
+        return read_segment(path)
+
+    monkeypatch.setattr(chat_history, "_read_segment", recording_read)
+    results = store.search("msg 13")
+    assert [json.loads(r["content"])["timestamp"] for r in results] == [13.0]
+    assert opened == [store.segments()[1]["file"]]
+
+    # Appends are indexed as they are written
+    store.write_records([(json.dumps({"timestamp": 29.5, "sender": "Ada", "text": "zebra crossing"}) + "\n", 29.5)])
+    opened.clear()
+    assert [r["line"] for r in store.search("zebra")] == [11]
+    assert opened == []
+
+
+def test_store_search_index_follows_retention_and_old_segments(tmp_path):
+    store = ChatHistoryStore(tmp_path, segment_seconds=10)
+    for i in range(0, 30, 5):
+        store.write_records(_records(i, 5))
+    # Segments sealed before sidecars existed are indexed on load
+    for sidecar in (tmp_path / "chat_history").glob("*.terms.json"):
+        sidecar.unlink()
+    reopened = ChatHistoryStore(tmp_path, segment_seconds=10, max_total_bytes=1)
+    assert len(reopened.search("msg 3")) == 1
+
+    reopened.write_records(_records(30, 10))
+    # Retention dropped the old segments along with their postings
+    assert [json.loads(r["content"])["timestamp"] for r in reopened.search("msg 3")] == [float(i) for i in range(30, 40)]
+    assert not (tmp_path / "chat_history" / "000000.terms.json").exists()
@@ -0,0 +1,88 @@
+import os
+import time
+
+from backend.context_builder import ContextBuilder
+from backend.project_watcher import ProjectWatcher
+
+
+def _builder(tmp_path, **kwargs):
+    watcher = ProjectWatcher(tmp_path, poll_interval=3600, use_watchdog=False)
+    watcher.start()
+    return ContextBuilder(tmp_path, watcher, **kwargs), watcher
+
+
+def _touch(path, text, age=0):
+    path.write_text(text)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_excludes_bookkeeping_files(tmp_path):
+    _touch(tmp_path / "config.json", '{"system_prompt": "secret"}')
+    (tmp_path / "chat_history").mkdir()
+    _touch(tmp_path / "chat_history" / "000000.jsonl", '{"text": "chatter"}')
+    _touch(tmp_path / "notes.md", "design notes")
+    builder, watcher = _builder(tmp_path)
+    context = builder.build("demo")
+    assert "design notes" in context
+    assert "secret" not in context and "chatter" not in context
+    watcher.stop()
+
+
+def test_budget_prefers_recent_files(tmp_path):
+    _touch(tmp_path / "old.txt", "o" * 500, age=3600)
+    _touch(tmp_path / "new.txt", "n" * 500)
+    builder, watcher = _builder(tmp_path, budget_bytes=800)
+    context = builder.build("demo")
+    assert "--- new.txt ---" in context
+    assert "--- old.txt ---" not in context
+    # Both are still listed by name
+    assert "  - old.txt" in context
+    assert len(context.encode("utf-8")) <= 800
+    watcher.stop()
+
+
+def test_unchanged_files_use_cached_digest(tmp_path, monkeypatch):
+    _touch(tmp_path / "a.txt", "alpha")
+    builder, watcher = _builder(tmp_path)
+    builder.build("demo")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("file re-read")
+    monkeypatch.setattr("builtins.open", fail)
+    assert "alpha" in builder.build("demo")
+    watcher.stop()
+
+
+def test_delta_only_contains_changes(tmp_path):
+    _touch(tmp_path / "a.txt", "alpha", age=60)
+    _touch(tmp_path / "b.txt", "beta", age=60)
+    builder, watcher = _builder(tmp_path)
+    builder.build("demo")
+    assert builder.build_delta("demo") == ""
+
+    _touch(tmp_path / "a.txt", "alpha v2")
+    os.remove(tmp_path / "b.txt")
+    watcher.rescan()
+    delta = builder.build_delta("demo")
+    assert "alpha v2" in delta
+    assert "Removed files: b.txt" in delta
+    assert builder.build_delta("demo") == ""
+    watcher.stop()
+
+
+def test_omitted_files_are_not_retried_every_delta(tmp_path):
+    _touch(tmp_path / "big.txt", "b" * 600, age=3600)
+    _touch(tmp_path / "small.txt", "s" * 300)
+    builder, watcher = _builder(tmp_path, budget_bytes=700)
+    assert "--- big.txt ---" not in builder.build("demo")
+    # Nothing changed, so the omitted file doesn't produce a delta on its own
+    assert builder.build_delta("demo") == ""
+
+    # A small change leaves room for the omitted file
+    _touch(tmp_path / "small.txt", "s2")
+    watcher.rescan()
+    delta = builder.build_delta("demo")
+    assert "s2" in delta and "--- big.txt ---" in delta
+    assert builder.build_delta("demo") == ""
+    watcher.stop()
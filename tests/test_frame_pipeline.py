@@ -0,0 +1,81 @@
+import base64
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from backend.frame_pipeline import FramePipeline, LatestFrame
+
+
+def gradient_frame(width=1280, height=720):
+    x = np.linspace(0, 255, width)
+    row = np.stack([x, 255 - x, np.full(width, 128)], axis=-1).astype(np.uint8)
+    return np.ascontiguousarray(np.broadcast_to(row, (height, width, 3)))
+
+
+def test_emits_resized_jpeg():
+    pipeline = FramePipeline(max_size=640)
+    data = pipeline.process(gradient_frame())
+    assert data[:2] == b"\xff\xd8"
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (360, 640, 3)
+
+
+def test_skips_unchanged_frames():
+    pipeline = FramePipeline(keyframe_seconds=0)
+    frame = gradient_frame()
+    assert pipeline.process(frame, now=0) is not None
+    # Sensor noise alone doesn't change the hash
+    noisy = np.clip(frame.astype(np.int16) + np.random.default_rng(0).integers(-2, 3, frame.shape), 0, 255).astype(np.uint8)
+    assert pipeline.process(noisy, now=1) is None
+    assert pipeline.process(np.flip(frame, axis=1).copy(), now=2) is not None
+    assert pipeline.metrics()["duplicates"] == 1
+
+
+def test_keyframe_resends_static_scene():
+    pipeline = FramePipeline(keyframe_seconds=10)
+    frame = gradient_frame()
+    assert pipeline.process(frame, now=0) is not None
+    assert pipeline.process(frame, now=5) is None
+    assert pipeline.process(frame, now=10) is not None
+
+
+def test_reset_forces_next_frame():
+    pipeline = FramePipeline(keyframe_seconds=0)
+    frame = gradient_frame()
+    pipeline.process(frame, now=0)
+    pipeline.reset()
+    assert pipeline.process(frame, now=1) is not None
+
+
+def test_latest_frame_is_sent_once():
+    slot = LatestFrame()
+    assert slot.take_unsent() is None
+    slot.put(b"\xff\xd8one")
+    payload = slot.take_unsent()
+    assert payload == {"mime_type": "image/jpeg", "data": b"\xff\xd8one", "_frame_seq": 1}
+    slot.mark_sent(payload["_frame_seq"])
+    assert slot.take_unsent() is None
+
+    # Only the newest of several frames is kept
+    slot.put(b"\xff\xd8two")
+    slot.put(b"\xff\xd8three")
+    assert slot.take_unsent()["data"] == b"\xff\xd8three"
+    assert slot.metrics()["replaced_unsent"] == 1
+
+
+def test_latest_frame_decodes_base64_once():
+    slot = LatestFrame()
+    encoded = base64.b64encode(b"\xff\xd8jpeg").decode()
+    assert slot.put("data:image/jpeg;base64," + encoded) == 1
+    assert slot.data == b"\xff\xd8jpeg"
+    assert slot.put("not base64!") is None
+    assert slot.metrics()["decode_errors"] == 1
+
+
+def test_latest_frame_resent_to_new_session():
+    slot = LatestFrame()
+    slot.put(b"\xff\xd8one")
+    slot.mark_sent(slot.take_unsent()["_frame_seq"])
+    slot.mark_unseen()
+    assert slot.take_unsent()["data"] == b"\xff\xd8one"
@@ -0,0 +1,81 @@
+import asyncio
+
+from backend.jitter_buffer import JitterBuffer
+
+# 1 byte per ms keeps the arithmetic readable
+def make_buffer(**kwargs):
+    return JitterBuffer(sample_rate=500, sample_width=2, channels=1, **kwargs)
+
+
+def test_waits_for_target_before_playing():
+    async def scenario():
+        buffer = make_buffer(target_latency_ms=100)
+        buffer.put(b"a" * 40)
+        getter = asyncio.create_task(buffer.get())
+        await asyncio.sleep(0.02)
+        assert not getter.done()
+        buffer.put(b"b" * 60)
+        return await asyncio.wait_for(getter, 1)
+
+    assert asyncio.run(scenario()) == b"a" * 40
+
+
+def test_priming_times_out_for_short_audio():
+    async def scenario():
+        buffer = make_buffer(target_latency_ms=30)
+        buffer.put(b"a" * 5)
+        return await asyncio.wait_for(buffer.get(), 1)
+
+    assert asyncio.run(scenario()) == b"a" * 5
+
+
+def test_underrun_mid_turn_is_counted_and_raises_target():
+    async def scenario():
+        buffer = make_buffer(target_latency_ms=10, adapt_step_ms=20, max_latency_ms=100)
+        buffer.put(b"a" * 10)
+        await buffer.get()
+        getter = asyncio.create_task(buffer.get())
+        await asyncio.sleep(0.01)
+        assert buffer.underruns == 1
+        assert buffer.target_latency_ms == 30
+        getter.cancel()
+        return buffer.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["underruns_per_minute"] == 1
+
+
+def test_end_of_turn_drains_without_underrun():
+    async def scenario():
+        buffer = make_buffer(target_latency_ms=1000)
+        buffer.put(b"a" * 10)
+        buffer.put(b"b" * 10)
+        buffer.mark_end_of_turn()
+        chunks = [await buffer.get(), await buffer.get()]
+        getter = asyncio.create_task(buffer.get())
+        await asyncio.sleep(0.01)
+        getter.cancel()
+        return chunks, buffer.underruns
+
+    chunks, underruns = asyncio.run(scenario())
+    assert chunks == [b"a" * 10, b"b" * 10]
+    assert underruns == 0
+
+
+def test_overrun_drops_oldest():
+    buffer = make_buffer(max_buffer_ms=25)
+    for c in b"abc":
+        buffer.put(bytes([c]) * 10)
+    assert buffer.overruns == 1
+    assert buffer.depth_ms() == 20
+
+
+def test_flush_empties_buffer():
+    buffer = make_buffer()
+    for _ in range(100):
+        buffer.put(b"a" * 10)
+    buffer.flush()
+    metrics = buffer.metrics()
+    assert metrics["depth_ms"] == 0
+    assert metrics["flushes"] == 1
+    assert not metrics["playing"]
@@ -34,15 +34,38 @@ class TestKasaDiscovery:
         # Configure the mock to return a mock device
         mock_device = AsyncMock()
         mock_device.alias = "Mock Device"
-        mock_discover.return_value = mock_device
 
-        agent = KasaAgent(known_devices=kasa_devices)
-        await agent.initialize()
-        print(f"Initialized {len(agent.devices)} devices")
-        
-        # If we have known devices, they should be loaded
-        if kasa_devices:
-            assert len(agent.devices) > 0
+        with patch.object(KasaAgent, '_build_device', return_value=mock_device):
+            agent = KasaAgent(known_devices=kasa_devices)
+            await agent.initialize()
+            print(f"Initialized {len(agent.devices)} devices")
+
+            # If we have known devices, they should be loaded
+            if kasa_devices:
+                assert len(agent.devices) > 0
+            await agent.wait_until_ready()
+
+        # Devices with a known type are constructed directly, not discovered
+        mock_discover.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_initialize_does_not_wait_for_devices(self, kasa_devices):
+        """Test that startup returns before offline devices answer."""
+        async def hang():
+            await asyncio.sleep(10)
+
+        mock_device = AsyncMock()
+        mock_device.update.side_effect = hang
+
+        with patch.object(KasaAgent, '_build_device', return_value=mock_device):
+            agent = KasaAgent(known_devices=kasa_devices, connect_timeout=0.05)
+            await asyncio.wait_for(agent.initialize(), timeout=0.5)
+            # Cached aliases from settings are available immediately
+            first_alias = next(iter(kasa_devices.values()))["alias"]
+            assert agent.get_device_by_alias(first_alias) is mock_device
+            await agent.wait_until_ready()
+
+        assert all(st["online"] is False for st in agent.device_states.values())
 
     @pytest.mark.asyncio
     async def test_discover_devices(self):
@@ -76,8 +99,10 @@ class TestKasaDeviceControl:
             mock_device.is_color = True
             mock_discover.return_value = mock_device
 
-            agent = KasaAgent(known_devices=kasa_devices)
-            await agent.initialize()
+            with patch.object(KasaAgent, '_build_device', return_value=mock_device):
+                agent = KasaAgent(known_devices=kasa_devices)
+                await agent.initialize()
+                await agent.wait_until_ready()
             # Attach the mock to the agent for inspection in tests if needed
             agent.mock_discover = mock_discover
             agent.mock_device = mock_device
@@ -163,6 +188,132 @@ class TestKasaDeviceControl:
         print(f"Set color result for {ip}: {result}")
         assert result is True
 
+    @pytest.mark.asyncio
+    async def test_command_updates_cache_without_refresh(self, agent_with_devices, kasa_devices):
+        """Test that a successful command updates the state cache optimistically."""
+        agent = agent_with_devices
+
+        if not kasa_devices:
+            pytest.skip("No Kasa devices configured")
+
+        ip = next(iter(kasa_devices.keys()))
+        agent.mock_device.update.reset_mock()
+        assert await agent.turn_on(ip) is True
+
+        agent.mock_device.update.assert_not_called()
+        assert agent.device_states[ip]["is_on"] is True
+        assert any(d["ip"] == ip and d["is_on"] for d in agent.get_device_list())
+
+    @pytest.mark.asyncio
+    async def test_refresh_all_updates_every_device(self, agent_with_devices, kasa_devices):
+        """Test that the refresher updates all cached devices."""
+        agent = agent_with_devices
+
+        if not kasa_devices:
+            pytest.skip("No Kasa devices configured")
+
+        agent.mock_device.update.reset_mock()
+        await agent.refresh_all()
+        assert agent.mock_device.update.await_count == len(agent.devices)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("command", ["turn_on", "turn_off"])
+    async def test_unreachable_device_is_not_commanded(self, command):
+        """Test that a device failing its first update is not sent the command."""
+        agent = KasaAgent(connect_timeout=0.1)
+        dev = AsyncMock()
+        dev.update.side_effect = OSError("no route to host")
+        agent.devices["192.168.1.50"] = dev
+
+        with patch('backend.kasa_agent.Discover.discover_single', new_callable=AsyncMock, return_value=None) as mock_discover:
+            result = await getattr(agent, command)("192.168.1.50")
+
+        assert result is False
+        getattr(dev, command).assert_not_called()
+        mock_discover.assert_awaited_once_with("192.168.1.50")
+
+    @pytest.mark.asyncio
+    async def test_saved_config_connects_without_discovery(self):
+        """Test that a saved connection config reconnects with Device.connect, whatever the protocol."""
+        config = {"host": "192.168.1.60", "timeout": 5,
+                  "connection_type": {"device_family": "SMART.TAPOBULB", "encryption_type": "KLAP", "https": False}}
+        dev = AsyncMock()
+        dev.alias = "Hall Light"
+        dev.is_bulb = True
+        dev.is_color = False
+        agent = KasaAgent(known_devices=[{"ip": "192.168.1.60", "alias": "Hall Light", "type": "bulb", "config": config}])
+
+        with patch('backend.kasa_agent.Device.connect', new_callable=AsyncMock, return_value=dev) as mock_connect, \
+                patch('backend.kasa_agent.Discover.discover_single', new_callable=AsyncMock) as mock_discover:
+            await agent.initialize()
+            # Resolvable from the cached alias before the connection completes
+            assert agent._resolve_target("hall light")[0] == "192.168.1.60"
+            await agent.wait_until_ready()
+            assert await agent.turn_on("Hall Light") is True
+
+        assert mock_connect.await_args.kwargs["config"].connection_type.encryption_type.value == "KLAP"
+        mock_discover.assert_not_called()
+        dev.turn_on.assert_awaited_once()
+        assert agent.device_states["192.168.1.60"]["online"] is True
+
+    @pytest.mark.asyncio
+    async def test_direct_build_falls_back_to_discovery(self):
+        """Test that a typed device that doesn't answer the legacy protocol is rediscovered."""
+        legacy = AsyncMock()
+        legacy.update.side_effect = OSError("connection reset")
+        discovered = AsyncMock()
+        discovered.alias = "Desk Lamp"
+        discovered.is_bulb = True
+        agent = KasaAgent(known_devices=[{"ip": "192.168.1.61", "alias": "Desk Lamp", "type": "bulb"}])
+
+        with patch.object(KasaAgent, '_build_device', return_value=legacy), \
+                patch('backend.kasa_agent.Discover.discover_single', new_callable=AsyncMock, return_value=discovered):
+            await agent.initialize()
+            await agent.wait_until_ready()
+
+        assert agent.devices["192.168.1.61"] is discovered
+        assert await agent.turn_off("Desk Lamp") is True
+        discovered.turn_off.assert_awaited_once()
+
+
+class TestKasaGroups:
+    """Tests for named groups and concurrent fan-out."""
+
+    def test_save_and_resolve_group(self):
+        """Test saving a group and persisting it through the callback."""
+        saved = {}
+        agent = KasaAgent(on_groups_changed=saved.update)
+        success, _ = agent.save_group("Living Room", ["192.168.1.10", "192.168.1.11"])
+        assert success
+        assert agent.resolve_group("living room") == ["192.168.1.10", "192.168.1.11"]
+        assert "Living Room" in saved
+
+    def test_all_is_reserved(self):
+        """Test that 'all' cannot be overwritten."""
+        agent = KasaAgent()
+        success, _ = agent.save_group("all", ["192.168.1.10"])
+        assert not success
+
+    @pytest.mark.asyncio
+    async def test_control_group_returns_per_device_results(self):
+        """Test that a group command fans out and reports each device."""
+        agent = KasaAgent(known_groups={"lights": ["a", "b", "c"]})
+        agent.turn_off = AsyncMock(side_effect=[True, False, True])
+
+        result = await agent.control_group("turn_off", group="lights")
+
+        assert agent.turn_off.await_count == 3
+        assert result["succeeded"] == 2
+        assert result["failed"] == 1
+        assert [r["target"] for r in result["results"]] == ["a", "b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_control_unknown_group(self):
+        """Test that an unknown group reports an error instead of raising."""
+        agent = KasaAgent()
+        result = await agent.control_group("turn_on", group="nope")
+        assert result["results"] == []
+
 
 class TestKasaColorConversion:
     """Test color name to HSV conversion."""
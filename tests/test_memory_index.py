@@ -0,0 +1,140 @@
+import zlib
+
+import numpy as np
+import pytest
+from backend.memory_index import MemoryIndex, chunk_text, chunk_chat
+from backend.project_manager import ProjectManager
+
+
+class FakeEmbedder:
+    """Bag-of-words hashing embedder that records batch sizes."""
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.calls = []
+
+    async def __call__(self, texts):
+        self.calls.append(len(texts))
+        vectors = []
+        for text in texts:
+            v = np.zeros(self.dim)
+            for word in text.lower().split():
+                v[zlib.crc32(word.strip(".,:").encode()) % self.dim] += 1
+            vectors.append(v.tolist())
+        return vectors
+
+
+@pytest.fixture
+def project(tmp_path):
+    pm = ProjectManager(str(tmp_path))
+    yield pm
+    pm.close()
+
+
+def test_chunk_text_overlaps_and_covers_text():
+    text = "\n".join(f"line {i} " + "x" * 50 for i in range(40))
+    chunks = chunk_text(text, size=300, overlap=50)
+    assert len(chunks) > 1
+    assert all(len(c) <= 300 for c in chunks)
+    assert chunks[0].startswith("line 0") and "line 39" in chunks[-1]
+
+
+def test_chunk_chat_groups_turns():
+    entries = [{"sender": "User", "text": "a" * 100, "timestamp": float(i)} for i in range(10)]
+    chunks = chunk_chat(entries, size=350)
+    assert [ts for _, ts in chunks] == [0.0, 3.0, 6.0, 9.0]
+
+
+@pytest.mark.asyncio
+async def test_recall_finds_relevant_chat_and_files(project):
+    project.log_chat("User", "The bracket should be 40mm wide with M3 holes.")
+    project.log_chat("ADA", "Noted, forty millimetre bracket.")
+    (project.get_current_project_path() / "notes.md").write_text("Shopping list: eggs, milk, bread")
+    project.notify_file_changed(project.get_current_project_path() / "notes.md")
+
+    index = MemoryIndex(project, project.get_current_project_path(), FakeEmbedder())
+    await index.sync()
+    results = await index.recall("bracket holes", k=1)
+    assert results[0]["source"] == "chat"
+    assert "40mm" in results[0]["text"]
+    results = await index.recall("eggs milk", k=1)
+    assert results[0]["source"] == "file:notes.md"
+
+
+@pytest.mark.asyncio
+async def test_recall_does_not_embed_the_project(project):
+    embedder = FakeEmbedder()
+    index = MemoryIndex(project, project.get_current_project_path(), embedder)
+    project.log_chat("User", "The bracket should be 40mm wide.")
+    assert await index.recall("bracket") == []
+    assert embedder.calls == []
+
+    assert await index.sync_if_changed() == 1
+    assert await index.sync_if_changed() == 0
+    embedder.calls.clear()
+    assert (await index.recall("bracket", k=1))[0]["source"] == "chat"
+    # Only the query itself is embedded
+    assert embedder.calls == [1]
+
+    (project.get_current_project_path() / "notes.md").write_text("eggs and milk")
+    project.get_watcher().rescan()
+    assert await index.sync_if_changed() == 1
+
+
+@pytest.mark.asyncio
+async def test_large_files_are_skipped_and_bad_k_returns_nothing(project):
+    embedder = FakeEmbedder()
+    index = MemoryIndex(project, project.get_current_project_path(), embedder, max_file_bytes=1000)
+    (project.get_current_project_path() / "small.txt").write_text("small notes")
+    (project.get_current_project_path() / "big.log").write_text("log line\n" * 500)
+    project.get_watcher().rescan()
+    assert await index.sync() == 1
+    assert {c["source"] for c in index.chunks} == {"file:small.txt"}
+
+    embedder.calls.clear()
+    assert await index.recall("notes", k=-1) == []
+    assert await index.recall("notes", k=0) == []
+    assert embedder.calls == []
+
+
+@pytest.mark.asyncio
+async def test_sync_is_incremental_and_batched(project):
+    embedder = FakeEmbedder()
+    index = MemoryIndex(project, project.get_current_project_path(), embedder, batch_size=2)
+    for i in range(5):
+        (project.get_current_project_path() / f"f{i}.txt").write_text(f"file number {i}")
+    project.get_watcher().rescan()
+
+    assert await index.sync() == 5
+    assert embedder.calls == [2, 2, 1]
+    assert await index.sync() == 0
+
+    project.log_chat("User", "new message")
+    assert await index.sync() == 1
+
+
+@pytest.mark.asyncio
+async def test_changed_file_replaces_its_chunks_and_persists(project):
+    path = project.get_current_project_path() / "plan.txt"
+    path.write_text("version one")
+    project.get_watcher().rescan()
+    index = MemoryIndex(project, project.get_current_project_path(), FakeEmbedder())
+    await index.sync()
+
+    path.write_text("version two, longer")
+    project.get_watcher().rescan()
+    await index.sync()
+    texts = [c["text"] for c in index.chunks if c["source"] == "file:plan.txt"]
+    assert texts == ["version two, longer"]
+
+    reloaded = MemoryIndex(project, project.get_current_project_path(), FakeEmbedder())
+    assert reloaded.chunks == index.chunks
+    assert reloaded.vectors.shape == index.vectors.shape
+
+
+@pytest.mark.asyncio
+async def test_add_text_replaces_source(project):
+    index = MemoryIndex(project, project.get_current_project_path(), FakeEmbedder())
+    await index.add_text("first upload", source="memory:a.txt")
+    await index.add_text("second upload", source="memory:a.txt")
+    assert [c["text"] for c in index.chunks if c["source"] == "memory:a.txt"] == ["second upload"]
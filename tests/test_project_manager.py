@@ -0,0 +1,102 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from backend.project_manager import ProjectManager
+
+
+def _config_path(pm):
+    return pm.get_current_project_path() / "config.json"
+
+
+def test_config_is_cached_until_file_changes(tmp_path):
+    pm = ProjectManager(str(tmp_path))
+    first = pm.get_project_config()
+
+    with patch("builtins.open", side_effect=AssertionError("config re-read")):
+        assert pm.get_project_config() == first
+
+    # An external edit changes the size/mtime and invalidates the cache
+    config = dict(first, voice_name="Puck", extra="x" * 10)
+    _config_path(pm).write_text(json.dumps(config))
+    assert pm.get_project_config()["voice_name"] == "Puck"
+    pm.close()
+
+
+def test_returned_config_is_a_copy(tmp_path):
+    pm = ProjectManager(str(tmp_path))
+    pm.get_project_config()["voice_name"] = "mutated"
+    assert pm.get_project_config()["voice_name"] != "mutated"
+    pm.close()
+
+
+def test_update_config_writes_atomically(tmp_path):
+    pm = ProjectManager(str(tmp_path))
+    success, _ = pm.update_project_config({"time_format": "24h"})
+    assert success
+    assert not list(_config_path(pm).parent.glob("config.json.*tmp"))
+    assert json.loads(_config_path(pm).read_text())["time_format"] == "24h"
+
+    # Served from the cache populated by the write
+    with patch("builtins.open", side_effect=AssertionError("config re-read")):
+        assert pm.get_project_config()["time_format"] == "24h"
+    pm.close()
+
+
+def test_concurrent_config_updates_keep_every_key(tmp_path):
+    pm = ProjectManager(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: pm.update_project_config({f"key{i}": i}), range(32)))
+    assert all(success for success, _ in results)
+    config = json.loads(_config_path(pm).read_text())
+    assert all(config[f"key{i}"] == i for i in range(32))
+    assert not list(_config_path(pm).parent.glob("config.json.*tmp"))
+    pm.close()
+
+
+def test_watcher_started_on_switch_and_shared_across_threads(tmp_path):
+    pm = ProjectManager(str(tmp_path))
+    pm.create_project("demo")
+    (tmp_path / "projects" / "demo" / "notes.md").write_text("hello")
+    pm.switch_project("demo")
+    started = pm._watcher
+    assert started is not None and started.project_path.name == "demo"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        watchers = list(pool.map(lambda _: pm.get_watcher(), range(32)))
+    assert all(w is started for w in watchers)
+    assert any(info["path"] == "notes.md" for info in pm.get_file_catalog())
+    pm.close()
+
+
+def test_legacy_chat_history_migrates_in_background_on_switch(tmp_path):
+    pm = ProjectManager(str(tmp_path))
+    pm.create_project("old")
+    legacy = tmp_path / "projects" / "old" / "chat_history.jsonl"
+    legacy.write_text("".join(json.dumps({"timestamp": float(i), "sender": "User", "text": str(i)}) + "\n" for i in range(5)))
+
+    pm.switch_project("old")
+    # History is readable whether or not the migration has finished
+    assert [e["text"] for e in pm.get_recent_chat_history(2)] == ["3", "4"]
+    deadline = time.monotonic() + 2
+    while legacy.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not legacy.exists()
+    assert [e["text"] for e in pm.get_recent_chat_history(2)] == ["3", "4"]
+    pm.close()
+
+
+def test_search_files_includes_sealed_chat_history(tmp_path):
+    pm = ProjectManager(str(tmp_path))
+    store = pm.get_chat_store()
+    store.segment_seconds = 10
+    for i in range(0, 20, 5):
+        store.write_records([(json.dumps({"timestamp": float(t), "sender": "User", "text": f"gearbox {t}"}) + "\n", float(t)) for t in range(i, i + 5)])
+    (pm.get_current_project_path() / "notes.md").write_text("gearbox ratio\n")
+    pm.notify_file_changed(pm.get_current_project_path() / "notes.md")
+
+    results = pm.search_files("gearbox 1")
+    assert {json.loads(r["content"])["text"] for r in results} == {"gearbox 1"} | {f"gearbox {t}" for t in range(10, 20)}
+    assert [r["file"] for r in pm.search_files("gearbox ratio")] == ["notes.md"]
+    pm.close()
@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+
+from backend.project_watcher import ProjectWatcher
+from backend.search_index import SearchIndex
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_catalog_tracks_files(tmp_path):
+    (tmp_path / "notes.md").write_text("hello")
+    (tmp_path / "cad").mkdir()
+    (tmp_path / "cad" / "part.stl").write_bytes(b"\0" * 10)
+    (tmp_path / ".cache").mkdir()
+    (tmp_path / ".cache" / "search_index.json").write_text("{}")
+
+    watcher = ProjectWatcher(tmp_path, use_watchdog=False)
+    watcher.start()
+    catalog = watcher.snapshot()
+    assert set(catalog) == {"notes.md", "cad/part.stl"}
+    assert catalog["notes.md"]["type"] == "text"
+    assert catalog["cad/part.stl"] == dict(catalog["cad/part.stl"], size=10, type="binary")
+    watcher.stop()
+
+
+def test_polling_fallback_picks_up_changes(tmp_path):
+    watcher = ProjectWatcher(tmp_path, poll_interval=0.05, use_watchdog=False)
+    watcher.start()
+    (tmp_path / "new.txt").write_text("x")
+    assert _wait_for(lambda: "new.txt" in watcher.snapshot())
+    os.remove(tmp_path / "new.txt")
+    assert _wait_for(lambda: "new.txt" not in watcher.snapshot())
+    watcher.stop()
+
+
+def test_notify_changed_updates_immediately(tmp_path):
+    watcher = ProjectWatcher(tmp_path, poll_interval=3600, use_watchdog=False)
+    watcher.start()
+    version = watcher.version
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.py").write_text("print(1)")
+    watcher.notify_changed(tmp_path / "sub" / "a.py")
+    assert "sub/a.py" in watcher.snapshot()
+    assert watcher.version > version
+
+    os.remove(tmp_path / "sub" / "a.py")
+    os.rmdir(tmp_path / "sub")
+    watcher.notify_changed(tmp_path / "sub")
+    assert watcher.snapshot() == {}
+    watcher.stop()
+
+
+def test_notify_changed_does_not_wait_for_first_scan(tmp_path):
+    release = threading.Event()
+
+    class SlowWatcher(ProjectWatcher):
+        def rescan(self):
+            release.wait(2)
+            super().rescan()
+
+    watcher = SlowWatcher(tmp_path, poll_interval=3600, use_watchdog=False)
+    watcher.start()
+    (tmp_path / "late.md").write_text("written during the scan")
+    started = time.monotonic()
+    watcher.notify_changed(tmp_path / "late.md")
+    assert time.monotonic() - started < 0.5
+    release.set()
+    assert "late.md" in watcher.snapshot()
+    watcher.stop()
+
+
+def test_search_index_reads_from_catalog(tmp_path):
+    (tmp_path / "a.txt").write_text("alpha\n")
+    watcher = ProjectWatcher(tmp_path, poll_interval=3600, use_watchdog=False)
+    watcher.start()
+    index = SearchIndex(tmp_path, watcher=watcher)
+    assert [r["file"] for r in index.search("alpha")] == ["a.txt"]
+
+    (tmp_path / "b.txt").write_text("alpha again\n")
+    watcher.notify_changed(tmp_path / "b.txt")
+    assert {r["file"] for r in index.search("alpha")} == {"a.txt", "b.txt"}
+    watcher.stop()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("mss")
+
+from backend.screen_capture import ScreenCapture
+
+
+def desktop(width=2560, height=1440, value=40):
+    return np.full((height, width, 4), value, dtype=np.uint8)
+
+
+def test_downsamples_into_reused_buffer():
+    capture = ScreenCapture(max_size=1024)
+    frame = capture._downsample(desktop())
+    assert frame.shape == (480, 853, 3)
+    assert capture._downsample(desktop()) is frame
+
+
+def test_idle_screen_is_not_resent_and_backs_off():
+    capture = ScreenCapture(min_interval=0.5, max_interval=2.0, backoff=2.0)
+    assert capture.process(desktop()) is not None
+    for _ in range(4):
+        assert capture.process(desktop()) is None
+    assert capture.interval == 2.0
+    assert capture.metrics()["unchanged"] == 4
+
+
+def test_small_changes_are_ignored():
+    capture = ScreenCapture(min_changed_tiles=2)
+    capture.process(desktop())
+    cursor = desktop()
+    cursor[700:740, 1200:1204] = 255
+    assert capture.process(cursor) is None
+
+
+def test_new_window_is_sent_and_resets_interval():
+    capture = ScreenCapture(min_interval=0.5)
+    capture.process(desktop())
+    capture.process(desktop())
+    assert capture.interval > 0.5
+    window = desktop()
+    window[200:900, 300:1500] = 230
+    data = capture.process(window)
+    assert data[:2] == b"\xff\xd8"
+    assert capture.interval == 0.5
+    assert capture.stats["last_changed_tiles"] > 2
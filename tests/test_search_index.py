@@ -0,0 +1,82 @@
+import os
+
+from backend.search_index import SearchIndex
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_search_matches_substrings(tmp_path):
+    _write(tmp_path / "a.txt", "hello world\nnothing here\n")
+    _write(tmp_path / "notes" / "b.md", "Say Hello to the world\n")
+    _write(tmp_path / "image.stl", "hello world")
+    index = SearchIndex(tmp_path)
+
+    results = index.search("hello world")
+    assert [(r["file"], r["line"]) for r in results] == [("a.txt", 1)]
+    assert {r["file"] for r in index.search("ell")} == {"a.txt", "notes/b.md"}
+    assert index.search("missing") == []
+
+
+def test_results_ranked_by_hits(tmp_path):
+    _write(tmp_path / "one.txt", "robot\n")
+    _write(tmp_path / "many.txt", "robot arm\nrobot leg\nrobot head\n")
+    results = SearchIndex(tmp_path).search("robot")
+    assert [r["file"] for r in results] == ["many.txt"] * 3 + ["one.txt"]
+
+
+def test_index_persists_and_skips_unchanged_files(tmp_path):
+    _write(tmp_path / "a.txt", "alpha\n")
+    SearchIndex(tmp_path).search("alpha")
+    assert (tmp_path / ".cache" / "search_index.json").exists()
+
+    reloaded = SearchIndex(tmp_path)
+    assert "a.txt" in reloaded.files
+    reloaded.refresh(force=True)
+    assert not reloaded._changed
+
+
+def test_notified_changes_are_picked_up_without_rescan(tmp_path):
+    _write(tmp_path / "a.txt", "alpha\n")
+    index = SearchIndex(tmp_path, rescan_interval=3600)
+    assert index.search("beta") == []
+
+    _write(tmp_path / "b.txt", "beta\n")
+    assert index.search("beta") == []
+    index.notify_changed(tmp_path / "b.txt")
+    assert [r["file"] for r in index.search("beta")] == ["b.txt"]
+
+
+def test_deleted_files_leave_the_index(tmp_path):
+    _write(tmp_path / "a.txt", "alpha\n")
+    index = SearchIndex(tmp_path, rescan_interval=0)
+    assert index.search("alpha")
+    os.remove(tmp_path / "a.txt")
+    assert index.search("alpha") == []
+    assert "alpha" not in index.postings
+
+
+def test_partial_words_use_the_gram_index(tmp_path):
+    _write(tmp_path / "a.txt", "robotics lab\nrobot\n")
+    _write(tmp_path / "b.txt", "a bot\n")
+    index = SearchIndex(tmp_path)
+    assert [(r["file"], r["line"]) for r in index.search("botic")] == [("a.txt", 1)]
+    assert {(r["file"], r["line"]) for r in index.search("bot")} == {("a.txt", 1), ("a.txt", 2), ("b.txt", 1)}
+    # Shares every trigram with "robotics" but isn't a substring of it
+    assert index.search("boticsrob") == []
+
+
+def test_persisted_index_holds_no_file_text(tmp_path):
+    _write(tmp_path / "a.txt", "top secret plans\n")
+    SearchIndex(tmp_path).search("plans")
+    saved = (tmp_path / ".cache" / "search_index.json").read_text()
+    assert "top secret plans" not in saved
+
+    reloaded = SearchIndex(tmp_path)
+    assert [r["content"] for r in reloaded.search("secr")] == ["top secret plans"]
+    # Removing a file still clears postings rebuilt from disk
+    os.remove(tmp_path / "a.txt")
+    reloaded.refresh(force=True)
+    assert reloaded.postings == {}
@@ -0,0 +1,98 @@
+import asyncio
+
+from backend.send_pipeline import SendPipeline
+
+
+def audio(data, mime="audio/pcm;rate=16000", captured_at=None):
+    return {"data": data, "mime_type": mime, "_captured_at": captured_at}
+
+
+def image(n):
+    return {"data": f"frame{n}", "mime_type": "image/jpeg"}
+
+
+class Recorder:
+    def __init__(self, fail_first=0):
+        self.sent = []
+        self.fail_first = fail_first
+
+    async def __call__(self, payload):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise RuntimeError("session closed")
+        self.sent.append(payload)
+
+
+async def drain(pipeline):
+    task = asyncio.create_task(pipeline.run())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def test_backlogged_audio_is_coalesced():
+    sender = Recorder()
+    pipeline = SendPipeline(sender, coalesce_max_bytes=6)
+    for i, chunk in enumerate([b"aa", b"bb", b"cc", b"dd"]):
+        pipeline.put_audio(audio(chunk, captured_at=i))
+    asyncio.run(drain(pipeline))
+    assert [p["data"] for p in sender.sent] == [b"aabbcc", b"dd"]
+    # The merged send keeps the first chunk's capture time
+    assert sender.sent[0]["_captured_at"] == 0
+    assert pipeline.stats["audio_coalesced"] == 2
+
+
+def test_different_formats_are_not_merged():
+    sender = Recorder()
+    pipeline = SendPipeline(sender)
+    pipeline.put_audio(audio(b"aa"))
+    pipeline.put_audio(audio(b"b", mime="audio/pcm;rate=8000"))
+    asyncio.run(drain(pipeline))
+    assert [p["data"] for p in sender.sent] == [b"aa", b"b"]
+
+
+def test_stale_images_and_old_audio_are_dropped():
+    sender = Recorder()
+    pipeline = SendPipeline(sender, max_audio_bytes=4)
+    for n in range(3):
+        pipeline.put_image(image(n))
+    for chunk in [b"aa", b"bb", b"cc"]:
+        pipeline.put_audio(audio(chunk))
+    metrics = pipeline.metrics()
+    assert metrics["images_dropped"] == 2
+    assert metrics["audio_dropped"] == 1
+    assert metrics["image_depth"] == 1
+    assert metrics["audio_depth_bytes"] == 4
+
+    asyncio.run(drain(pipeline))
+    # Audio goes first, then the newest frame
+    assert [p["data"] for p in sender.sent] == [b"bbcc", "frame2"]
+
+
+def test_images_are_not_starved_by_audio():
+    sender = Recorder()
+    pipeline = SendPipeline(sender, coalesce_max_bytes=2, max_audio_before_image=2)
+    pipeline.put_image(image(0))
+    for chunk in [b"aa", b"bb", b"cc"]:
+        pipeline.put_audio(audio(chunk))
+    asyncio.run(drain(pipeline))
+    assert [p["data"] for p in sender.sent] == [b"aa", b"bb", "frame0", b"cc"]
+
+
+def test_send_errors_do_not_stop_the_pipeline():
+    sender = Recorder(fail_first=1)
+    pipeline = SendPipeline(sender)
+    pipeline.put_image(image(0))
+    pipeline.put_audio(audio(b"aa"))
+
+    async def scenario():
+        task = asyncio.create_task(pipeline.run())
+        await asyncio.sleep(0.1)
+        pipeline.put_audio(audio(b"bb"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert pipeline.stats["send_errors"] == 1
+    assert [p["data"] for p in sender.sent] == ["frame0", b"bb"]
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from backend.session_context import SessionContext
+
+
+def test_recent_turns_are_bounded_and_folded():
+    ctx = SessionContext(max_recent_turns=3, max_summary_chars=500)
+    for i in range(6):
+        ctx.add_turn("User", f"Message number {i}. With some extra detail.")
+    assert [text for _, text in ctx.recent] == [f"Message number {i}. With some extra detail." for i in range(3, 6)]
+    # Older turns survive in compressed form
+    assert "User: Message number 0." in ctx.summary
+    assert "extra detail" not in ctx.summary
+
+
+def test_rehydration_payload_is_bounded():
+    ctx = SessionContext(max_recent_turns=4, max_recent_chars=400, max_summary_chars=300)
+    for i in range(200):
+        ctx.add_turn("ADA" if i % 2 else "User", f"turn {i} " + "x" * 80)
+    message = ctx.build_rehydration()
+    assert len(message) < 300 + 400 + 400
+    assert "turn 199" in message
+    assert "turn 0 " not in message
+
+
+def test_empty_context_has_no_rehydration():
+    ctx = SessionContext()
+    assert ctx.is_empty()
+    assert ctx.build_rehydration() == ""
+
+
+def test_rehydration_wording_depends_on_reconnect():
+    ctx = SessionContext()
+    ctx.add_turn("User", "hello")
+    assert "re-established" in ctx.build_rehydration(reconnect=True)
+    fresh = ctx.build_rehydration(reconnect=False)
+    assert "re-established" not in fresh and "User: hello" in fresh
+
+
+def test_seed_only_when_empty():
+    ctx = SessionContext()
+    ctx.seed([{"sender": "User", "text": "hello"}])
+    ctx.seed([{"sender": "User", "text": "ignored"}])
+    assert list(ctx.recent) == [("User", "hello")]
+
+
+@pytest.mark.asyncio
+async def test_model_summary_with_fallback():
+    calls = []
+
+    async def summarize(summary, turns):
+        calls.append(len(turns))
+        return f"{summary} +{len(turns)}".strip()
+
+    ctx = SessionContext(summarize_fn=summarize, max_recent_turns=1)
+    ctx.add_turn("User", "a")
+    ctx.add_turn("User", "b")
+    await asyncio.sleep(0)
+    await ctx._fold_task
+    assert ctx.summary == "+1"
+
+    async def broken(summary, turns):
+        raise RuntimeError("offline")
+
+    ctx.summarize_fn = broken
+    ctx.add_turn("User", "c")
+    await ctx._fold_task
+    assert "User: b" in ctx.summary
@@ -8,13 +8,18 @@ import pytest
 from backend.timer_agent import TimerAgent
 
 STORAGE_FILE = "test_timers.json"
+JOURNAL_FILE = "test_timers.journal.jsonl"
+
+def _remove_storage():
+    for path in (STORAGE_FILE, JOURNAL_FILE):
+        if os.path.exists(path):
+            os.remove(path)
 
 @pytest.fixture
 def timer_agent():
     """Fixture to create a TimerAgent instance for testing."""
-    # Clean up the storage file before each test
-    if os.path.exists(STORAGE_FILE):
-        os.remove(STORAGE_FILE)
+    # Clean up the storage files before each test
+    _remove_storage()
 
     # Mock the pyaudio.PyAudio class to avoid audio hardware issues in a headless environment
     with patch('pyaudio.PyAudio') as mock_pyaudio:
@@ -22,10 +27,10 @@ def timer_agent():
         mock_ada_session = AsyncMock()
         agent = TimerAgent(session=mock_ada_session, storage_file=STORAGE_FILE)
         yield agent
+        agent.stop()
 
-    # Clean up the storage file after each test
-    if os.path.exists(STORAGE_FILE):
-        os.remove(STORAGE_FILE)
+    # Clean up the storage files after each test
+    _remove_storage()
 
 def get_future_timestamp(minutes=5):
     """Returns a timestamp string in ISO format for a future time."""
@@ -40,7 +45,6 @@ async def test_set_timer(timer_agent):
     result = await timer_agent.set_timer(duration, name)
     assert result == f"Timer '{name}' set for {duration} seconds."
     assert name in timer_agent.active_timers
-    timer_agent.active_timers[name]["task"].cancel()
 
 @pytest.mark.anyio
 async def test_set_reminder(timer_agent):
@@ -50,8 +54,6 @@ async def test_set_reminder(timer_agent):
     result = await timer_agent.set_reminder(timestamp, name)
     assert f"Reminder '{name}' set for" in result
     assert name in timer_agent.active_reminders
-    # Clean up the task to prevent it from running
-    timer_agent.active_reminders[name]["task"].cancel()
 
 @pytest.mark.anyio
 async def test_list_timers(timer_agent):
@@ -62,9 +64,6 @@ async def test_list_timers(timer_agent):
     result = timer_agent.list_timers()
     assert "timer1" in result
     assert "reminder1" in result
-    # Clean up tasks
-    timer_agent.active_timers["timer1"]["task"].cancel()
-    timer_agent.active_reminders["reminder1"]["task"].cancel()
 
 @pytest.mark.anyio
 async def test_delete_entry(timer_agent):
@@ -90,7 +89,6 @@ async def test_modify_timer(timer_agent):
     result = await timer_agent.modify_timer("timer1", new_duration=20)
     assert result == "Timer 'timer1' modified to 20 seconds."
     assert timer_agent.active_timers["timer1"]["duration"] == 20
-    timer_agent.active_timers["timer1"]["task"].cancel()
 
 @pytest.mark.anyio
 async def test_modify_reminder(timer_agent):
@@ -101,7 +99,6 @@ async def test_modify_reminder(timer_agent):
     result = await timer_agent.modify_timer("reminder1", new_timestamp=new_timestamp)
     assert f"Reminder 'reminder1' modified to" in result
     assert new_timestamp in timer_agent.active_reminders["reminder1"]["reminder_time"]
-    timer_agent.active_reminders["reminder1"]["task"].cancel()
 
 @pytest.mark.anyio
 async def test_persistence(timer_agent):
@@ -113,5 +110,72 @@ async def test_persistence(timer_agent):
     new_agent = TimerAgent(session=AsyncMock(), storage_file=STORAGE_FILE)
     assert "timer1" in new_agent.active_timers
     assert "reminder1" in new_agent.active_reminders
-    new_agent.active_timers["timer1"]["task"].cancel()
-    new_agent.active_reminders["reminder1"]["task"].cancel()
+    new_agent.stop()
+
+@pytest.mark.anyio
+async def test_single_scheduler_for_many_timers(timer_agent):
+    """All timers share one scheduler task."""
+    before = len(asyncio.all_tasks())
+    for i in range(20):
+        await timer_agent.set_timer(60, f"timer{i}")
+    assert len(asyncio.all_tasks()) <= before + 2
+    assert len(timer_agent._heap) == 20
+
+@pytest.mark.anyio
+async def test_timer_fires(timer_agent):
+    """A due timer is removed and the session is notified."""
+    await timer_agent.set_timer(0.05, "quick")
+    await asyncio.sleep(0.2)
+    assert "quick" not in timer_agent.active_timers
+    timer_agent.session.send.assert_awaited_once()
+
+@pytest.mark.anyio
+async def test_modified_timer_fires_once(timer_agent):
+    """Rescheduling supersedes the old deadline instead of firing twice."""
+    await timer_agent.set_timer(0.05, "quick")
+    await timer_agent.modify_timer("quick", new_duration=0.1)
+    await asyncio.sleep(0.3)
+    assert "quick" not in timer_agent.active_timers
+    timer_agent.session.send.assert_awaited_once()
+
+@pytest.mark.anyio
+async def test_deleted_timer_does_not_fire(timer_agent):
+    """Deleting a timer leaves its stale heap entry inert."""
+    await timer_agent.set_timer(0.05, "quick")
+    timer_agent.delete_entry("quick")
+    await asyncio.sleep(0.2)
+    timer_agent.session.send.assert_not_awaited()
+
+@pytest.mark.anyio
+async def test_journal_replay_and_compaction(timer_agent):
+    """Changes are journaled and folded back into the snapshot on load."""
+    await timer_agent.set_timer(10, "timer1")
+    await timer_agent.set_timer(10, "timer2")
+    timer_agent.delete_entry("timer2")
+    assert os.path.exists(JOURNAL_FILE)
+
+    new_agent = TimerAgent(session=AsyncMock(), storage_file=STORAGE_FILE)
+    assert "timer1" in new_agent.active_timers
+    assert "timer2" not in new_agent.active_timers
+    new_agent.stop()
+
+    assert not os.path.exists(JOURNAL_FILE)
+    with open(STORAGE_FILE) as f:
+        assert list(json.load(f)["timers"]) == ["timer1"]
+
+def test_tone_is_cached():
+    """The notification tone is generated once and reused."""
+    from backend.timer_agent import _tone_bytes
+    first = _tone_bytes(440.0, 0.5)
+    assert _tone_bytes(440.0, 0.5) is first
+    assert len(first) == int(44100 * 0.5) * 2
+
+@pytest.mark.anyio
+async def test_notification_sound_does_not_block(timer_agent):
+    """Concurrent alerts are queued on the sound thread rather than played inline."""
+    timer_agent._play_notification_sound()
+    timer_agent._play_notification_sound()
+    assert timer_agent._sound_thread is not None
+    timer_agent.stop()
+    timer_agent._sound_thread.join(timeout=1)
+    assert not timer_agent._sound_thread.is_alive()